@@ -0,0 +1,187 @@
+"""Run the docstring generator end to end on a synthetic repo with a fake llm.
+
+Usage:
+    python -m benchmarks.run_benchmark --modules 200 --latency 0.05 --output results.json
+    python -m benchmarks.run_benchmark --compare results.json
+"""
+
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from queue import Queue
+from threading import Lock
+from typing import Any
+
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from docstring_generator.config import Config
+from docstring_generator.docstring_generator import generate_docstrings
+from docstring_generator.engine import LLMEngine
+from docstring_generator.fake_llm import FakeLLM
+from docstring_generator.metrics import metrics
+from docstring_generator.scheduler import ScheduledQueue
+
+from .synthetic_repo import SyntheticRepoConfig, generate_synthetic_repo
+
+
+class BenchmarkCounters:
+    """The side effects of a benchmark run, the stages are timed by the run metrics."""
+
+    def __init__(self):
+        self.lock: Lock = Lock()
+        self.file_writes: int = 0
+        self.subprocess_spawns: int = 0
+        self.root_dir: str = ''
+
+    def audit(self, event: str, args: tuple) -> None:
+        """Count the file writes under the synthetic repo and the spawned subprocesses."""
+        if event == 'subprocess.Popen':
+            with self.lock:
+                self.subprocess_spawns += 1
+        elif event == 'open' and self.root_dir and isinstance(args[0], str):
+            mode: Any = args[1]
+            flags: Any = args[2]
+            # The atomic writes create their temporary file with os.open flags.
+            is_write: bool = (
+                isinstance(mode, str) and ('w' in mode or 'a' in mode)
+            ) or (
+                mode is None
+                and isinstance(flags, int)
+                and bool(flags & (os.O_WRONLY | os.O_RDWR))
+            )
+            if is_write and args[0].startswith(self.root_dir):
+                with self.lock:
+                    self.file_writes += 1
+
+
+counters: BenchmarkCounters = BenchmarkCounters()
+
+
+def get_peak_rss_mb() -> float:
+    """Get the peak resident set size of this process and its children in megabytes."""
+    peak_rss_kb: int = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return round(peak_rss_kb / 1024, 2)
+
+
+def run_benchmark(
+    repo_config: SyntheticRepoConfig, config_overrides: dict, latency: float
+) -> dict:
+    """Generate a synthetic repo, then generate its docstrings with a fake llm."""
+    with tempfile.TemporaryDirectory() as root_dir:
+        repo_dir: str = os.path.join(root_dir, 'repo')
+        module_paths: list[str] = generate_synthetic_repo(repo_dir, repo_config)
+        counters.root_dir = repo_dir
+        # The state files of the run are kept out of the working directory and of the repo.
+        settings: dict = {
+            'path': {repo_dir},
+            'cache_file': os.path.join(root_dir, 'cache.sqlite'),
+            'checkpoint_file': os.path.join(root_dir, 'journal.jsonl'),
+            'manifest_file': os.path.join(root_dir, 'manifest.json'),
+            'index_file': os.path.join(root_dir, 'index.json'),
+            **config_overrides,
+        }
+        config: Config = Config(**settings)
+        llm: FakeLLM = FakeLLM(latency=latency)
+        engine: LLMEngine = LLMEngine(llm=llm, config=config)
+        start: float = time.perf_counter()
+        generate_docstrings(
+            config=config,
+            module_path_queue=Queue(),
+            functions_source_queue=ScheduledQueue(),
+            class_source_queue=ScheduledQueue(),
+            failed_modules_queue=Queue(),
+            module_docstrings_queue=Queue(),
+            engine=engine,
+        )
+        wall_seconds: float = time.perf_counter() - start
+    report: dict = metrics.get_report()
+    return {
+        'repo': repo_config.model_dump(),
+        'config': config_overrides,
+        'llm_latency': latency,
+        'modules': len(module_paths),
+        'wall_seconds': round(wall_seconds, 4),
+        'llm_calls': llm.calls,
+        'stage_seconds': {
+            stage: histogram['sum'] for stage, histogram in report['stages'].items()
+        },
+        'stage_calls': {
+            stage: histogram['count'] for stage, histogram in report['stages'].items()
+        },
+        'stage_p95_seconds': {
+            stage: histogram['p95'] for stage, histogram in report['stages'].items()
+        },
+        'peak_rss_mb': get_peak_rss_mb(),
+        'file_writes': counters.file_writes,
+        'subprocess_spawns': counters.subprocess_spawns,
+    }
+
+
+def compare_results(results: dict, baseline: dict) -> None:
+    """Print how the results changed from a baseline run."""
+    for metric in ('wall_seconds', 'llm_calls', 'peak_rss_mb', 'file_writes'):
+        before, after = baseline.get(metric), results.get(metric)
+        if before:
+            print(f'{metric}: {before} -> {after} ({after / before:.2f}x)')
+        else:
+            print(f'{metric}: {before} -> {after}')
+
+
+def parse_arguments() -> Namespace:
+    parser = ArgumentParser(
+        prog='run_benchmark',
+        description='Benchmark the docstring generator on a synthetic repo',
+    )
+    parser.add_argument('--modules', nargs='?', default=50, type=int)
+    parser.add_argument('--packages', nargs='?', default=5, type=int)
+    parser.add_argument('--functions-per-module', nargs='?', default=10, type=int)
+    parser.add_argument('--classes-per-module', nargs='?', default=2, type=int)
+    parser.add_argument('--methods-per-class', nargs='?', default=5, type=int)
+    parser.add_argument('--statements-per-function', nargs='?', default=5, type=int)
+    parser.add_argument('--nesting-depth', nargs='?', default=1, type=int)
+    parser.add_argument('--seed', nargs='?', default=0, type=int)
+    parser.add_argument('--latency', nargs='?', default=0.05, type=float)
+    parser.add_argument(
+        '--config',
+        nargs='?',
+        default='{"use_cache": false}',
+        type=str,
+        help='The generator configuration overrides as a json object',
+    )
+    parser.add_argument('--output', nargs='?', default='', type=str)
+    parser.add_argument('--compare', nargs='?', default='', type=str)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: Namespace = parse_arguments()
+    repo_config: SyntheticRepoConfig = SyntheticRepoConfig(
+        modules=args.modules,
+        packages=args.packages,
+        functions_per_module=args.functions_per_module,
+        classes_per_module=args.classes_per_module,
+        methods_per_class=args.methods_per_class,
+        statements_per_function=args.statements_per_function,
+        nesting_depth=args.nesting_depth,
+        seed=args.seed,
+    )
+    sys.addaudithook(counters.audit)
+    results: dict = run_benchmark(repo_config, json.loads(args.config), args.latency)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_results(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
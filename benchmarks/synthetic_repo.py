@@ -0,0 +1,94 @@
+import os
+import random
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class SyntheticRepoConfig(BaseModel):
+    modules: int = Field(description='The number of modules to generate', default=50)
+    packages: int = Field(
+        description='The number of packages the modules are spread over', default=5
+    )
+    functions_per_module: int = Field(
+        description='The number of top level functions in every module', default=10
+    )
+    classes_per_module: int = Field(
+        description='The number of classes in every module', default=2
+    )
+    methods_per_class: int = Field(
+        description='The number of methods in every class', default=5
+    )
+    statements_per_function: int = Field(
+        description='The number of statements in every function body', default=5
+    )
+    nesting_depth: int = Field(
+        description='The depth of the functions nested in every top level function',
+        default=1,
+    )
+    seed: int = Field(description='The seed of the random generator', default=0)
+
+
+def make_function(
+    name: str, indent: str, depth: int, config: SyntheticRepoConfig, rng: random.Random
+) -> list[str]:
+    """Make the source code lines of a function with nested functions."""
+    arguments: list[str] = [f'arg_{i}' for i in range(rng.randint(0, 4))]
+    lines: list[str] = [f'{indent}def {name}({", ".join(arguments)}):']
+    body_indent: str = f'{indent}    '
+    if depth:
+        lines.extend(
+            make_function(f'{name}_inner', body_indent, depth - 1, config, rng)
+        )
+    lines.append(f'{body_indent}total = 0')
+    for statement in range(config.statements_per_function):
+        operand: str = rng.choice(arguments) if arguments else str(statement)
+        lines.append(f'{body_indent}total += len(str({operand})) * {statement}')
+    lines.append(f'{body_indent}return total')
+    return lines
+
+
+def make_module(
+    module_index: int, config: SyntheticRepoConfig, rng: random.Random
+) -> str:
+    lines: list[str] = ['import os', '']
+    for function_index in range(config.functions_per_module):
+        lines.append('')
+        lines.extend(
+            make_function(
+                f'function_{module_index}_{function_index}',
+                '',
+                config.nesting_depth,
+                config,
+                rng,
+            )
+        )
+        lines.append('')
+    for class_index in range(config.classes_per_module):
+        lines.extend(['', f'class Class{module_index}_{class_index}:'])
+        for method_index in range(config.methods_per_class):
+            lines.append('')
+            lines.extend(
+                make_function(f'method_{method_index}', '    ', 0, config, rng)
+            )
+        lines.append('')
+    return '\n'.join(lines).rstrip() + '\n'
+
+
+def generate_synthetic_repo(
+    root_dir: str, config: Optional[SyntheticRepoConfig] = None
+) -> list[str]:
+    """Generate a synthetic package tree, returning the paths of its modules."""
+    config = config or SyntheticRepoConfig()
+    rng: random.Random = random.Random(config.seed)
+    module_paths: list[str] = []
+    for module_index in range(config.modules):
+        package_dir: str = os.path.join(
+            root_dir, f'package_{module_index % max(config.packages, 1)}'
+        )
+        os.makedirs(package_dir, exist_ok=True)
+        module_path: str = os.path.join(package_dir, f'module_{module_index}.py')
+        with open(module_path, 'w') as f:
+            f.write(make_module(module_index, config, rng))
+        module_paths.append(module_path)
+    return module_paths
@@ -1,17 +1,19 @@
+import logging
 from argparse import Namespace
 
-from dotenv import load_dotenv
-
-load_dotenv()
 from .config import Config
+from .docstring_coverage import report_coverage
 from .docstring_generator import generate_docstrings
 from .extensions import (
     failed_modules_queue,
     functions_source_code_queue,
     modules_path_queue,
     class_source_code_queue,
+    module_docstrings_queue,
 )
-from .helpers import create_application_config, parse_arguments
+from .helpers import create_application_config, is_merge, parse_arguments
+from .merge import merge_shard_results
+from .watch import watch_modules
 
 
 def run():
@@ -21,14 +23,31 @@ def run():
         function: The run function.
         docstring: The docstring for the run function.
         exceptions: Any exceptions that may be thrown during execution."""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     args: Namespace = parse_arguments()
     config: Config = create_application_config(args)
+    if is_merge(args):
+        merge_shard_results(config)
+        return
+    if config.report_only:
+        raise SystemExit(report_coverage(config))
+    if args.command == 'watch':
+        watch_modules(
+            config=config,
+            module_path_queue=modules_path_queue,
+            functions_source_queue=functions_source_code_queue,
+            failed_modules_queue=failed_modules_queue,
+            class_source_queue=class_source_code_queue,
+            module_docstrings_queue=module_docstrings_queue,
+        )
+        return
     generate_docstrings(
         config=config,
         module_path_queue=modules_path_queue,
         functions_source_queue=functions_source_code_queue,
         failed_modules_queue=failed_modules_queue,
         class_source_queue=class_source_code_queue,
+        module_docstrings_queue=module_docstrings_queue,
     )
 
 
@@ -0,0 +1,282 @@
+import ast
+import hashlib
+import os
+import sqlite3
+import textwrap
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+from .config import Config
+from .templates import PROMPT_VERSION
+
+IDENTIFIER_FIELDS: tuple[str, ...] = ('id', 'arg', 'name', 'attr', 'asname')
+
+
+def strip_docstrings(tree: ast.AST) -> ast.AST:
+    """Remove the docstrings from every function and class in the tree."""
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+            and ast.get_docstring(node=node) is not None
+        ):
+            node.body = node.body[1:] or [ast.Pass()]
+    return tree
+
+
+def erase_identifiers(tree: ast.AST) -> ast.AST:
+    """Replace the identifiers and the literals of the tree by placeholders.
+
+    The names of the parameters are kept, as the docstrings document them."""
+    for node in ast.walk(tree):
+        for field in IDENTIFIER_FIELDS:
+            if isinstance(node, ast.arg) and field == 'arg':
+                continue
+            if isinstance(getattr(node, field, None), str):
+                setattr(node, field, '_')
+        if isinstance(node, ast.Constant):
+            node.value = type(node.value).__name__
+    return tree
+
+
+def normalize_source(source_code: str, ignore_identifiers: bool = False) -> str:
+    """Get a dump of the source code ast that ignores formatting, comments and docstrings."""
+    return normalize_source_variants(source_code, ignore_identifiers)[-1]
+
+
+def normalize_source_variants(
+    source_code: str, ignore_identifiers: bool = False
+) -> tuple[str, ...]:
+    """Get the normalized source code, and also its structure if asked, from one parse."""
+    try:
+        tree = ast.parse(textwrap.dedent(source_code))
+    except SyntaxError:
+        return (source_code, source_code) if ignore_identifiers else (source_code,)
+    tree = strip_docstrings(tree)
+    variants: tuple[str, ...] = (ast.dump(tree, annotate_fields=False),)
+    if ignore_identifiers:
+        variants += (ast.dump(erase_identifiers(tree), annotate_fields=False),)
+    return variants
+
+
+def hash_source(normalized_source: str) -> str:
+    return hashlib.sha256(normalized_source.encode('utf-8')).hexdigest()
+
+
+def get_source_fingerprint(source_code: str, ignore_identifiers: bool = False) -> str:
+    """Get a hash of the normalized source code."""
+    return hash_source(normalize_source(source_code, ignore_identifiers))
+
+
+def get_fingerprint_key(
+    kind: str, fingerprint: str, config: Config, ignore_identifiers: bool = False
+) -> str:
+    """Get the cache key for a symbol's source fingerprint, documentation style and prompt."""
+    key_parts: list[str] = [
+        kind,
+        config.documentation_style,
+        PROMPT_VERSION,
+        fingerprint,
+    ]
+    if ignore_identifiers:
+        key_parts.append('structure')
+    if config.context_token_budget or config.split_class_token_threshold:
+        # The compacted prompts get different replies, keep the full source keys stable.
+        key_parts.append(
+            f'{config.context_token_budget}:{config.split_class_token_threshold}'
+        )
+    if config.context_index:
+        # The prompts with the summaries of the callees get different replies.
+        key_parts.append('context_index')
+    if config.llm_provider != 'openai' or config.llm_model:
+        # Keep the replies of other models apart, and the openai keys stable.
+        key_parts.append(f'{config.llm_provider}:{config.llm_model}')
+    key: str = '\0'.join(key_parts)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_cache_key(
+    kind: str, source_code: str, config: Config, ignore_identifiers: bool = False
+) -> str:
+    """Get the cache key for a symbol's source code, documentation style and prompt."""
+    return get_fingerprint_key(
+        kind,
+        get_source_fingerprint(source_code, ignore_identifiers),
+        config,
+        ignore_identifiers,
+    )
+
+
+def get_symbol_keys(
+    kind: str, source_code: str, config: Config
+) -> tuple[str, Optional[str]]:
+    """Get the cache key of a symbol, and the key of its group of duplicates if dedup is on.
+
+    The source code is parsed once for both. The exact duplicates share
+    their cache key. The near duplicates, which only differ by their
+    identifiers and literals, share a structure key."""
+    structure: bool = config.dedup == 'structure'
+    fingerprints: list[str] = [
+        hash_source(variant)
+        for variant in normalize_source_variants(source_code, structure)
+    ]
+    cache_key: str = get_fingerprint_key(kind, fingerprints[0], config)
+    if config.dedup == 'off':
+        return cache_key, None
+    if not structure:
+        return cache_key, cache_key
+    return cache_key, get_fingerprint_key(
+        kind, fingerprints[1], config, ignore_identifiers=True
+    )
+
+
+def open_read_only(cache_file: str) -> sqlite3.Connection:
+    """Open a cache file for reading only, creating no file next to it.
+
+    The cache is opened as immutable, so that sqlite doesn't create the shared
+    memory file of its write ahead log, unless the log still holds the changes
+    of a run writing to it."""
+    uri: str = Path(cache_file).resolve().as_uri()
+    wal_file: str = f'{cache_file}-wal'
+    if os.path.exists(wal_file) and os.path.getsize(wal_file):
+        connection = sqlite3.connect(
+            f'{uri}?mode=ro', uri=True, check_same_thread=False
+        )
+        try:
+            connection.execute('SELECT COUNT(*) FROM docstrings')
+            return connection
+        except sqlite3.OperationalError:
+            connection.close()
+    return sqlite3.connect(
+        f'{uri}?mode=ro&immutable=1', uri=True, check_same_thread=False
+    )
+
+
+class DocstringCache:
+    """A persistent, least recently used cache of the generated docstrings.
+
+    A read only cache is opened without writing anything to its file or its
+    directory: its values are looked up, but the new ones are not cached."""
+
+    def __init__(
+        self, cache_file: str, max_entries: int = 10000, read_only: bool = False
+    ):
+        self.cache_file: str = cache_file
+        self.max_entries: int = max_entries
+        self.read_only: bool = read_only
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.lock: Lock = Lock()
+        if read_only:
+            self.connection = open_read_only(cache_file)
+            self.entries: int = self.connection.execute(
+                'SELECT COUNT(*) FROM docstrings'
+            ).fetchone()[0]
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS docstrings '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)'
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS docstrings_last_access '
+            'ON docstrings (last_access)'
+        )
+        self.connection.commit()
+        self.entries = self.connection.execute(
+            'SELECT COUNT(*) FROM docstrings'
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached value, recording a hit or a miss."""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value FROM docstrings WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.read_only:
+                return row[0]
+            self.connection.execute(
+                'UPDATE docstrings SET last_access = ? WHERE key = ?',
+                (time.time(), key),
+            )
+            self.connection.commit()
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Cache a value, evicting the least recently used entries when full."""
+        if self.read_only:
+            return
+        with self.lock:
+            exists = self.connection.execute(
+                'SELECT 1 FROM docstrings WHERE key = ?', (key,)
+            ).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO docstrings (key, value, last_access) '
+                'VALUES (?, ?, ?)',
+                (key, value, time.time()),
+            )
+            if not exists:
+                self.entries += 1
+            self.evict()
+            self.connection.commit()
+
+    def evict(self) -> None:
+        """Evict the least recently used entries above the maximum, with the lock held."""
+        if self.entries <= self.max_entries:
+            return
+        evicted: int = self.entries - self.max_entries
+        self.connection.execute(
+            'DELETE FROM docstrings WHERE key IN '
+            '(SELECT key FROM docstrings ORDER BY last_access LIMIT ?)',
+            (evicted,),
+        )
+        self.entries -= evicted
+        self.evictions += evicted
+
+    def merge(self, cache_file: str) -> None:
+        """Merge the entries of another cache file, keeping the most recently used value of a key."""
+        if not os.path.exists(cache_file):
+            raise FileNotFoundError(f"The cache '{cache_file}' doesn't exist")
+        source = sqlite3.connect(cache_file)
+        try:
+            rows: list[tuple[str, str, float]] = source.execute(
+                'SELECT key, value, last_access FROM docstrings'
+            ).fetchall()
+        finally:
+            source.close()
+        with self.lock:
+            self.connection.executemany(
+                'INSERT INTO docstrings (key, value, last_access) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'last_access = excluded.last_access '
+                'WHERE excluded.last_access > docstrings.last_access',
+                rows,
+            )
+            self.entries = self.connection.execute(
+                'SELECT COUNT(*) FROM docstrings'
+            ).fetchone()[0]
+            self.evict()
+            self.connection.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def __str__(self) -> str:
+        return (
+            f'Docstring cache: {self.hits} hits, {self.misses} misses, '
+            f'{self.evictions} evictions, {self.entries} entries'
+        )
@@ -0,0 +1,147 @@
+from queue import Queue
+from typing import Optional
+from threading import Condition
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from .metrics import metrics
+from .parsed_module import ParsedModule
+from .symbol_index import SymbolIndex
+
+
+class ModuleDocstrings(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    module_path: str = Field(description='The path to this module')
+    parsed_module: Optional[ParsedModule] = Field(
+        description='The source code and ast of this module, if parsed in this process',
+        default=None,
+    )
+    pending: int = Field(
+        description='The number of symbols still waiting for a docstring', default=0
+    )
+    function_docstrings: dict[str, str] = Field(
+        description='The generated function docstrings keyed by function name',
+        default_factory=dict,
+    )
+    class_docstrings: dict[str, str] = Field(
+        description='The generated class docstrings keyed by class name',
+        default_factory=dict,
+    )
+    methods_docstrings: dict[str, dict[str, str]] = Field(
+        description='The generated method docstrings keyed by class then method name',
+        default_factory=dict,
+    )
+    failed_symbols: set[str] = Field(
+        description='The symbols whose docstrings could not be generated',
+        default_factory=set,
+    )
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.function_docstrings or self.class_docstrings or self.methods_docstrings
+        )
+
+
+class DocstringCollector:
+    """Collect the generated docstrings for every module until all its symbols are done.
+
+    Once the last symbol of a module is done, the module is put on the
+    module docstrings queue so that it is rewritten, saved and formatted once.
+    The summaries of the docstrings are recorded in the symbol index, if any,
+    for the prompts of the symbols that use them."""
+
+    def __init__(
+        self, module_docstrings_queue: Queue, index: Optional[SymbolIndex] = None
+    ):
+        self.module_docstrings_queue: Queue = module_docstrings_queue
+        self.index: Optional[SymbolIndex] = index
+        self.modules: dict[str, ModuleDocstrings] = {}
+        self.lock: Condition = Condition()
+
+    def register(
+        self,
+        module_path: str,
+        symbols_count: int,
+        parsed_module: Optional[ParsedModule] = None,
+    ) -> None:
+        """Register the number of symbols queued for a module."""
+        if not symbols_count:
+            return
+        with self.lock:
+            if module_path not in self.modules:
+                self.modules[module_path] = ModuleDocstrings(
+                    module_path=module_path, parsed_module=parsed_module
+                )
+            self.modules[module_path].pending += symbols_count
+
+    def get_source_bytes(self, module_path: str) -> Optional[bytes]:
+        """Get the source of a module parsed in this process, if it was."""
+        with self.lock:
+            parsed_module: Optional[ParsedModule] = self.modules[
+                module_path
+            ].parsed_module
+        return parsed_module.source_bytes if parsed_module else None
+
+    def add_function_docstring(
+        self, module_path: str, function_name: str, docstring: str
+    ) -> None:
+        """Add a function docstring, or a method docstring for a 'Class.method' name."""
+        with self.lock:
+            module_docstrings: ModuleDocstrings = self.modules[module_path]
+            if '.' in function_name:
+                class_name, method_name = function_name.split('.', 1)
+                module_docstrings.methods_docstrings.setdefault(class_name, {})[
+                    method_name
+                ] = docstring
+            else:
+                module_docstrings.function_docstrings[function_name] = docstring
+        if self.index:
+            self.index.set_summary(module_path, function_name, docstring)
+
+    def add_class_docstring(
+        self,
+        module_path: str,
+        class_name: str,
+        docstring: str,
+        methods_docstrings: dict[str, str],
+    ) -> None:
+        with self.lock:
+            module_docstrings: ModuleDocstrings = self.modules[module_path]
+            if docstring:
+                module_docstrings.class_docstrings[class_name] = docstring
+            if methods_docstrings:
+                module_docstrings.methods_docstrings.setdefault(class_name, {}).update(
+                    methods_docstrings
+                )
+        if self.index:
+            if docstring:
+                self.index.set_summary(module_path, class_name, docstring)
+            for method_name, method_docstring in methods_docstrings.items():
+                self.index.set_summary(
+                    module_path, f'{class_name}.{method_name}', method_docstring
+                )
+
+    def add_failed_symbol(self, module_path: str, symbol_name: str) -> None:
+        with self.lock:
+            self.modules[module_path].failed_symbols.add(symbol_name.split('.')[0])
+
+    def symbol_done(self, module_path: str) -> None:
+        """Mark a symbol as done, queueing the module once all its symbols are done."""
+        with self.lock:
+            module_docstrings: ModuleDocstrings = self.modules[module_path]
+            module_docstrings.pending -= 1
+            metrics.increment('symbols_done')
+            if module_docstrings.pending > 0:
+                return
+            del self.modules[module_path]
+            self.module_docstrings_queue.put(module_docstrings)
+            if not self.modules:
+                self.lock.notify_all()
+
+    def join(self) -> None:
+        """Wait until every registered module has been put on the module docstrings queue."""
+        with self.lock:
+            while self.modules:
+                self.lock.wait()
@@ -1,8 +1,18 @@
+import os
 from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
 
+def get_default_cache_file() -> str:
+    """Get the path of the docstrings cache in the user cache directory."""
+    if os.name == 'nt':
+        cache_dir: str = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'docstring_generator', 'cache.sqlite')
+
+
 class Config(BaseModel):
     path: set[str] = Field(description='The path to the source code directory')
     overwrite_function_docstring: Optional[bool] = Field(
@@ -22,11 +32,309 @@ class Config(BaseModel):
         default='Numpy-Style',
         enum=['Numpy-Style', 'Google-Style', 'Sphinx-Style'],
     )
+    strict_style: bool = Field(
+        description='Request a docstring again once when its sections follow another documentation style',
+        default=False,
+    )
     directories_ignore: set[str] = Field(
-        description='Directories to ignore',
+        description='The names, paths or glob patterns of the directories to ignore',
         default={'venv', '.venv', '__pycache__', '.git', 'build', 'dist', 'docs'},
     )
     files_ignore: set[str] = Field(
-        description='Files to ignore',
+        description='The names, paths or glob patterns of the files to ignore',
         default_factory=set,
     )
+    respect_gitignore: bool = Field(
+        description='Whether or not to skip the paths ignored by the .gitignore files',
+        default=True,
+    )
+    discovery_workers: int = Field(
+        description='The number of threads scanning the directories for modules',
+        default=8,
+    )
+    dry_run: bool = Field(
+        description='Whether or not to stream the diffs of the modules instead of rewriting them',
+        default=False,
+    )
+    patch_file: str = Field(
+        description=(
+            'Where the diffs go in dry run mode, - for the standard output, a '
+            'directory for one patch per module or a single patch file'
+        ),
+        default='-',
+    )
+    checkpoint: bool = Field(
+        description=(
+            'Whether or not to journal the replies and the written modules so that an '
+            'interrupted run can be resumed'
+        ),
+        default=True,
+    )
+    checkpoint_file: str = Field(
+        description='The path to the checkpoint journal, removed once a run completes',
+        default='.docstring_generator_journal.jsonl',
+    )
+    resume: bool = Field(
+        description='Whether or not to replay the checkpoint journal of an interrupted run',
+        default=False,
+    )
+    use_cache: bool = Field(
+        description='Whether or not to cache the generated docstrings', default=True
+    )
+    cache_file: str = Field(
+        description='The path to the docstrings cache',
+        default_factory=get_default_cache_file,
+    )
+    cache_max_entries: int = Field(
+        description='The maximum number of cached docstrings', default=10000
+    )
+    incremental: bool = Field(
+        description='Whether or not to only process the modules and symbols that changed since the last run',
+        default=False,
+    )
+    manifest_file: str = Field(
+        description='The path to the manifest of the last run used in incremental mode',
+        default='.docstring_generator_manifest.json',
+    )
+    shard_index: int = Field(
+        description='The shard of the modules processed by this run, from 1 to shard_count',
+        default=1,
+    )
+    shard_count: int = Field(
+        description='The number of shards the modules are split in by the hash of their path',
+        default=1,
+    )
+    merge_caches: list[str] = Field(
+        description='The caches of the shards of a run to merge into the cache file',
+        default_factory=list,
+    )
+    merge_manifests: list[str] = Field(
+        description='The manifests of the shards of a run to merge into the manifest file',
+        default_factory=list,
+    )
+    merge_reports: list[str] = Field(
+        description='The json reports of the shards of a run to merge into the report file',
+        default_factory=list,
+    )
+    context_index: bool = Field(
+        description=(
+            'Whether or not to add the signatures and summaries of the project '
+            'functions and classes a symbol uses to its prompt, from an index of the '
+            'project built during discovery'
+        ),
+        default=False,
+    )
+    context_index_wait: float = Field(
+        description=(
+            'The maximum number of seconds a symbol waits for the llm calls in flight '
+            'of the symbols it uses, so that their summaries are in its prompt'
+        ),
+        default=10.0,
+    )
+    index_file: str = Field(
+        description='The path to the project symbol index used with the context index',
+        default='.docstring_generator_index.json',
+    )
+    watch_backend: str = Field(
+        description=(
+            'How the watch mode is notified of the changed modules, auto uses inotify '
+            'when available and polls otherwise'
+        ),
+        default='auto',
+        enum=['auto', 'inotify', 'poll'],
+    )
+    watch_debounce: float = Field(
+        description='The number of seconds the changed modules must be quiet before the watch mode regenerates them',
+        default=0.5,
+    )
+    watch_poll_interval: float = Field(
+        description='The number of seconds between two scans of the modules when the watch mode polls',
+        default=1.0,
+    )
+    write_mode: str = Field(
+        description=(
+            'How the docstrings are written, splice inserts them into the original '
+            'source while unparse regenerates the module'
+        ),
+        default='splice',
+        enum=['splice', 'unparse'],
+    )
+    formatter: str = Field(
+        description='The formatter to run once on every written module',
+        default='none',
+        enum=['none', 'black'],
+    )
+    batch_token_budget: int = Field(
+        description=(
+            'The maximum number of code tokens of the small functions packed in one '
+            'prompt, 0 to not batch them'
+        ),
+        default=0,
+    )
+    batch_max_symbol_tokens: int = Field(
+        description='The maximum number of code tokens of a function that can be batched',
+        default=200,
+    )
+    dedup: str = Field(
+        description=(
+            'How the duplicate symbols are grouped to share one llm call, exact groups '
+            'the symbols with the same code while structure also ignores the '
+            'identifiers and the literals'
+        ),
+        default='exact',
+        enum=['off', 'exact', 'structure'],
+    )
+    context_token_budget: int = Field(
+        description=(
+            'The maximum number of code tokens of a symbol sent in a prompt, longer '
+            'bodies are truncated, 0 to send the full source'
+        ),
+        default=0,
+    )
+    split_class_token_threshold: int = Field(
+        description=(
+            'The number of code tokens above which a class gets one request for itself '
+            'and one per method, 0 to never split'
+        ),
+        default=0,
+    )
+    queue_max_size: int = Field(
+        description=(
+            'The maximum number of items in every queue of the pipeline, the producers '
+            'wait while a queue is full, 0 for unbounded queues'
+        ),
+        default=1000,
+    )
+    processes: int = Field(
+        description='The number of worker processes that parse and write the modules, 0 to do it in threads',
+        default=0,
+    )
+    process_chunk_size: int = Field(
+        description='The number of modules sent to a worker process at once',
+        default=16,
+    )
+    llm_provider: str = Field(
+        description='The provider of the llm client, created on the first llm call',
+        default='openai',
+        enum=['openai', 'local', 'rule-based', 'fake'],
+    )
+    llm_model: str = Field(
+        description='The model to request, empty for the default model of the provider',
+        default='',
+    )
+    llm_base_url: str = Field(
+        description='The url of the openai compatible server of the local provider, such as llama.cpp or vLLM',
+        default='http://localhost:8000/v1',
+    )
+    llm_batch_size: int = Field(
+        description='The number of prompts sent to the llm in one batched request, 1 to send them one by one',
+        default=1,
+    )
+    llm_batch_delay: float = Field(
+        description='The number of seconds to wait for a batch to fill before sending it',
+        default=0.05,
+    )
+    http_max_connections: int = Field(
+        description='The maximum number of http connections to the llm server',
+        default=32,
+    )
+    http_max_keepalive_connections: int = Field(
+        description='The maximum number of idle http connections kept alive for the next llm calls',
+        default=16,
+    )
+    http_keepalive_expiry: float = Field(
+        description='The number of seconds an idle http connection is kept alive',
+        default=30.0,
+    )
+    http_timeout: float = Field(
+        description='The timeout in seconds of an llm http request',
+        default=60.0,
+    )
+    http_connect_timeout: float = Field(
+        description='The timeout in seconds of opening an http connection to the llm server',
+        default=10.0,
+    )
+    http2: bool = Field(
+        description='Whether or not to use HTTP/2 with the llm server, which needs the h2 package',
+        default=False,
+    )
+    hedge_quantile: float = Field(
+        description=(
+            'The quantile of the recent llm latencies after which a duplicate request '
+            'is sent, such as 0.95, 0 to not hedge'
+        ),
+        default=0.0,
+    )
+    hedge_min_samples: int = Field(
+        description='The number of llm latencies to measure before hedging the requests',
+        default=20,
+    )
+    schedule_policy: str = Field(
+        description='The order the symbols are sent to the llm in',
+        default='fifo',
+        enum=['fifo', 'public-first', 'largest-first', 'shortest-first'],
+    )
+    token_budget: int = Field(
+        description='The maximum number of prompt and completion tokens of a run, 0 for no limit',
+        default=0,
+    )
+    cost_budget: float = Field(
+        description='The maximum estimated cost in dollars of a run, 0 for no limit',
+        default=0.0,
+    )
+    max_concurrency: int = Field(
+        description='The maximum number of concurrent llm calls', default=8
+    )
+    requests_per_minute: int = Field(
+        description='The maximum number of llm requests per minute, 0 for no limit',
+        default=0,
+    )
+    tokens_per_minute: int = Field(
+        description='The maximum number of prompt tokens per minute, 0 for no limit',
+        default=0,
+    )
+    max_retries: int = Field(
+        description='The number of retries for rate limited or failed llm calls',
+        default=5,
+    )
+    retry_backoff: float = Field(
+        description='The initial backoff in seconds between llm call retries',
+        default=1.0,
+    )
+    retry_max_backoff: float = Field(
+        description='The maximum backoff in seconds between llm call retries',
+        default=60.0,
+    )
+    report_file: str = Field(
+        description='The path of the run report, - for the standard output, empty to not write it',
+        default='',
+    )
+    report_format: str = Field(
+        description='The format of the run report, sarif is only for the coverage report',
+        default='json',
+        enum=['json', 'openmetrics', 'sarif'],
+    )
+    report_only: bool = Field(
+        description='Whether or not to only report the missing and stale docstrings, with no llm call',
+        default=False,
+    )
+    coverage_fail_under: float = Field(
+        description=(
+            'The percentage of symbols with an up to date docstring under which the '
+            'coverage report exits with an error'
+        ),
+        default=100.0,
+    )
+    progress: bool = Field(
+        description='Whether or not to show a live progress line', default=False
+    )
+    queue_sample_interval: float = Field(
+        description='The interval in seconds between the samples of the queue depths',
+        default=1.0,
+    )
+    prompt_token_cost: float = Field(
+        description='The cost in dollars of 1000 prompt tokens', default=0.0015
+    )
+    completion_token_cost: float = Field(
+        description='The cost in dollars of 1000 completion tokens', default=0.002
+    )
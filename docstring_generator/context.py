@@ -0,0 +1,179 @@
+import ast
+import textwrap
+from ast import AsyncFunctionDef, ClassDef, FunctionDef, Lambda, Raise, Return
+from typing import Iterator, Optional, Union
+
+from .engine import estimate_tokens
+from .work_items import SymbolSpan
+
+FunctionNode = Union[FunctionDef, AsyncFunctionDef]
+MAX_EXIT_POINTS: int = 5
+MAX_EXIT_POINT_LENGTH: int = 80
+
+
+def get_first_line(node: ast.AST) -> int:
+    """Get the first line of a node, including its decorators."""
+    decorators: list = getattr(node, 'decorator_list', [])
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+
+def get_node_lines(node: ast.AST, lines: list[str]) -> list[str]:
+    return lines[get_first_line(node) - 1 : node.end_lineno]
+
+
+def has_docstring(node: Union[FunctionNode, ClassDef]) -> bool:
+    return ast.get_docstring(node, clean=False) is not None
+
+
+def iter_exit_points(nodes: list[ast.stmt]) -> Iterator[Union[Raise, Return]]:
+    """Iterate over the raise and return statements, not descending into nested scopes."""
+    stack: list[ast.AST] = list(reversed(nodes))
+    while stack:
+        node: ast.AST = stack.pop()
+        if isinstance(node, (Raise, Return)):
+            yield node
+        if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef, Lambda)):
+            continue
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+
+
+def get_exit_points_lines(statements: list[ast.stmt], indent: str) -> list[str]:
+    """Summarize the exceptions raised and the values returned by the omitted statements."""
+    exit_points: list[str] = []
+    for node in iter_exit_points(statements):
+        if isinstance(node, Raise):
+            exit_point: str = f'raises {ast.unparse(node.exc) if node.exc else "again"}'
+        else:
+            exit_point = f'returns {ast.unparse(node.value) if node.value else "None"}'
+        exit_point = exit_point.replace('\n', ' ')[:MAX_EXIT_POINT_LENGTH]
+        if exit_point not in exit_points:
+            exit_points.append(exit_point)
+    return [f'{indent}# {exit_point}' for exit_point in exit_points[:MAX_EXIT_POINTS]]
+
+
+def compact_function(
+    node: FunctionNode, lines: list[str], token_budget: int
+) -> list[str]:
+    """Get the lines of a function with its body truncated to fit the token budget.
+
+    The decorators and the signature are always kept. The body statements
+    are kept in order while they fit, the rest are replaced by a placeholder
+    and a summary of the exceptions they raise and the values they return."""
+    body: list[ast.stmt] = node.body[1:] if has_docstring(node) else node.body
+    if not body or body[0].lineno == node.lineno:
+        return get_node_lines(node, lines)
+    header: list[str] = lines[get_first_line(node) - 1 : node.body[0].lineno - 1]
+    first_line: str = lines[body[0].lineno - 1]
+    indent: str = first_line[: len(first_line) - len(first_line.lstrip())]
+    compacted: list[str] = list(header)
+    used_tokens: int = estimate_tokens('\n'.join(header))
+    for index, statement in enumerate(body):
+        statement_lines: list[str] = get_node_lines(statement, lines)
+        statement_tokens: int = estimate_tokens('\n'.join(statement_lines))
+        if used_tokens + statement_tokens > token_budget:
+            break
+        compacted.extend(statement_lines)
+        used_tokens += statement_tokens
+    else:
+        return compacted
+    omitted: list[ast.stmt] = body[index:]
+    omitted_lines: int = omitted[-1].end_lineno - get_first_line(omitted[0]) + 1
+    compacted.append(f'{indent}...  # {omitted_lines} more lines')
+    compacted.extend(get_exit_points_lines(omitted, indent))
+    return compacted
+
+
+def compact_class(node: ClassDef, lines: list[str], token_budget: int) -> list[str]:
+    """Get the lines of a class with the bodies of its methods truncated to share the token budget."""
+    body: list[ast.stmt] = node.body[1:] if has_docstring(node) else node.body
+    if not body or body[0].lineno == node.lineno:
+        return get_node_lines(node, lines)
+    compacted: list[str] = lines[get_first_line(node) - 1 : node.body[0].lineno - 1]
+    methods: list[FunctionNode] = [
+        statement
+        for statement in body
+        if isinstance(statement, (FunctionDef, AsyncFunctionDef))
+    ]
+    fixed_tokens: int = estimate_tokens('\n'.join(compacted)) + sum(
+        estimate_tokens('\n'.join(get_node_lines(statement, lines)))
+        for statement in body
+        if statement not in methods
+    )
+    method_budget: int = max(token_budget - fixed_tokens, 0) // max(len(methods), 1)
+    for statement in body:
+        if statement in methods:
+            compacted.extend(compact_function(statement, lines, method_budget))
+        else:
+            compacted.extend(get_node_lines(statement, lines))
+    return compacted
+
+
+def parse_symbol(symbol_code: str) -> Optional[tuple[ast.stmt, list[str]]]:
+    code: str = textwrap.dedent(symbol_code)
+    try:
+        tree: ast.Module = ast.parse(code)
+    except SyntaxError:
+        return None
+    if not tree.body:
+        return None
+    return tree.body[0], code.splitlines()
+
+
+def compact_function_code(function_code: str, token_budget: int) -> str:
+    """Get the code of a function to send in a prompt, within the token budget if any."""
+    if not token_budget or estimate_tokens(function_code) <= token_budget:
+        return function_code
+    parsed_symbol: Optional[tuple[ast.stmt, list[str]]] = parse_symbol(function_code)
+    if not parsed_symbol or not isinstance(
+        parsed_symbol[0], (FunctionDef, AsyncFunctionDef)
+    ):
+        return function_code
+    return '\n'.join(compact_function(*parsed_symbol, token_budget))
+
+
+def compact_class_code(class_code: str, token_budget: int) -> str:
+    """Get the code of a class to send in a prompt, within the token budget if any."""
+    if not token_budget or estimate_tokens(class_code) <= token_budget:
+        return class_code
+    parsed_symbol: Optional[tuple[ast.stmt, list[str]]] = parse_symbol(class_code)
+    if not parsed_symbol or not isinstance(parsed_symbol[0], ClassDef):
+        return class_code
+    return '\n'.join(compact_class(*parsed_symbol, token_budget))
+
+
+def get_class_skeleton(class_code: str) -> str:
+    """Get the code of a class with only the signatures of its methods."""
+    parsed_symbol: Optional[tuple[ast.stmt, list[str]]] = parse_symbol(class_code)
+    if not parsed_symbol or not isinstance(parsed_symbol[0], ClassDef):
+        return class_code
+    return '\n'.join(compact_class(*parsed_symbol, 0))
+
+
+def get_class_methods_spans(
+    class_span: SymbolSpan, class_code: str, overwrite_methods_docstrings: bool
+) -> list[SymbolSpan]:
+    """Get the spans in the module of the methods of a class that need a docstring.
+
+    A method span covers its whole lines, decorators included, and its code
+    is dedented when it is read. The names are qualified with the class name."""
+    parsed_symbol: Optional[tuple[ast.stmt, list[str]]] = parse_symbol(class_code)
+    if not parsed_symbol or not isinstance(parsed_symbol[0], ClassDef):
+        return []
+    node: ClassDef = parsed_symbol[0]
+    lines: list[bytes] = class_code.encode('utf-8').splitlines(keepends=True)
+    line_offsets: list[int] = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+    return [
+        SymbolSpan(
+            f'{class_span.name}.{statement.name}',
+            class_span.start + line_offsets[get_first_line(statement) - 1],
+            class_span.start
+            + line_offsets[statement.end_lineno - 1]
+            + len(lines[statement.end_lineno - 1].rstrip(b'\r\n')),
+            dedent=True,
+        )
+        for statement in node.body
+        if isinstance(statement, (FunctionDef, AsyncFunctionDef))
+        and (overwrite_methods_docstrings or not has_docstring(statement))
+    ]
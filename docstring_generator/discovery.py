@@ -0,0 +1,247 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from threading import Condition
+from typing import Callable, NamedTuple, Optional
+
+from .config import Config
+from .metrics import metrics
+
+GITIGNORE_FILE: str = '.gitignore'
+
+
+def translate_gitignore_pattern(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression on slash separated paths."""
+    regex: str = ''
+    i: int = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2 :]:
+            end: int = pattern.index(']', i + 2)
+            characters: str = pattern[i + 1 : end]
+            if characters.startswith('!'):
+                characters = '^' + characters[1:]
+            regex += f'[{characters}]'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex + r'\Z'
+
+
+class IgnorePattern(NamedTuple):
+    base_dir: str
+    regex: re.Pattern
+    anchored: bool
+    negated: bool
+    directories_only: bool
+
+    def match(self, entry_path: str, is_dir: bool) -> bool:
+        if self.directories_only and not is_dir:
+            return False
+        if self.anchored:
+            relative_path: str = os.path.relpath(entry_path, self.base_dir)
+            return bool(self.regex.match(relative_path.replace(os.sep, '/')))
+        return bool(self.regex.match(os.path.basename(entry_path)))
+
+
+def parse_gitignore(gitignore_file: str) -> list[IgnorePattern]:
+    """Parse the patterns of a gitignore file, relative to its directory."""
+    base_dir: str = os.path.dirname(gitignore_file)
+    patterns: list[IgnorePattern] = []
+    try:
+        with open(gitignore_file, 'r', encoding='utf-8', errors='replace') as f:
+            lines: list[str] = f.read().splitlines()
+    except OSError:
+        return patterns
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated: bool = line.startswith('!')
+        if negated:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        directories_only: bool = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        anchored: bool = '/' in line
+        patterns.append(
+            IgnorePattern(
+                base_dir=base_dir,
+                regex=re.compile(translate_gitignore_pattern(line.lstrip('/'))),
+                anchored=anchored,
+                negated=negated,
+                directories_only=directories_only,
+            )
+        )
+    return patterns
+
+
+def get_parent_gitignores(root_dir: str) -> list[IgnorePattern]:
+    """Get the patterns of the gitignore files above a root, up to the git repository root."""
+    gitignore_files: list[str] = []
+    parent_dir: str = os.path.dirname(os.path.abspath(root_dir))
+    while True:
+        gitignore_file: str = os.path.join(parent_dir, GITIGNORE_FILE)
+        if os.path.isfile(gitignore_file):
+            gitignore_files.append(gitignore_file)
+        if os.path.exists(os.path.join(parent_dir, '.git')):
+            break
+        next_dir: str = os.path.dirname(parent_dir)
+        if next_dir == parent_dir:
+            return []
+        parent_dir = next_dir
+    patterns: list[IgnorePattern] = []
+    for gitignore_file in reversed(gitignore_files):
+        patterns.extend(parse_gitignore(gitignore_file))
+    return patterns
+
+
+def get_unique_roots(paths: set[str]) -> list[str]:
+    """Drop the roots that are the same as, or inside, another root."""
+    unique_roots: list[str] = []
+    seen_paths: set[str] = set()
+    directories: list[str] = []
+    for root in sorted(paths, key=lambda root: (len(os.path.realpath(root)), root)):
+        real_path: str = os.path.realpath(root)
+        if real_path in seen_paths or any(
+            real_path.startswith(directory.rstrip(os.sep) + os.sep)
+            for directory in directories
+        ):
+            continue
+        seen_paths.add(real_path)
+        unique_roots.append(root)
+        if os.path.isdir(real_path):
+            directories.append(real_path)
+    return unique_roots
+
+
+class ModuleFinder:
+    """Find the python modules under the configured paths.
+
+    Directories are scanned with os.scandir on a thread pool, reusing the
+    file type cached in every directory entry, and every module is handed
+    to the callback as soon as it is found. Directories and files are
+    pruned by the configured names and globs and, optionally, by the
+    .gitignore files of the tree. Every scanned directory is also handed to
+    the directory callback, if any.
+
+    The symbolic links to directories are followed, and every real
+    directory is scanned once, so that a link cycle ends the scan."""
+
+    def __init__(
+        self,
+        config: Config,
+        on_module: Callable[[str], None],
+        on_directory: Optional[Callable[[str], None]] = None,
+    ):
+        self.config: Config = config
+        self.on_module: Callable[[str], None] = on_module
+        self.on_directory: Optional[Callable[[str], None]] = on_directory
+        self.pending: int = 0
+        self.scanned: set[str] = set()
+        self.condition: Condition = Condition()
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def is_ignored_by_config(self, entry_path: str, name: str, is_dir: bool) -> bool:
+        patterns: set[str] = (
+            self.config.directories_ignore if is_dir else self.config.files_ignore
+        )
+        if name in patterns or entry_path in patterns:
+            return True
+        normalized_path: str = os.path.normpath(entry_path)
+        return any(
+            fnmatch(name, pattern) or fnmatch(normalized_path, pattern)
+            for pattern in patterns
+        )
+
+    @staticmethod
+    def is_ignored_by_gitignore(
+        entry_path: str, is_dir: bool, patterns: list[IgnorePattern]
+    ) -> bool:
+        ignored: bool = False
+        for pattern in patterns:
+            if ignored == pattern.negated and pattern.match(entry_path, is_dir):
+                ignored = not pattern.negated
+        return ignored
+
+    def submit(self, directory: str, patterns: list[IgnorePattern]) -> None:
+        real_path: str = os.path.realpath(directory)
+        with self.condition:
+            if real_path in self.scanned:
+                return
+            self.scanned.add(real_path)
+            self.pending += 1
+        if self.on_directory:
+            self.on_directory(directory)
+        self.executor.submit(self.scan, directory, patterns)
+
+    def scan(self, directory: str, patterns: list[IgnorePattern]) -> None:
+        """Scan a directory, handing over its modules and submitting its subdirectories."""
+        try:
+            with os.scandir(directory) as scanned_entries:
+                entries: list[os.DirEntry] = list(scanned_entries)
+            if self.config.respect_gitignore and any(
+                entry.name == GITIGNORE_FILE for entry in entries
+            ):
+                patterns = patterns + parse_gitignore(
+                    os.path.join(directory, GITIGNORE_FILE)
+                )
+            for entry in entries:
+                is_dir: bool = entry.is_dir()
+                if not is_dir and not (entry.name.endswith('.py') and entry.is_file()):
+                    continue
+                if self.is_ignored_by_config(entry.path, entry.name, is_dir):
+                    continue
+                if patterns and self.is_ignored_by_gitignore(
+                    entry.path, is_dir, patterns
+                ):
+                    continue
+                if is_dir:
+                    self.submit(entry.path, patterns)
+                else:
+                    self.on_module(entry.path)
+        except Exception as e:
+            metrics.record_failure(directory, None, 'discover', e)
+        finally:
+            with self.condition:
+                self.pending -= 1
+                if not self.pending:
+                    self.condition.notify_all()
+
+    def find(self) -> None:
+        """Hand over every module under the configured paths, then return."""
+        with ThreadPoolExecutor(
+            max_workers=max(self.config.discovery_workers, 1),
+            thread_name_prefix='discovery',
+        ) as self.executor:
+            self.scanned = set()
+            for root in get_unique_roots(self.config.path):
+                if os.path.isfile(root):
+                    self.on_module(root)
+                    continue
+                name: str = os.path.basename(os.path.normpath(root))
+                if self.is_ignored_by_config(root, name, True):
+                    continue
+                patterns: list[IgnorePattern] = []
+                if self.config.respect_gitignore:
+                    patterns = get_parent_gitignores(root)
+                self.submit(root, patterns)
+            with self.condition:
+                while self.pending:
+                    self.condition.wait()
@@ -0,0 +1,306 @@
+import ast
+import json
+import os
+import re
+import sys
+from ast import AsyncFunctionDef, ClassDef
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from .config import Config
+from .discovery import ModuleFinder
+from .parsed_module import ParsedModule, SymbolNode
+from .shard import is_in_shard
+
+SELF_NAMES: set[str] = {'self', 'cls'}
+SPHINX_PARAMETER_PATTERN = re.compile(r':param\s+(?:[^:]*\s)?\*{0,2}(\w+)\s*:')
+GOOGLE_SECTION_PATTERN = re.compile(r'^(?:Args|Arguments|Parameters|Keyword Args):$')
+GOOGLE_ENTRY_PATTERN = re.compile(r'^\*{0,2}(\w+)\s*(?:\(.*\))?\s*:')
+NUMPY_SECTION_NAMES: set[str] = {'Parameters', 'Other Parameters'}
+NUMPY_ENTRY_PATTERN = re.compile(r'^(\*{0,2}\w+(?:\s*,\s*\*{0,2}\w+)*)\s*(?::.*)?$')
+SARIF_RULES: dict[str, str] = {
+    'missing-docstring': 'The function, method or class has no docstring',
+    'stale-docstring': 'The parameters of the docstring do not match the signature',
+}
+
+
+def get_indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def get_google_parameters(lines: list[str]) -> Optional[set[str]]:
+    """Get the parameters of the Args section of a Google style docstring, if it has one."""
+    parameters: Optional[set[str]] = None
+    section_indent: Optional[int] = None
+    entry_indent: Optional[int] = None
+    for line in lines:
+        if section_indent is None:
+            if GOOGLE_SECTION_PATTERN.match(line.strip()):
+                section_indent = get_indent(line)
+                parameters = parameters or set()
+            continue
+        if not line.strip():
+            continue
+        indent: int = get_indent(line)
+        if indent <= section_indent:
+            section_indent = entry_indent = None
+            if GOOGLE_SECTION_PATTERN.match(line.strip()):
+                section_indent = indent
+            continue
+        if entry_indent is None:
+            entry_indent = indent
+        if indent == entry_indent:
+            match: Optional[re.Match] = GOOGLE_ENTRY_PATTERN.match(line.strip())
+            if match:
+                parameters.add(match.group(1))
+    return parameters
+
+
+def get_numpy_parameters(lines: list[str]) -> Optional[set[str]]:
+    """Get the parameters of the Parameters sections of a Numpy style docstring, if it has one."""
+    parameters: Optional[set[str]] = None
+    section_indent: Optional[int] = None
+    index: int = 0
+    while index < len(lines):
+        line: str = lines[index]
+        next_line: str = lines[index + 1].strip() if index + 1 < len(lines) else ''
+        is_header: bool = bool(next_line) and set(next_line) == {'-'}
+        if is_header:
+            section_indent = None
+            if line.strip() in NUMPY_SECTION_NAMES:
+                section_indent = get_indent(line)
+                parameters = parameters or set()
+            index += 2
+            continue
+        if (
+            section_indent is not None
+            and line.strip()
+            and get_indent(line) == section_indent
+        ):
+            match: Optional[re.Match] = NUMPY_ENTRY_PATTERN.match(line.strip())
+            if match:
+                parameters.update(
+                    name.strip().lstrip('*') for name in match.group(1).split(',')
+                )
+        index += 1
+    return parameters
+
+
+def get_documented_parameters(docstring: str) -> Optional[set[str]]:
+    """Get the parameters documented by a Numpy, Google or Sphinx style docstring.
+
+    None is returned for a docstring that documents no parameters at all,
+    which is not stale."""
+    sphinx_parameters: list[str] = SPHINX_PARAMETER_PATTERN.findall(docstring)
+    if sphinx_parameters:
+        return set(sphinx_parameters)
+    lines: list[str] = docstring.expandtabs().splitlines()
+    numpy_parameters: Optional[set[str]] = get_numpy_parameters(lines)
+    if numpy_parameters is not None:
+        return numpy_parameters
+    return get_google_parameters(lines)
+
+
+def get_signature_parameters(node: SymbolNode, is_method: bool) -> list[str]:
+    """Get the names of the parameters of a function, without the self or cls of a method."""
+    arguments: ast.arguments = node.args
+    names: list[str] = [
+        argument.arg for argument in arguments.posonlyargs + arguments.args
+    ]
+    if is_method and names and names[0] in SELF_NAMES:
+        names = names[1:]
+    if arguments.vararg:
+        names.append(arguments.vararg.arg)
+    names.extend(argument.arg for argument in arguments.kwonlyargs)
+    if arguments.kwarg:
+        names.append(arguments.kwarg.arg)
+    return names
+
+
+def get_symbol_issue(
+    module_path: str, symbol_name: str, node: SymbolNode, is_method: bool
+) -> Optional[dict]:
+    """Get the missing or stale docstring issue of a symbol, if it has one."""
+    kind: str = (
+        'class'
+        if isinstance(node, ClassDef)
+        else ('method' if is_method else 'function')
+    )
+    if isinstance(node, AsyncFunctionDef):
+        kind = f'async {kind}'
+    issue: dict = {
+        'path': module_path,
+        'line': node.lineno,
+        'symbol': symbol_name,
+        'kind': kind,
+    }
+    docstring: Optional[str] = ast.get_docstring(node)
+    if not docstring:
+        issue['issue'] = 'missing-docstring'
+        return issue
+    if isinstance(node, ClassDef):
+        return None
+    documented: Optional[set[str]] = get_documented_parameters(docstring)
+    if documented is None:
+        return None
+    parameters: list[str] = get_signature_parameters(node, is_method)
+    undocumented: list[str] = [name for name in parameters if name not in documented]
+    unknown: list[str] = sorted(documented - set(parameters))
+    if not undocumented and not unknown:
+        return None
+    issue['issue'] = 'stale-docstring'
+    issue['undocumented_parameters'] = undocumented
+    issue['unknown_parameters'] = unknown
+    return issue
+
+
+def scan_module(module_path: str) -> dict:
+    """Scan the functions, classes and methods of a module for missing and stale docstrings.
+
+    Only the symbols the generator documents are scanned: the top level
+    functions and classes, and the methods of the top level classes."""
+    result: dict = {'path': module_path, 'symbols': 0, 'issues': [], 'error': None}
+    try:
+        parsed_module: ParsedModule = ParsedModule.from_path(module_path)
+    except (OSError, SyntaxError, UnicodeDecodeError, ValueError) as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+    for symbol in parsed_module.iter_symbols():
+        depth: int = symbol.qualified_name.count('.')
+        if depth > 1 or (depth == 1 and not symbol.is_method):
+            continue
+        result['symbols'] += 1
+        issue: Optional[dict] = get_symbol_issue(
+            module_path, symbol.qualified_name, symbol.node, symbol.is_method
+        )
+        if issue:
+            result['issues'].append(issue)
+    return result
+
+
+def get_coverage_report(config: Config) -> dict:
+    """Scan every module under the configured paths, on all the cores, into a coverage report."""
+    module_paths: list[str] = []
+
+    def add_module(module_path: str) -> None:
+        if is_in_shard(module_path, config.shard_index, config.shard_count):
+            module_paths.append(module_path)
+
+    ModuleFinder(config=config, on_module=add_module).find()
+    chunk_size: int = max(config.process_chunk_size, 1)
+    processes: int = config.processes or os.cpu_count() or 1
+    if processes > 1 and len(module_paths) > chunk_size:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results: list[dict] = list(
+                pool.map(scan_module, module_paths, chunksize=chunk_size)
+            )
+    else:
+        results = [scan_module(module_path) for module_path in module_paths]
+    issues: list[dict] = sorted(
+        (issue for result in results for issue in result['issues']),
+        key=lambda issue: (issue['path'], issue['line']),
+    )
+    symbols: int = sum(result['symbols'] for result in results)
+    missing: int = sum(issue['issue'] == 'missing-docstring' for issue in issues)
+    stale: int = len(issues) - missing
+    return {
+        'summary': {
+            'modules': len(results),
+            'symbols': symbols,
+            'documented': symbols - missing,
+            'missing': missing,
+            'stale': stale,
+            'coverage': (
+                round(100 * (symbols - len(issues)) / symbols, 2) if symbols else 100.0
+            ),
+        },
+        'issues': issues,
+        'errors': [
+            {'path': result['path'], 'error': result['error']}
+            for result in results
+            if result['error']
+        ],
+    }
+
+
+def get_issue_message(issue: dict) -> str:
+    if issue['issue'] == 'missing-docstring':
+        return f"The {issue['kind']} {issue['symbol']} has no docstring"
+    details: list[str] = []
+    if issue['undocumented_parameters']:
+        details.append(f"undocumented {', '.join(issue['undocumented_parameters'])}")
+    if issue['unknown_parameters']:
+        details.append(f"unknown {', '.join(issue['unknown_parameters'])}")
+    return (
+        f"The docstring of the {issue['kind']} {issue['symbol']} does not match "
+        f"its signature: {'; '.join(details)}"
+    )
+
+
+def get_artifact_uri(module_path: str) -> str:
+    """Get the SARIF uri of a module, relative to the scanned checkout unless its path is absolute."""
+    if os.path.isabs(module_path):
+        return Path(module_path).as_uri()
+    return os.path.normpath(module_path).replace(os.sep, '/')
+
+
+def get_sarif_report(report: dict) -> dict:
+    """Convert a coverage report to a SARIF 2.1.0 log, for the code scanning of the CI."""
+    return {
+        '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+        'version': '2.1.0',
+        'runs': [
+            {
+                'tool': {
+                    'driver': {
+                        'name': 'docstring-generator',
+                        'rules': [
+                            {'id': rule_id, 'shortDescription': {'text': description}}
+                            for rule_id, description in SARIF_RULES.items()
+                        ],
+                    }
+                },
+                'results': [
+                    {
+                        'ruleId': issue['issue'],
+                        'level': 'warning',
+                        'message': {'text': get_issue_message(issue)},
+                        'locations': [
+                            {
+                                'physicalLocation': {
+                                    'artifactLocation': {
+                                        'uri': get_artifact_uri(issue['path'])
+                                    },
+                                    'region': {'startLine': issue['line']},
+                                }
+                            }
+                        ],
+                    }
+                    for issue in report['issues']
+                ],
+            }
+        ],
+    }
+
+
+def report_coverage(config: Config) -> int:
+    """Write the coverage report of the modules, and get the exit code of the scan.
+
+    The exit code is 1 when the share of the symbols with an up to date
+    docstring is below the configured minimum, 0 otherwise."""
+    report: dict = get_coverage_report(config)
+    data: dict = get_sarif_report(report) if config.report_format == 'sarif' else report
+    output: str = json.dumps(data, indent=2)
+    if not config.report_file or config.report_file == '-':
+        print(output)
+    else:
+        with open(config.report_file, 'w') as f:
+            f.write(output)
+    summary: dict = report['summary']
+    print(
+        f"Docstring coverage: {summary['coverage']}% of {summary['symbols']} symbols, "
+        f"{summary['missing']} missing and {summary['stale']} stale docstrings",
+        file=sys.stderr,
+    )
+    return 1 if summary['coverage'] < config.coverage_fail_under else 0
@@ -1,55 +1,266 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from queue import Queue
 from threading import Thread
+from typing import Callable, Optional, Union
 
+from .cache import DocstringCache
+from .collector import DocstringCollector
 from .config import Config
+from .engine import LLMEngine
 from .file_processor import (
     generate_function_docstrings,
     queue_unprocessed_functions_methods,
+    queue_unprocessed_functions_methods_in_processes,
     generate_class_docstrings,
+    write_module_docstrings,
 )
 from .helpers import get_all_modules
+from .journal import RunJournal
+from .manifest import RunManifest
+from .metrics import metrics
+from .patch import PatchWriter
+from .scheduler import ScheduledQueue
+from .symbol_index import SymbolIndex
 
+logger: logging.Logger = logging.getLogger(__name__)
 
-def generate_docstrings(
-    config: Config,
-    module_path_queue: Queue,
-    functions_source_queue: Queue,
-    class_source_queue: Queue,
-    failed_modules_queue: Queue,
-) -> None:
-    """Generate docstrings for classes and methods."""
-    queue_modules: Thread = Thread(
-        target=get_all_modules,
-        name='get_all_modules',
-        args=(config, module_path_queue),
-    )
-    queue_modules.start()
 
-    for _ in range(1):
-        get_functions_source_thread: Thread = Thread(
-            target=queue_unprocessed_functions_methods,
-            args=(functions_source_queue, class_source_queue, module_path_queue),
-            daemon=True,
+class DocstringPipeline:
+    """The threads of the pipeline and the state they share, kept for several runs.
+
+    The extraction, the llm workers and the writer are started once, along
+    with the cache, the llm engine, the manifest and the symbol index. Every
+    run queues its modules and waits for the queues to drain, so that a
+    long running process only pays for the modules that changed."""
+
+    def __init__(
+        self,
+        config: Config,
+        module_path_queue: Queue,
+        functions_source_queue: ScheduledQueue,
+        class_source_queue: ScheduledQueue,
+        failed_modules_queue: Queue,
+        module_docstrings_queue: Queue,
+        engine: Optional[LLMEngine] = None,
+    ):
+        self.config: Config = config
+        self.module_path_queue: Queue = module_path_queue
+        self.functions_source_queue: ScheduledQueue = functions_source_queue
+        self.class_source_queue: ScheduledQueue = class_source_queue
+        self.failed_modules_queue: Queue = failed_modules_queue
+        self.module_docstrings_queue: Queue = module_docstrings_queue
+        self.engine: LLMEngine = engine or LLMEngine(llm=None, config=config)
+        functions_source_queue.policy = config.schedule_policy
+        class_source_queue.policy = config.schedule_policy
+        for bounded_queue in (
+            module_path_queue,
+            functions_source_queue,
+            class_source_queue,
+            module_docstrings_queue,
+        ):
+            bounded_queue.maxsize = config.queue_max_size
+        self.index: Optional[SymbolIndex] = None
+        if config.context_index:
+            self.index = SymbolIndex(config.index_file)
+        functions_source_queue.index = self.index
+        class_source_queue.index = self.index
+        self.collector: DocstringCollector = DocstringCollector(
+            module_docstrings_queue, self.index
+        )
+        self.cache: Optional[DocstringCache] = None
+        # A dry run only reads an existing cache, so that it writes nothing.
+        if config.use_cache and (
+            not config.dry_run or os.path.exists(config.cache_file)
+        ):
+            self.cache = DocstringCache(
+                cache_file=config.cache_file,
+                max_entries=config.cache_max_entries,
+                read_only=config.dry_run,
+            )
+        self.journal: Optional[RunJournal] = None
+        if config.checkpoint and not config.dry_run:
+            self.journal = RunJournal(
+                journal_file=config.checkpoint_file,
+                resume=config.resume,
+                cache=self.cache,
+            )
+        self.manifest: Optional[RunManifest] = None
+        if config.incremental:
+            self.manifest = RunManifest(
+                config.manifest_file, (config.shard_index, config.shard_count)
+            )
+        self.pool: Optional[ProcessPoolExecutor] = None
+        if config.processes:
+            self.pool = ProcessPoolExecutor(max_workers=config.processes)
+        self.patch_writer: Optional[PatchWriter] = None
+        if config.dry_run:
+            self.patch_writer = PatchWriter(config.patch_file)
+        self.started: bool = False
+
+    def start(self) -> None:
+        """Start the extraction, the llm workers and the writer threads."""
+        if self.started:
+            return
+        self.started = True
+        config: Config = self.config
+        replies: Optional[Union[RunJournal, DocstringCache]] = (
+            self.journal or self.cache
         )
+        if self.pool:
+            get_functions_source_thread: Thread = Thread(
+                target=queue_unprocessed_functions_methods_in_processes,
+                args=(
+                    self.functions_source_queue,
+                    self.class_source_queue,
+                    self.module_path_queue,
+                    self.collector,
+                    config,
+                    self.pool,
+                    self.manifest,
+                ),
+                daemon=True,
+            )
+        else:
+            get_functions_source_thread = Thread(
+                target=queue_unprocessed_functions_methods,
+                args=(
+                    self.functions_source_queue,
+                    self.class_source_queue,
+                    self.module_path_queue,
+                    self.collector,
+                    config,
+                    self.manifest,
+                ),
+                daemon=True,
+            )
         get_functions_source_thread.start()
 
-    for _ in range(1):
-        generate_functions_docstring_thread: Thread = Thread(
-            target=generate_function_docstrings,
-            args=(functions_source_queue, config),
+        for _ in range(1):
+            generate_functions_docstring_thread: Thread = Thread(
+                target=generate_function_docstrings,
+                args=(
+                    self.functions_source_queue,
+                    self.collector,
+                    self.engine,
+                    config,
+                    replies,
+                    self.index,
+                ),
+                daemon=True,
+            )
+            generate_functions_docstring_thread.start()
+
+        for _ in range(1):
+            generate_class_docstring_thread: Thread = Thread(
+                target=generate_class_docstrings,
+                args=(
+                    self.class_source_queue,
+                    self.collector,
+                    self.engine,
+                    config,
+                    replies,
+                    self.functions_source_queue,
+                    self.index,
+                ),
+                daemon=True,
+            )
+            generate_class_docstring_thread.start()
+
+        write_module_docstrings_thread: Thread = Thread(
+            target=write_module_docstrings,
+            args=(
+                self.module_docstrings_queue,
+                config,
+                None if config.dry_run else self.manifest,
+                self.pool,
+                self.patch_writer,
+                self.journal,
+            ),
             daemon=True,
         )
-        generate_functions_docstring_thread.start()
+        write_module_docstrings_thread.start()
 
-    for _ in range(1):
-        generate_class_docstring_thread: Thread = Thread(
-            target=generate_class_docstrings,
-            args=(class_source_queue, config),
-            daemon=True,
+    def run(self, queue_modules: Callable[[], None]) -> None:
+        """Run the pipeline on the modules queued by a callable, until they are all written."""
+        config: Config = self.config
+        metrics.reset(
+            failed_modules_queue=self.failed_modules_queue,
+            prompt_token_cost=config.prompt_token_cost,
+            completion_token_cost=config.completion_token_cost,
+        )
+        self.engine.reset_budget()
+        metrics.start(
+            queues={
+                'modules': self.module_path_queue,
+                'functions': self.functions_source_queue,
+                'classes': self.class_source_queue,
+                'module_docstrings': self.module_docstrings_queue,
+            },
+            config=config,
         )
-        generate_class_docstring_thread.start()
+        self.start()
+        queue_modules_thread: Thread = Thread(
+            target=queue_modules, name='get_all_modules'
+        )
+        queue_modules_thread.start()
+
+        queue_modules_thread.join()
+        self.module_path_queue.join()
+        self.functions_source_queue.join()
+        self.class_source_queue.join()
+        self.collector.join()
+        self.module_docstrings_queue.join()
+
+        if self.manifest and not config.dry_run:
+            self.manifest.save()
+        if self.index and not config.dry_run:
+            self.index.save()
+
+        metrics.stop()
+        if config.report_file:
+            metrics.save_report(config.report_file, config.report_format, self.cache)
 
-    queue_modules.join()
-    module_path_queue.join()
-    functions_source_queue.join()
-    class_source_queue.join()
+    def close(self) -> None:
+        self.engine.stop()
+        if self.pool:
+            self.pool.shutdown()
+        if self.patch_writer:
+            self.patch_writer.close()
+        if self.journal:
+            self.journal.close()
+        if self.cache:
+            logger.info('%s', self.cache)
+            self.cache.close()
+
+
+def generate_docstrings(
+    config: Config,
+    module_path_queue: Queue,
+    functions_source_queue: ScheduledQueue,
+    class_source_queue: ScheduledQueue,
+    failed_modules_queue: Queue,
+    module_docstrings_queue: Queue,
+    engine: Optional[LLMEngine] = None,
+) -> None:
+    """Generate docstrings for classes and methods."""
+    pipeline: DocstringPipeline = DocstringPipeline(
+        config,
+        module_path_queue,
+        functions_source_queue,
+        class_source_queue,
+        failed_modules_queue,
+        module_docstrings_queue,
+        engine,
+    )
+    pipeline.run(
+        lambda: get_all_modules(
+            config,
+            module_path_queue,
+            pipeline.manifest,
+            pipeline.journal,
+            pipeline.index,
+        )
+    )
+    pipeline.close()
@@ -1,145 +1,161 @@
 import ast
-from _ast import ClassDef, FunctionDef
+from _ast import AsyncFunctionDef, ClassDef, FunctionDef
 from ast import NodeTransformer
-from typing import Any
-
-from pydantic import BaseModel, Field
+from typing import Any, Optional, Union
 
+from .collector import ModuleDocstrings
 from .config import Config
-from .helpers import (
-    generate_class_docstring,
-    generate_function_docstring,
-    get_class_docstring,
-    get_class_methods_docstrings,
-    get_function_docstring,
-    get_module_source_code,
-    make_docstring_node,
-)
-
-
-class FunctionDocStringWriter(NodeTransformer, BaseModel):
-    module_path: str = Field(description='The path to this module')
-    function_name: str = Field(
-        description='The name of the function to generate docstrings'
-    )
-    function_code: str = Field(description='The source code for this function')
-    config: Config = Field(description='The application configurations.')
-
-    @property
-    def module_code(self) -> str:
-        return get_module_source_code(self.module_path)
+from .helpers import make_docstring_literal, set_docstring
+from .parsed_module import ParsedModule, SymbolNode
+
+
+class ModuleDocStringWriter(NodeTransformer):
+    """Set the generated docstrings in the ast of a module, then unparse it.
+
+    A writer is created once and reused for every module."""
+
+    def __init__(self, config: Config):
+        self.config: Config = config
+        self.module_docstrings: Optional[ModuleDocstrings] = None
+
+    def write(self, module_docstrings: ModuleDocstrings) -> str:
+        """Get the source code of a module with its generated docstrings applied."""
+        self.module_docstrings = module_docstrings
+        try:
+            new_tree = self.visit(module_docstrings.parsed_module.tree)
+        finally:
+            self.module_docstrings = None
+        ast.fix_missing_locations(new_tree)
+        return ast.unparse(new_tree)
 
     def visit_FunctionDef(self, node: FunctionDef) -> Any:
-        docstring: str = ast.get_docstring(node=node)
-        if node.name == self.function_name and (
-            self.config.overwrite_function_docstring or not docstring
-        ):
-            function_code: str = ast.get_source_segment(
-                source=self.module_code, node=node, padded=True
-            )
-            function_and_docstring: str = generate_function_docstring(
-                function_code=function_code, config=self.config
-            )
-            try:
-                function_docstring: str = get_function_docstring(function_and_docstring)
-            except Exception:
-                new_docstring_node = make_docstring_node(function_and_docstring)
-            else:
-                new_docstring_node = make_docstring_node(function_docstring)
-            node.body.insert(0, new_docstring_node)
+        docstring: str = self.module_docstrings.function_docstrings.get(node.name)
+        if docstring:
+            set_docstring(node, docstring)
         return node
 
+    visit_AsyncFunctionDef = visit_FunctionDef
 
-class ClassDocStringWriter(NodeTransformer, BaseModel):
-    module_path: str = Field(description='The path to this module')
-    class_name: str = Field(description='The name of the class to generate docstrings')
-    class_code: str = Field(description='The source code for this class')
-    config: Config = Field(description='The application configurations.')
+    def visit_ClassDef(self, node: ClassDef) -> Any:
+        docstring: str = self.module_docstrings.class_docstrings.get(node.name)
+        if docstring:
+            set_docstring(node, docstring)
+        methods_docstrings: dict[str, str] = (
+            self.module_docstrings.methods_docstrings.get(node.name, {})
+        )
+        for class_node in node.body:
+            if isinstance(class_node, (FunctionDef, AsyncFunctionDef)):
+                function_doc: str = ast.get_docstring(node=class_node)
+                method_docstring: str = methods_docstrings.get(class_node.name)
+                if method_docstring and (
+                    not function_doc or self.config.overwrite_class_methods_docstring
+                ):
+                    set_docstring(class_node, method_docstring)
+        return node
 
-    @property
-    def module_code(self) -> str:
-        return get_module_source_code(self.module_path)
 
-    def visit_ClassDef(self, node: ClassDef) -> Any:
-        docstring: str = ast.get_docstring(node=node)
-        if node.name == self.class_name and (
-            self.config.overwrite_class_docstring or not docstring
-        ):
-            class_code: str = ast.get_source_segment(
-                source=self.module_code, node=node, padded=True
-            )
-            class_and_docstring: str = generate_class_docstring(
-                class_code=class_code, config=self.config
-            )
-            try:
-                class_docstring: str = get_class_docstring(class_and_docstring)
-            except Exception:
-                class_docstring = class_and_docstring
-                new_docstring_node = make_docstring_node(class_and_docstring)
-                class_docstring = class_and_docstring
+class DocstringSplicer:
+    """Insert the generated docstrings into the original source code of a module.
+
+    Only the docstrings are edited, so the comments and the formatting of the
+    rest of the module are preserved. A splicer is created once and reused
+    for every module."""
+
+    def __init__(self, config: Config):
+        self.config: Config = config
+
+    def get_edit(
+        self, parsed_module: ParsedModule, node: SymbolNode, docstring: str
+    ) -> tuple[int, int, str]:
+        """Get the start and end offsets and the text that sets the docstring of a node."""
+        first_node: ast.stmt = node.body[0]
+        first_lineno: int = min(
+            [first_node.lineno]
+            + [
+                decorator.lineno
+                for decorator in getattr(first_node, 'decorator_list', [])
+            ]
+        )
+        line_start: int = parsed_module.line_offsets[first_lineno - 1]
+        start, end = parsed_module.get_offsets(first_node)
+        indent: str = parsed_module.source_bytes[
+            line_start : line_start + first_node.col_offset
+        ].decode('utf-8')
+        starts_line: bool = not indent.strip()
+        if not starts_line:
+            indent = ' ' * (node.col_offset + 4)
+        # Keep the line endings of the module, such as CRLF, in the docstring.
+        line: str = parsed_module.get_line(node.lineno)
+        newline: str = line[len(line.rstrip('\r\n')) :] or '\n'
+        literal: str = make_docstring_literal(docstring, indent).replace('\n', newline)
+        if ast.get_docstring(node=node) is not None:
+            return start, end, literal
+        if starts_line:
+            insert_lineno: int = first_lineno
+            while insert_lineno - 1 > node.lineno and (
+                not parsed_module.get_line(insert_lineno - 1).strip()
+                or parsed_module.get_line(insert_lineno - 1).lstrip().startswith('#')
+            ):
+                insert_lineno -= 1
+            insert_at: int = parsed_module.line_offsets[insert_lineno - 1]
+            return insert_at, insert_at, f'{indent}{literal}{newline}'
+        return start, start, f'{literal}; '
+
+    def get_edits(
+        self, module_docstrings: ModuleDocstrings
+    ) -> list[tuple[int, int, str]]:
+        edits: list[tuple[int, int, str]] = []
+        parsed_module: ParsedModule = module_docstrings.parsed_module
+        for node in parsed_module.iter_top_level_symbols():
+            if isinstance(node, ClassDef):
+                docstring: str = module_docstrings.class_docstrings.get(node.name)
+                if docstring:
+                    edits.append(self.get_edit(parsed_module, node, docstring))
+                methods_docstrings: dict[str, str] = (
+                    module_docstrings.methods_docstrings.get(node.name, {})
+                )
+                for class_node in node.body:
+                    if isinstance(class_node, (FunctionDef, AsyncFunctionDef)):
+                        method_docstring: str = methods_docstrings.get(class_node.name)
+                        if method_docstring and (
+                            not ast.get_docstring(node=class_node)
+                            or self.config.overwrite_class_methods_docstring
+                        ):
+                            edits.append(
+                                self.get_edit(
+                                    parsed_module, class_node, method_docstring
+                                )
+                            )
             else:
-                new_docstring_node = make_docstring_node(class_docstring)
-            node.body.insert(0, new_docstring_node)
-            methods_docstrings: dict[str, str] = get_class_methods_docstrings(
-                class_and_docstring
+                docstring = module_docstrings.function_docstrings.get(node.name)
+                if docstring:
+                    edits.append(self.get_edit(parsed_module, node, docstring))
+        return edits
+
+    def write(self, module_docstrings: ModuleDocstrings) -> str:
+        """Get the source code of the module with the docstrings inserted."""
+        source_bytes: bytes = module_docstrings.parsed_module.source_bytes
+        for start, end, text in sorted(self.get_edits(module_docstrings), reverse=True):
+            source_bytes = (
+                source_bytes[:start] + text.encode('utf-8') + source_bytes[end:]
             )
-            for class_node in node.body:
-                if isinstance(class_node, FunctionDef):
-                    function_doc: str = ast.get_docstring(node=class_node)
-                    if (
-                        not function_doc
-                        or self.config.overwrite_class_methods_docstring
-                    ):
-                        function_name: str = class_node.name
-                        new_docstring_node = make_docstring_node(
-                            methods_docstrings[function_name]
-                        )
-                        class_node.body.insert(0, new_docstring_node)
-        return node
+        return source_bytes.decode('utf-8')
 
 
-class DocstringWriter(NodeTransformer, BaseModel):
-    module_code: str = Field(description='The source code for this module')
-    config: Config = Field(description='The application configurations.')
+DocstringWriter = Union[DocstringSplicer, ModuleDocStringWriter]
 
-    def visit_classDef(self, node: FunctionDef) -> Any:
-        docstring: str = ast.get_docstring(node=node)
-        if self.config.overwrite_function_docstring or not docstring:
-            function_code: str = ast.get_source_segment(
-                source=self.module_code, node=node, padded=True
-            )
-            function_and_docstring: str = generate_function_docstring(
-                function_code, self.config
-            )
-            function_docstring: str = get_function_docstring(function_and_docstring)
-            new_docstring_node = make_docstring_node(function_docstring)
-            node.body.insert(0, new_docstring_node)
 
-        return node
+def get_docstring_writer(config: Config) -> DocstringWriter:
+    """Create the writer of the configured write mode, to reuse for every module."""
+    if config.write_mode == 'splice':
+        return DocstringSplicer(config)
+    return ModuleDocStringWriter(config)
 
-    def visit_ClassDef(self, node: ClassDef) -> Any:
-        docstring: str = ast.get_docstring(node=node)
-        if not docstring or self.config.overwrite_class_docstring:
-            class_code: str = ast.get_source_segment(
-                source=self.module_code, node=node, padded=True
-            )
-            class_and_docstring: str = generate_class_docstring(class_code, self.config)
-            class_docstring: str = get_class_docstring(class_and_docstring)
-            new_docstring_node = make_docstring_node(class_docstring)
-            node.body.insert(0, new_docstring_node)
-            methods_docstrings: dict[str, str] = get_class_methods_docstrings(
-                class_and_docstring
-            )
-            for class_node in node.body:
-                if isinstance(class_node, FunctionDef):
-                    function_doc: str = ast.get_docstring(node=class_node)
-                    if (
-                        not function_doc
-                        or self.config.overwrite_class_methods_docstring
-                    ):
-                        function_name: str = class_node.name
-                        new_docstring_node = make_docstring_node(
-                            methods_docstrings[function_name]
-                        )
-                        class_node.body.insert(0, new_docstring_node)
-        return node
+
+def write_module_docstrings_code(
+    module_docstrings: ModuleDocstrings,
+    config: Config,
+    writer: Optional[DocstringWriter] = None,
+) -> str:
+    """Get the source code of a module with its generated docstrings applied."""
+    return (writer or get_docstring_writer(config)).write(module_docstrings)
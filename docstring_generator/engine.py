@@ -0,0 +1,326 @@
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import BoundedSemaphore, Lock, Thread
+from typing import Any, Optional
+
+from .config import Config
+from .metrics import metrics
+from .providers import get_llm
+
+RETRYABLE_STATUS_CODES: set[int] = {408, 409, 429}
+# The connection and timeout errors of the http and openai clients, matched by name
+# so that these libraries are only imported by the providers.
+RETRYABLE_ERROR_NAMES: set[str] = {'APIConnectionError', 'TransportError'}
+MAX_LATENCY_SAMPLES: int = 200
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in a text."""
+    return len(text) // 4 + 1
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Get the http status code of an llm client error if any."""
+    status_code: Optional[int] = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether an llm call that failed with this error should be retried."""
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    status_code: Optional[int] = get_status_code(error)
+    if status_code is None:
+        return False
+    return status_code in RETRYABLE_STATUS_CODES or 500 <= status_code < 600
+
+
+class TokenBucket:
+    """A token bucket refilled continuously up to its capacity every minute."""
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity: float = float(capacity_per_minute)
+        self.rate: float = capacity_per_minute / 60
+        self.tokens: float = self.capacity
+        self.updated_at: float = time.monotonic()
+        self.lock: asyncio.Lock = asyncio.Lock()
+
+    async def acquire(self, amount: int = 1) -> None:
+        """Wait until the amount of tokens is available, then take them."""
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now: float = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class BudgetExhaustedError(Exception):
+    """The error of the llm calls submitted once the token or cost budget of the run is used up."""
+
+
+class LLMEngine:
+    """Run the llm calls concurrently on an asyncio event loop.
+
+    The number of concurrent calls is bounded, the calls are rate limited by
+    requests and tokens per minute, and calls that fail with a rate limit,
+    timeout or server error are retried with a jittered exponential backoff.
+    Without an llm, the configured provider creates one on the first call.
+
+    Once the token or cost budget of the run is used up, counting the
+    prompts in flight, the submitted calls fail with BudgetExhaustedError
+    so that the run stops cleanly. An engine kept for several runs gets the
+    whole budget again for each of them.
+
+    With a batch size above 1, the prompts submitted within the batch delay
+    are sent to the llm in one batched request, counted as one call.
+
+    A call submitted with a group key is shared by the duplicate symbols of
+    the group: while it is in flight, they join it instead of calling the llm.
+
+    With a hedge quantile, a request still running after that quantile of
+    the recent latencies is hedged: a duplicate request is sent, the first
+    reply wins and the other request is cancelled."""
+
+    def __init__(self, llm: Optional[Any], config: Config):
+        self.llm: Optional[Any] = llm
+        self.config: Config = config
+        self.lock: Lock = Lock()
+        self.max_retries: int = config.max_retries
+        self.backoff: float = config.retry_backoff
+        self.max_backoff: float = config.retry_max_backoff
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(config.max_concurrency)
+        self.in_flight: BoundedSemaphore = BoundedSemaphore(config.max_concurrency * 2)
+        self.requests_bucket: TokenBucket = TokenBucket(config.requests_per_minute)
+        self.tokens_bucket: TokenBucket = TokenBucket(config.tokens_per_minute)
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.thread: Optional[Thread] = None
+        self.calls: int = 0
+        self.retries: int = 0
+        self.token_budget: int = config.token_budget
+        self.cost_budget: float = config.cost_budget
+        self.reserved_tokens: int = 0
+        self.budget_exhausted: bool = False
+        self.batch_size: int = config.llm_batch_size
+        self.batch_delay: float = config.llm_batch_delay
+        self.batch: list[tuple[str, asyncio.Future]] = []
+        self.batch_timer: Optional[asyncio.TimerHandle] = None
+        self.groups: dict[str, Future] = {}
+        self.hedge_quantile: float = config.hedge_quantile
+        self.hedge_min_samples: int = config.hedge_min_samples
+        self.latencies: deque[float] = deque(maxlen=MAX_LATENCY_SAMPLES)
+
+    def start(self) -> 'LLMEngine':
+        with self.lock:
+            if self.llm is None:
+                self.llm = get_llm(self.config)
+            if not self.thread:
+                self.thread = Thread(
+                    target=self.loop.run_forever, name='llm_engine', daemon=True
+                )
+                self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.thread:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    async def call(self, prompts: list[str]) -> list[str]:
+        """Call the llm with one prompt or a batch of prompts once a concurrency slot and the rate limits allow it."""
+        async with self.semaphore:
+            await self.requests_bucket.acquire()
+            await self.tokens_bucket.acquire(
+                sum(estimate_tokens(prompt) for prompt in prompts)
+            )
+            attempt: int = 0
+            while True:
+                try:
+                    self.calls += 1
+                    metrics.increment('llm_calls')
+                    with metrics.time('llm'):
+                        replies: list[str] = await self.hedged_request(prompts)
+                    for prompt, reply in zip(prompts, replies):
+                        metrics.record_tokens(
+                            estimate_tokens(prompt), estimate_tokens(reply)
+                        )
+                    return replies
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        raise
+                    self.retries += 1
+                    metrics.increment('llm_retries')
+                    await asyncio.sleep(
+                        random.uniform(
+                            0, min(self.max_backoff, self.backoff * 2**attempt)
+                        )
+                    )
+                    attempt += 1
+
+    async def request(self, prompts: list[str]) -> list[str]:
+        started_at: float = time.perf_counter()
+        if len(prompts) == 1:
+            replies: list[str] = [await self.llm.ainvoke(prompts[0])]
+        else:
+            replies = list(await self.llm.abatch(prompts))
+        self.latencies.append(time.perf_counter() - started_at)
+        return replies
+
+    def get_hedge_delay(self) -> Optional[float]:
+        """Get the hedge quantile of the recent latencies, once there are enough of them."""
+        if not self.hedge_quantile or len(self.latencies) < self.hedge_min_samples:
+            return None
+        latencies: list[float] = sorted(self.latencies)
+        return latencies[int(self.hedge_quantile * (len(latencies) - 1))]
+
+    async def hedged_request(self, prompts: list[str]) -> list[str]:
+        """Send a request, and a duplicate of it once it is slower than the hedge delay.
+
+        The duplicate is rate limited but does not take a concurrency slot,
+        and its prompt tokens are counted as spent."""
+        delay: Optional[float] = self.get_hedge_delay()
+        if delay is None:
+            return await self.request(prompts)
+        primary: asyncio.Task = self.loop.create_task(self.request(prompts))
+        tasks: set[asyncio.Task] = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            metrics.increment('llm_hedged')
+            await self.requests_bucket.acquire()
+            metrics.record_tokens(sum(estimate_tokens(prompt) for prompt in prompts), 0)
+            hedge: asyncio.Task = self.loop.create_task(self.request(prompts))
+            tasks.add(hedge)
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner: asyncio.Task = next(iter(done))
+                tasks.discard(winner)
+                if winner.exception() is None or not tasks:
+                    break
+            if winner is hedge and winner.exception() is None:
+                metrics.increment('llm_hedge_wins')
+            return winner.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def ainvoke(self, prompt: str) -> str:
+        """Call the llm, in a batch with the other prompts submitted meanwhile when batching."""
+        if self.batch_size > 1 and hasattr(self.llm, 'abatch'):
+            return await self.add_to_batch(prompt)
+        return (await self.call([prompt]))[0]
+
+    def add_to_batch(self, prompt: str) -> asyncio.Future:
+        """Add a prompt to the pending batch, sent once full or once the batch delay is over."""
+        future: asyncio.Future = self.loop.create_future()
+        self.batch.append((prompt, future))
+        if len(self.batch) >= self.batch_size:
+            self.flush_batch()
+        elif len(self.batch) == 1:
+            self.batch_timer = self.loop.call_later(self.batch_delay, self.flush_batch)
+        return future
+
+    def flush_batch(self) -> None:
+        if self.batch_timer:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+        batch, self.batch = self.batch, []
+        if batch:
+            self.loop.create_task(self.send_batch(batch))
+
+    async def send_batch(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            replies: list[str] = await self.call([prompt for prompt, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.increment('llm_batched_prompts', len(batch))
+        for (_, future), reply in zip(batch, replies):
+            future.set_result(reply)
+
+    def is_budget_exhausted(self, prompt_tokens: int) -> bool:
+        used_tokens: int = (
+            metrics.counters['prompt_tokens']
+            + metrics.counters['completion_tokens']
+            + self.reserved_tokens
+        )
+        if self.token_budget and used_tokens + prompt_tokens > self.token_budget:
+            return True
+        return bool(self.cost_budget and metrics.cost >= self.cost_budget)
+
+    def reset_budget(self) -> None:
+        """Give a new run the whole budget, as the token and cost metrics are reset for it."""
+        with self.lock:
+            self.budget_exhausted = False
+
+    def release(self, prompt_tokens: int) -> None:
+        with self.lock:
+            self.reserved_tokens -= prompt_tokens
+        self.in_flight.release()
+
+    def join(self, group_key: Optional[str]) -> Optional[Future]:
+        """Get the call in flight for a group of duplicate symbols, if any."""
+        if not group_key:
+            return None
+        with self.lock:
+            future: Optional[Future] = self.groups.get(group_key)
+        if future:
+            metrics.increment('symbols_deduplicated')
+        return future
+
+    def submit(self, prompt: str, group_key: Optional[str] = None) -> Future:
+        """Schedule an llm call, blocking while too many calls are in flight."""
+        future: Optional[Future] = self.join(group_key)
+        if future:
+            return future
+        # Create the llm first, so that a provider that fails holds no slot or tokens.
+        self.start()
+        self.in_flight.acquire()
+        prompt_tokens: int = estimate_tokens(prompt)
+        with self.lock:
+            if self.budget_exhausted or self.is_budget_exhausted(prompt_tokens):
+                self.in_flight.release()
+                if not self.budget_exhausted:
+                    self.budget_exhausted = True
+                    print(
+                        'The token or cost budget is used up, skipping the remaining llm calls.',
+                        file=sys.stderr,
+                    )
+                future: Future = Future()
+                future.set_exception(BudgetExhaustedError('The run budget is used up'))
+                return future
+            self.reserved_tokens += prompt_tokens
+        future = asyncio.run_coroutine_threadsafe(self.ainvoke(prompt), self.loop)
+        future.add_done_callback(lambda _: self.release(prompt_tokens))
+        if group_key:
+            with self.lock:
+                self.groups[group_key] = future
+            future.add_done_callback(lambda _: self.leave(group_key, future))
+        return future
+
+    def leave(self, group_key: str, future: Future) -> None:
+        with self.lock:
+            if self.groups.get(group_key) is future:
+                del self.groups[group_key]
+
+    def invoke(self, prompt: str) -> str:
+        return self.submit(prompt).result()
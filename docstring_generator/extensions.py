@@ -1,9 +1,9 @@
 from queue import Queue
 
-from langchain_openai import OpenAI
+from .scheduler import ScheduledQueue
 
 modules_path_queue: Queue = Queue()
-functions_source_code_queue: Queue = Queue()
-class_source_code_queue: Queue = Queue()
+functions_source_code_queue: ScheduledQueue = ScheduledQueue()
+class_source_code_queue: ScheduledQueue = ScheduledQueue()
 failed_modules_queue: Queue = Queue()
-llm = OpenAI(temperature=0)
+module_docstrings_queue: Queue = Queue()
@@ -0,0 +1,52 @@
+import ast
+import asyncio
+import re
+import textwrap
+import time
+
+from .helpers import set_docstring
+
+CODE_PATTERN = re.compile(r'code:(.*?)Documentation style:', re.DOTALL)
+
+
+class FakeLLM:
+    """A deterministic stand-in for the llm used to run the generator offline.
+
+    It replies with the code from the prompt, with a docstring added to every
+    function and class in it, after waiting for the configured latency."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency: float = latency
+        self.calls: int = 0
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        match = CODE_PATTERN.search(prompt)
+        code: str = textwrap.dedent(match.group(1) if match else prompt).strip()
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return '"""Generated docstring."""'
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                set_docstring(node, self.get_docstring(node))
+        return ast.unparse(tree)
+
+    def get_docstring(self, node: ast.AST) -> str:
+        return f'Summary of {node.name}.'
+
+    def invoke(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.generate(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.generate(prompt)
+
+    async def abatch(self, prompts: list[str]) -> list[str]:
+        """Reply to a batch of prompts at once, after waiting for the latency once."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self.generate(prompt) for prompt in prompts]
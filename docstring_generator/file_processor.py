@@ -1,87 +1,798 @@
-import ast
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
 from queue import Empty, Queue
+from threading import BoundedSemaphore, Thread
+from typing import Optional
 
+from .cache import DocstringCache
+from .collector import DocstringCollector, ModuleDocstrings
 from .config import Config
-from .docstring_writer import ClassDocStringWriter, FunctionDocStringWriter
+from .context import get_class_methods_spans
+from .docstring_writer import (
+    DocstringWriter,
+    get_docstring_writer,
+    write_module_docstrings_code,
+)
+from .engine import BudgetExhaustedError, LLMEngine
 from .helpers import (
+    check_docstring_style,
     format_file,
+    format_source_code,
+    generate_class_docstring,
+    generate_function_docstring,
+    generate_functions_batch_docstrings,
+    get_class_docstring,
+    get_class_methods_docstrings,
     get_class_source,
+    get_function_docstring,
+    get_functions_batch_docstrings,
+    get_functions_batches,
     get_functions_source,
-    get_module_source_code,
+    is_class_split,
+    make_function_reply,
     save_processed_file,
 )
+from .journal import RunJournal
+from .manifest import RunManifest
+from .metrics import metrics
+from .parsed_module import ParsedModule
+from .patch import PatchWriter, get_module_diff
+from .scheduler import ScheduledQueue
+from .symbol_index import SymbolIndex
+from .work_items import SymbolSpan, WorkItem
+
+
+def record_llm_failure(module_path: str, symbol_name: str, error: Exception) -> None:
+    """Record why the llm call of a symbol failed, or that it was skipped once the budget is used up."""
+    if isinstance(error, BudgetExhaustedError):
+        metrics.increment('symbols_skipped')
+    else:
+        metrics.record_failure(module_path, symbol_name, 'llm', error)
+
+
+def extract_module(
+    module_path: str, config: Config
+) -> tuple[ParsedModule, list[SymbolSpan], list[SymbolSpan]]:
+    """Parse a module and get the spans of its functions and classes to document."""
+    with metrics.time('extract'):
+        parsed_module: ParsedModule = ParsedModule.from_path(module_path)
+        functions: list[SymbolSpan] = get_functions_source(parsed_module, config)
+        classes: list[SymbolSpan] = get_class_source(parsed_module, config)
+    return parsed_module, functions, classes
+
+
+def extract_modules(module_paths: list[str], config: Config) -> list[
+    tuple[
+        str,
+        Optional[str],
+        list[SymbolSpan],
+        list[SymbolSpan],
+        Optional[set[str]],
+    ]
+]:
+    """Extract the functions, classes and exports of a chunk of modules in a worker process."""
+    extracted_modules: list = []
+    for module_path in module_paths:
+        try:
+            parsed_module, functions, classes = extract_module(module_path, config)
+        except Exception as e:
+            extracted_modules.append((module_path, str(e), [], [], None))
+        else:
+            extracted_modules.append(
+                (module_path, None, functions, classes, parsed_module.get_exports())
+            )
+    return extracted_modules
+
+
+def queue_module_symbols(
+    module_path: str,
+    functions: list[SymbolSpan],
+    classes: list[SymbolSpan],
+    functions_source_queue: ScheduledQueue,
+    classes_source_queue: ScheduledQueue,
+    collector: DocstringCollector,
+    config: Config,
+    manifest: Optional[RunManifest] = None,
+    parsed_module: Optional[ParsedModule] = None,
+    exports: Optional[set[str]] = None,
+) -> None:
+    """Register the symbols of a module with the collector, then queue them.
+
+    Putting the work items blocks while the queues are full."""
+    if manifest and (functions or classes):
+        if parsed_module:
+            source_bytes: bytes = parsed_module.source_bytes
+        else:
+            with open(module_path, 'rb') as f:
+                source_bytes = f.read()
+        functions = [
+            function
+            for function in functions
+            if manifest.is_symbol_changed(
+                module_path, function.name, function.get_code(source_bytes)
+            )
+        ]
+        classes = [
+            class_span
+            for class_span in classes
+            if manifest.is_symbol_changed(
+                module_path, class_span.name, class_span.get_code(source_bytes)
+            )
+        ]
+        if not functions and not classes:
+            manifest.record_module(parsed_module or ParsedModule.from_path(module_path))
+    collector.register(module_path, len(functions) + len(classes), parsed_module)
+    metrics.increment('symbols_queued', len(functions) + len(classes))
+    if not functions and not classes:
+        metrics.increment('modules_done')
+        return
+    if parsed_module:
+        exports = parsed_module.get_exports()
+    functions_source_queue.set_module_exports(module_path, exports)
+    classes_source_queue.set_module_exports(module_path, exports)
+    for functions_batch in get_functions_batches(functions, config):
+        functions_source_queue.put(WorkItem(module_path, functions_batch))
+    for class_span in classes:
+        classes_source_queue.put(WorkItem(module_path, [class_span]))
 
 
 def queue_unprocessed_functions_methods(
-    functions_source_queue: Queue, classes_source_queue: Queue, module_path_queue: Queue
+    functions_source_queue: ScheduledQueue,
+    classes_source_queue: ScheduledQueue,
+    module_path_queue: Queue,
+    collector: DocstringCollector,
+    config: Config,
+    manifest: Optional[RunManifest] = None,
 ) -> None:
     while True:
         try:
             module_path: str = module_path_queue.get()
-            functions: list[str] = get_functions_source(module_path)
-            for function_name, function_code in functions:
-                functions_source_queue.put((module_path, function_name, function_code))
-            classes: list[str] = get_class_source(module_path)
-            for class_name, class_code in classes:
-                classes_source_queue.put((module_path, class_name, class_code))
+            parsed_module, functions, classes = extract_module(module_path, config)
+            queue_module_symbols(
+                module_path,
+                functions,
+                classes,
+                functions_source_queue,
+                classes_source_queue,
+                collector,
+                config,
+                manifest,
+                parsed_module,
+            )
         except Empty:
             continue
+        except Exception as e:
+            metrics.record_failure(module_path, None, 'extract', e)
+            metrics.increment('modules_done')
+            module_path_queue.task_done()
+            continue
         else:
             module_path_queue.task_done()
 
 
-def generate_function_docstrings(functions_source_queue: Queue, config: Config) -> None:
-    """Generate docstrings for this file."""
+def on_modules_extracted(
+    future: Future,
+    module_paths: list[str],
+    extracted_chunks: Queue,
+    submitted_at: float = 0.0,
+) -> None:
+    """Hand a chunk of modules extracted by a worker process over to the feeder thread.
+
+    It runs on the thread of the process pool, which must not wait for
+    room in the bounded symbol queues."""
+    metrics.observe('extract', time.perf_counter() - submitted_at)
+    extracted_chunks.put((future, module_paths))
+
+
+def queue_extracted_modules(
+    future: Future,
+    module_paths: list[str],
+    functions_source_queue: ScheduledQueue,
+    classes_source_queue: ScheduledQueue,
+    module_path_queue: Queue,
+    collector: DocstringCollector,
+    config: Config,
+    manifest: Optional[RunManifest] = None,
+) -> None:
+    """Queue the symbols of a chunk of modules once a worker process extracted them."""
+    try:
+        extracted_modules: list = future.result()
+    except Exception as e:
+        extracted_modules = [
+            (module_path, e, [], [], None) for module_path in module_paths
+        ]
+    for module_path, error, functions, classes, exports in extracted_modules:
+        try:
+            if error:
+                raise error if isinstance(error, Exception) else Exception(error)
+            queue_module_symbols(
+                module_path,
+                functions,
+                classes,
+                functions_source_queue,
+                classes_source_queue,
+                collector,
+                config,
+                manifest,
+                exports=exports,
+            )
+        except Exception as e:
+            metrics.record_failure(module_path, None, 'extract', e)
+            metrics.increment('modules_done')
+    for _ in module_paths:
+        module_path_queue.task_done()
+
+
+def feed_extracted_modules(
+    extracted_chunks: Queue,
+    chunks_in_flight: BoundedSemaphore,
+    functions_source_queue: ScheduledQueue,
+    classes_source_queue: ScheduledQueue,
+    module_path_queue: Queue,
+    collector: DocstringCollector,
+    config: Config,
+    manifest: Optional[RunManifest] = None,
+) -> None:
+    """Queue the symbols of the extracted chunks of modules, waiting while the symbol queues are full."""
     while True:
+        future, module_paths = extracted_chunks.get()
         try:
-            module_path, function_name, function_code = functions_source_queue.get()
-            module_tree = ast.parse(get_module_source_code(module_path))
-            transformer = FunctionDocStringWriter(
-                module_path=module_path,
-                function_name=function_name,
-                function_code=function_code,
-                config=config,
+            queue_extracted_modules(
+                future,
+                module_paths,
+                functions_source_queue,
+                classes_source_queue,
+                module_path_queue,
+                collector,
+                config,
+                manifest,
             )
-            new_tree = transformer.visit(module_tree)
-            ast.fix_missing_locations(new_tree)
-            new_module_code = ast.unparse(new_tree)
+        finally:
+            chunks_in_flight.release()
+
+
+def queue_unprocessed_functions_methods_in_processes(
+    functions_source_queue: ScheduledQueue,
+    classes_source_queue: ScheduledQueue,
+    module_path_queue: Queue,
+    collector: DocstringCollector,
+    config: Config,
+    pool: ProcessPoolExecutor,
+    manifest: Optional[RunManifest] = None,
+) -> None:
+    """Send the queued modules in chunks to the worker processes to be parsed and extracted.
+
+    The extracted chunks are queued by a feeder thread, and at most two
+    chunks per process are in flight, so that the extraction waits for the
+    llm workers when the symbol queues are full."""
+    extracted_chunks: Queue = Queue()
+    chunks_in_flight: BoundedSemaphore = BoundedSemaphore(max(config.processes, 1) * 2)
+    Thread(
+        target=feed_extracted_modules,
+        args=(
+            extracted_chunks,
+            chunks_in_flight,
+            functions_source_queue,
+            classes_source_queue,
+            module_path_queue,
+            collector,
+            config,
+            manifest,
+        ),
+        name='extracted_modules',
+        daemon=True,
+    ).start()
+    module_paths: list[str] = []
+    while True:
+        try:
+            module_paths.append(module_path_queue.get(timeout=0.1))
+            if len(module_paths) < config.process_chunk_size:
+                continue
+        except Empty:
+            if not module_paths:
+                continue
+        chunks_in_flight.acquire()
+        future: Future = pool.submit(extract_modules, module_paths, config)
+        future.add_done_callback(
+            partial(
+                on_modules_extracted,
+                module_paths=module_paths,
+                extracted_chunks=extracted_chunks,
+                submitted_at=time.perf_counter(),
+            )
+        )
+        module_paths = []
+
+
+def add_function_docstring(
+    future: Future,
+    module_path: str,
+    function_name: str,
+    collector: DocstringCollector,
+    function: Optional[SymbolSpan] = None,
+    functions_source_queue: Optional[ScheduledQueue] = None,
+    config: Optional[Config] = None,
+    retry: bool = False,
+) -> None:
+    """Add the generated function docstring to the collector once the llm replies.
+
+    A reply that holds no docstring is requested again once, skipping the
+    cache. The methods of a class are queued as functions, under their
+    qualified names."""
+    requeued: bool = False
+    try:
+        function_and_docstring: str = future.result()
+        with metrics.time('parse_response'):
+            function_docstring: Optional[str] = get_function_docstring(
+                function_and_docstring, function_name.split('.')[-1]
+            )
+            if config:
+                function_docstring = check_docstring_style(function_docstring, config)
+        if function_docstring is None:
+            if not retry and function and functions_source_queue:
+                metrics.increment('symbols_requeued')
+                functions_source_queue.requeue(
+                    WorkItem(module_path, [function], retry=True)
+                )
+                requeued = True
+                return
+            raise ValueError('The reply holds no docstring')
+        collector.add_function_docstring(module_path, function_name, function_docstring)
+    except Exception as e:
+        record_llm_failure(module_path, function_name, e)
+        collector.add_failed_symbol(module_path, function_name)
+    finally:
+        if not requeued:
+            collector.symbol_done(module_path)
+
+
+def add_functions_batch_docstrings(
+    future: Future,
+    module_path: str,
+    functions: list[tuple[SymbolSpan, str]],
+    collector: DocstringCollector,
+    functions_source_queue: ScheduledQueue,
+    config: Config,
+    cache: Optional[DocstringCache] = None,
+    duplicates: Optional[dict[str, str]] = None,
+    cache_keys: Optional[dict[str, set[str]]] = None,
+) -> None:
+    """Add the generated docstrings of a batch of functions once the llm replies.
+
+    The duplicates left out of the prompt get the docstring of the function
+    of their group. The functions missing from the reply are queued again
+    on their own."""
+    function_names: set[str] = {function.name for function, _ in functions}
+    try:
+        functions_and_docstrings: str = future.result()
+        with metrics.time('parse_response'):
+            docstrings: dict[str, str] = {
+                function_name: docstring
+                for function_name, docstring in get_functions_batch_docstrings(
+                    functions_and_docstrings, function_names
+                ).items()
+                if check_docstring_style(docstring, config)
+            }
+        for function_name, group_function_name in (duplicates or {}).items():
+            if group_function_name in docstrings:
+                docstrings[function_name] = docstrings[group_function_name]
+    except Exception as e:
+        for function_name in function_names:
+            record_llm_failure(module_path, function_name, e)
+            collector.add_failed_symbol(module_path, function_name)
+            collector.symbol_done(module_path)
+        return
+    for function, _ in functions:
+        if function.name not in docstrings:
+            functions_source_queue.requeue(WorkItem(module_path, [function]))
+            continue
+        collector.add_function_docstring(
+            module_path, function.name, docstrings[function.name]
+        )
+        if cache:
+            for cache_key in (cache_keys or {}).get(function.name, ()):
+                cache.set(
+                    cache_key,
+                    make_function_reply(function.name, docstrings[function.name]),
+                )
+        collector.symbol_done(module_path)
+
+
+def generate_function_docstrings(
+    functions_source_queue: ScheduledQueue,
+    collector: DocstringCollector,
+    engine: LLMEngine,
+    config: Config,
+    cache: Optional[DocstringCache] = None,
+    index: Optional[SymbolIndex] = None,
+) -> None:
+    """Schedule the docstring generation for the queued functions and batches of functions.
+
+    The source code of the functions is read from their module only now,
+    along with the summaries of the project symbols they use if there is a
+    symbol index. A function queued again after a reply without its
+    docstring is requested on its own, skipping the cache."""
+    while True:
+        try:
+            item: WorkItem = functions_source_queue.get()
+            module_path: str = item.module_path
+            functions: list[tuple[str, str]] = item.get_code(
+                collector.get_source_bytes(module_path)
+            )
+            function_names: list[str] = [name for name, _ in functions]
+            context: str = ''
+            if index:
+                index.wait(module_path, function_names, config.context_index_wait)
+                context = index.get_context(module_path, function_names)
+            if len(functions) == 1:
+                function_name, function_code = functions[0]
+                future: Future = generate_function_docstring(
+                    function_code=function_code,
+                    config=config,
+                    engine=engine,
+                    cache=cache,
+                    refresh=item.retry,
+                    context=context,
+                )
+                future.add_done_callback(
+                    partial(
+                        add_function_docstring,
+                        module_path=module_path,
+                        function_name=function_name,
+                        collector=collector,
+                        function=item.symbols[0],
+                        functions_source_queue=functions_source_queue,
+                        config=config,
+                        retry=item.retry,
+                    )
+                )
+                if index:
+                    index.track(module_path, function_names, future)
+            else:
+                (
+                    cached_replies,
+                    future,
+                    duplicates,
+                    cache_keys,
+                ) = generate_functions_batch_docstrings(
+                    functions=functions,
+                    config=config,
+                    engine=engine,
+                    cache=cache,
+                    context=context,
+                )
+                for function, (function_name, _) in zip(item.symbols, functions):
+                    if function_name not in cached_replies:
+                        continue
+                    cached_future: Future = Future()
+                    cached_future.set_result(cached_replies[function_name])
+                    add_function_docstring(
+                        cached_future,
+                        module_path,
+                        function_name,
+                        collector,
+                        function,
+                        functions_source_queue,
+                        config,
+                    )
+                if future:
+                    future.add_done_callback(
+                        partial(
+                            add_functions_batch_docstrings,
+                            module_path=module_path,
+                            functions=[
+                                (function, function_code)
+                                for function, (function_name, function_code) in zip(
+                                    item.symbols, functions
+                                )
+                                if function_name not in cached_replies
+                            ],
+                            collector=collector,
+                            functions_source_queue=functions_source_queue,
+                            config=config,
+                            cache=cache,
+                            duplicates=duplicates,
+                            cache_keys=cache_keys,
+                        )
+                    )
+                    if index:
+                        index.track(module_path, function_names, future)
         except Empty:
             continue
         except Exception as e:
-            print(e)
+            for function in item.symbols:
+                metrics.record_failure(module_path, function.name, 'prompt', e)
+                collector.add_failed_symbol(module_path, function.name)
+                collector.symbol_done(module_path)
             functions_source_queue.task_done()
             continue
         else:
-            save_processed_file(
-                file_path=module_path, processed_module_code=new_module_code
-            )
-            format_file(module_path)
             functions_source_queue.task_done()
 
-def generate_class_docstrings(class_source_queue: Queue, config: Config) -> None:
-    """Generate docstrings for this file."""
+
+def queue_class_methods(
+    module_path: str,
+    methods: list[SymbolSpan],
+    functions_source_queue: ScheduledQueue,
+    collector: DocstringCollector,
+) -> None:
+    """Queue methods of a class as functions, under their qualified names.
+
+    They skip the bound of the queue, as they are queued by the class worker
+    and the llm callbacks."""
+    collector.register(module_path, len(methods))
+    metrics.increment('symbols_queued', len(methods))
+    for method in methods:
+        functions_source_queue.requeue(WorkItem(module_path, [method]))
+
+
+def add_class_docstring(
+    future: Future,
+    module_path: str,
+    class_name: str,
+    collector: DocstringCollector,
+    class_span: Optional[SymbolSpan] = None,
+    class_code: str = '',
+    functions_source_queue: Optional[ScheduledQueue] = None,
+    class_source_queue: Optional[ScheduledQueue] = None,
+    config: Optional[Config] = None,
+    split: bool = False,
+    retry: bool = False,
+) -> None:
+    """Add the generated class and methods docstrings to the collector once the llm replies.
+
+    The methods docstrings of a split class come from their own requests.
+    Only the missing pieces of an incomplete reply are requested again:
+    the missing methods on their own, and the class docstring from the
+    class skeleton, skipping the cache."""
+    requeued: bool = False
+    try:
+        class_and_docstring: str = future.result()
+        with metrics.time('parse_response'):
+            class_docstring: Optional[str] = get_class_docstring(
+                class_and_docstring, class_name
+            )
+            methods_docstrings: dict[str, str] = (
+                {}
+                if split
+                else get_class_methods_docstrings(class_and_docstring, class_name)
+            )
+            if config:
+                class_docstring = check_docstring_style(class_docstring, config)
+                methods_docstrings = {
+                    method_name: docstring
+                    for method_name, docstring in methods_docstrings.items()
+                    if check_docstring_style(docstring, config)
+                }
+        if not split and class_span and config and functions_source_queue:
+            missing_methods: list[SymbolSpan] = [
+                method
+                for method in get_class_methods_spans(
+                    class_span, class_code, config.overwrite_class_methods_docstring
+                )
+                if method.name.split('.', 1)[1] not in methods_docstrings
+            ]
+            if missing_methods:
+                metrics.increment('symbols_requeued', len(missing_methods))
+                queue_class_methods(
+                    module_path, missing_methods, functions_source_queue, collector
+                )
+        collector.add_class_docstring(
+            module_path, class_name, class_docstring, methods_docstrings
+        )
+        if class_docstring is None:
+            if not retry and class_span and class_source_queue:
+                metrics.increment('symbols_requeued')
+                class_source_queue.requeue(
+                    WorkItem(module_path, [class_span], retry=True)
+                )
+                requeued = True
+                return
+            raise ValueError('The reply holds no class docstring')
+    except Exception as e:
+        record_llm_failure(module_path, class_name, e)
+        collector.add_failed_symbol(module_path, class_name)
+    finally:
+        if not requeued:
+            collector.symbol_done(module_path)
+
+
+def get_class_context(
+    module_path: str, class_name: str, index: Optional[SymbolIndex], config: Config
+) -> str:
+    if not index:
+        return ''
+    index.wait(module_path, [class_name], config.context_index_wait)
+    return index.get_context(module_path, [class_name])
+
+
+def generate_class_docstrings(
+    class_source_queue: ScheduledQueue,
+    collector: DocstringCollector,
+    engine: LLMEngine,
+    config: Config,
+    cache: Optional[DocstringCache] = None,
+    functions_source_queue: Optional[ScheduledQueue] = None,
+    index: Optional[SymbolIndex] = None,
+) -> None:
+    """Schedule the docstring generation for the queued classes and their methods.
+
+    A class larger than the split threshold gets one request for the class
+    skeleton and its methods are queued as functions, before the class
+    request so that the module is not written before they are done. A
+    class queued again after a reply without its docstring is requested
+    from its skeleton, skipping the cache. With a symbol index, the prompt
+    also gets the summaries of the base classes and of the project symbols
+    the methods use."""
     while True:
         try:
-            module_path, class_name, class_code = class_source_queue.get()
-            module_tree = ast.parse(get_module_source_code(module_path))
-            transformer = ClassDocStringWriter(
-                module_path=module_path,
-                class_name=class_name,
+            item: WorkItem = class_source_queue.get()
+            module_path: str = item.module_path
+            class_span: SymbolSpan = item.symbols[0]
+            class_name, class_code = item.get_code(
+                collector.get_source_bytes(module_path)
+            )[0]
+            split: bool = item.retry or is_class_split(class_code, config)
+            if split and not item.retry and functions_source_queue:
+                queue_class_methods(
+                    module_path,
+                    get_class_methods_spans(
+                        class_span, class_code, config.overwrite_class_methods_docstring
+                    ),
+                    functions_source_queue,
+                    collector,
+                )
+            future: Future = generate_class_docstring(
                 class_code=class_code,
                 config=config,
+                engine=engine,
+                cache=cache,
+                skeleton=split,
+                refresh=item.retry,
+                context=get_class_context(module_path, class_name, index, config),
             )
-            new_tree = transformer.visit(module_tree)
-            ast.fix_missing_locations(new_tree)
-            new_module_code = ast.unparse(new_tree)
         except Empty:
             continue
         except Exception as e:
-            print(e)
+            metrics.record_failure(module_path, class_span.name, 'prompt', e)
+            collector.add_failed_symbol(module_path, class_span.name)
+            collector.symbol_done(module_path)
             class_source_queue.task_done()
             continue
         else:
-            save_processed_file(
-                file_path=module_path, processed_module_code=new_module_code
+            future.add_done_callback(
+                partial(
+                    add_class_docstring,
+                    module_path=module_path,
+                    class_name=class_name,
+                    collector=collector,
+                    class_span=class_span,
+                    class_code=class_code,
+                    functions_source_queue=functions_source_queue,
+                    class_source_queue=class_source_queue,
+                    config=config,
+                    split=split,
+                    retry=item.retry,
+                )
             )
-            format_file(module_path)
+            if index:
+                index.track(module_path, [class_name], future)
             class_source_queue.task_done()
+
+
+def save_module_docstrings(
+    module_docstrings: ModuleDocstrings,
+    config: Config,
+    writer: Optional[DocstringWriter] = None,
+) -> Optional[str]:
+    """Apply all the generated docstrings of a module, then save and format it once.
+
+    In dry run mode the module is left untouched and its diff is returned."""
+    if module_docstrings.is_empty:
+        return None
+    if not module_docstrings.parsed_module:
+        module_docstrings.parsed_module = ParsedModule.from_path(
+            module_docstrings.module_path
+        )
+    write_start: float = time.perf_counter()
+    new_module_code: str = write_module_docstrings_code(
+        module_docstrings=module_docstrings, config=config, writer=writer
+    )
+    write_seconds: float = time.perf_counter() - write_start
+    formatted_module_code: Optional[str] = None
+    if config.formatter == 'black':
+        with metrics.time('format'):
+            formatted_module_code = format_source_code(new_module_code)
+    if config.dry_run:
+        return get_module_diff(
+            module_docstrings.module_path,
+            module_docstrings.parsed_module.source,
+            formatted_module_code or new_module_code,
+        )
+    write_start = time.perf_counter()
+    save_processed_file(
+        file_path=module_docstrings.module_path,
+        processed_module_code=formatted_module_code or new_module_code,
+    )
+    metrics.observe('write', write_seconds + time.perf_counter() - write_start)
+    if config.formatter == 'black' and formatted_module_code is None:
+        # The subprocess fallback formats the saved file, never in dry run mode.
+        with metrics.time('format'):
+            format_file(module_docstrings.module_path)
+    return None
+
+
+def record_saved_module(
+    future: Future,
+    module_docstrings: ModuleDocstrings,
+    module_docstrings_queue: Queue,
+    manifest: Optional[RunManifest] = None,
+    submitted_at: Optional[float] = None,
+    patch_writer: Optional[PatchWriter] = None,
+    journal: Optional[RunJournal] = None,
+) -> None:
+    """Record a saved module in the manifest and the journal, or stream its diff, then mark it as done."""
+    if submitted_at is not None:
+        metrics.observe('write', time.perf_counter() - submitted_at)
+    try:
+        diff: Optional[str] = future.result()
+        if patch_writer and diff:
+            patch_writer.write(module_docstrings.module_path, diff)
+        if journal and not module_docstrings.is_empty:
+            journal.record_module(module_docstrings.module_path)
+        if manifest:
+            parsed_module: Optional[ParsedModule] = module_docstrings.parsed_module
+            if not module_docstrings.is_empty or not parsed_module:
+                parsed_module = ParsedModule.from_path(module_docstrings.module_path)
+            manifest.record_module(parsed_module, module_docstrings.failed_symbols)
+    except Exception as e:
+        metrics.record_failure(module_docstrings.module_path, None, 'write', e)
+    finally:
+        metrics.increment('modules_done')
+        module_docstrings_queue.task_done()
+
+
+def write_module_docstrings(
+    module_docstrings_queue: Queue,
+    config: Config,
+    manifest: Optional[RunManifest] = None,
+    pool: Optional[ProcessPoolExecutor] = None,
+    patch_writer: Optional[PatchWriter] = None,
+    journal: Optional[RunJournal] = None,
+) -> None:
+    """Save the modules whose docstrings are all generated, in worker processes if any.
+
+    The writer of this thread is reused for every module."""
+    writer: DocstringWriter = get_docstring_writer(config)
+    while True:
+        try:
+            module_docstrings: ModuleDocstrings = module_docstrings_queue.get()
+            submitted_at: Optional[float] = None
+            if pool:
+                submitted_at = time.perf_counter()
+                future: Future = pool.submit(
+                    save_module_docstrings, module_docstrings, config
+                )
+            else:
+                future = Future()
+                try:
+                    future.set_result(
+                        save_module_docstrings(module_docstrings, config, writer)
+                    )
+                except Exception as e:
+                    future.set_exception(e)
+        except Empty:
+            continue
+        else:
+            future.add_done_callback(
+                partial(
+                    record_saved_module,
+                    module_docstrings=module_docstrings,
+                    module_docstrings_queue=module_docstrings_queue,
+                    manifest=manifest,
+                    submitted_at=submitted_at,
+                    patch_writer=patch_writer,
+                    journal=journal,
+                )
+            )
@@ -1,55 +1,328 @@
 import ast
+import inspect
+import json
 import os
+import re
 import subprocess
+import sys
+import tempfile
 from argparse import ArgumentParser, Namespace
 from ast import AsyncFunctionDef, ClassDef, Constant, Expr, FunctionDef
-from collections import deque
-from os import listdir, path
+from concurrent.futures import Future
+from os import path
 from queue import Queue
-from typing import Iterator
+from typing import Callable, Optional
+
+from .cache import DocstringCache, get_symbol_keys
+from .config import Config, get_default_cache_file
+from .context import compact_class_code, compact_function_code, get_class_skeleton
+from .discovery import ModuleFinder
+from .engine import LLMEngine, estimate_tokens
+from .journal import RunJournal
+from .manifest import RunManifest
+from .metrics import metrics
+from .parsed_module import ParsedModule
+from .response_parser import (
+    extract_code,
+    get_plain_docstring,
+    matches_style,
+    parse_reply_docstrings,
+)
+from .shard import is_in_shard, parse_shard
+from .symbol_index import SymbolIndex
+from .templates import (
+    get_class_prompt_template,
+    get_function_prompt_template,
+    get_functions_batch_prompt_template,
+)
+from .work_items import SymbolSpan
+
+
+def get_group_reply(
+    group_key: Optional[str], config: Config, cache: Optional[DocstringCache]
+) -> Optional[str]:
+    """Get the cached reply of a near duplicate of a symbol, when the symbols are grouped by structure."""
+    if not cache or not group_key or config.dedup != 'structure':
+        return None
+    reply: Optional[str] = cache.get(group_key)
+    if reply is not None:
+        metrics.increment('symbols_deduplicated')
+    return reply
+
+
+def get_cached_reply(
+    cache_key: str,
+    group_key: Optional[str],
+    config: Config,
+    cache: Optional[DocstringCache],
+) -> Optional[str]:
+    """Get the cached reply of a symbol, or of a near duplicate grouped by structure."""
+    if not cache:
+        return None
+    reply: Optional[str] = cache.get(cache_key)
+    if reply is None:
+        reply = get_group_reply(group_key, config, cache)
+    return reply
+
+
+def get_reply_cache_keys(cache_key: str, group_key: Optional[str]) -> set[str]:
+    """Get the keys a reply is cached under, its own and the one of its group of duplicates."""
+    return {cache_key, group_key} if group_key else {cache_key}
+
+
+def get_llm_reply(
+    kind: str,
+    source_code: str,
+    get_prompt: Callable[[], str],
+    config: Config,
+    engine: LLMEngine,
+    cache: Optional[DocstringCache] = None,
+    refresh: bool = False,
+) -> Future:
+    """Get the llm reply for a symbol from the cache, or schedule the llm call.
+
+    The duplicates of a symbol share its llm call, or its cached reply for
+    the near duplicates grouped by structure. A refreshed reply skips the
+    cache lookup and the duplicates, and replaces the cached reply."""
+    cache_key, group_key = get_symbol_keys(kind, source_code, config)
+    cache_keys: set[str] = get_reply_cache_keys(cache_key, group_key)
+    if refresh:
+        group_key = None
+    reply: Optional[str] = (
+        None if refresh else get_cached_reply(cache_key, group_key, config, cache)
+    )
+    if reply is not None:
+        future: Future = Future()
+        future.set_result(reply)
+        return future
+    group_future: Optional[Future] = engine.join(group_key)
+    if group_future:
+        future = group_future
+    else:
+        with metrics.time('prompt'):
+            prompt_formatted_str: str = get_prompt()
+        future = engine.submit(prompt_formatted_str, group_key)
+    if cache:
+        future.add_done_callback(
+            lambda done: done.exception()
+            or [cache.set(key, done.result()) for key in cache_keys]
+        )
+    return future
+
+
+def generate_function_docstring(
+    function_code: str,
+    config: Config,
+    engine: LLMEngine,
+    cache: Optional[DocstringCache] = None,
+    refresh: bool = False,
+    context: str = '',
+) -> Future:
+    get_prompt: Callable[[], str] = lambda: get_function_prompt_template(
+        function_code=compact_function_code(function_code, config.context_token_budget),
+        config=config,
+        context=context,
+    )
+    return get_llm_reply(
+        'function', function_code, get_prompt, config, engine, cache, refresh
+    )
 
-from langchain.prompts import PromptTemplate
 
-from .config import Config
-from .extensions import llm
-from .templates import get_function_prompt_template, get_class_prompt_template
+def generate_functions_batch_docstrings(
+    functions: list[tuple[str, str]],
+    config: Config,
+    engine: LLMEngine,
+    cache: Optional[DocstringCache] = None,
+    context: str = '',
+) -> tuple[dict[str, str], Optional[Future], dict[str, str], dict[str, set[str]]]:
+    """Get the cached replies of a batch of functions, and schedule one llm call for the rest.
+
+    The reply of the llm call is either the json object asked by the batch
+    prompt or, when only one function is not cached, the usual function reply.
+    The duplicates in the batch are left out of the prompt, they are mapped
+    to the name of the function of their group that is asked for. The keys
+    every reply is to be cached under are returned by function name."""
+    cached_replies: dict[str, str] = {}
+    uncached_functions: list[tuple[str, str]] = []
+    duplicates: dict[str, str] = {}
+    group_functions: dict[str, str] = {}
+    cache_keys: dict[str, set[str]] = {}
+    for function_name, function_code in functions:
+        cache_key, group_key = get_symbol_keys('function', function_code, config)
+        cache_keys[function_name] = get_reply_cache_keys(cache_key, group_key)
+        reply: Optional[str] = get_cached_reply(cache_key, group_key, config, cache)
+        if reply is not None:
+            cached_replies[function_name] = reply
+        elif group_key in group_functions:
+            duplicates[function_name] = group_functions[group_key]
+            metrics.increment('symbols_deduplicated')
+        else:
+            if group_key:
+                group_functions[group_key] = function_name
+            uncached_functions.append((function_name, function_code))
+    if not uncached_functions:
+        return cached_replies, None, duplicates, cache_keys
+    with metrics.time('prompt'):
+        compacted_functions: list[tuple[str, str]] = [
+            (
+                function_name,
+                compact_function_code(function_code, config.context_token_budget),
+            )
+            for function_name, function_code in uncached_functions
+        ]
+        if len(compacted_functions) == 1:
+            prompt_formatted_str: str = get_function_prompt_template(
+                function_code=compacted_functions[0][1], config=config, context=context
+            )
+        else:
+            prompt_formatted_str = get_functions_batch_prompt_template(
+                functions=compacted_functions, config=config, context=context
+            )
+    return cached_replies, engine.submit(prompt_formatted_str), duplicates, cache_keys
 
 
-def generate_function_docstring(function_code: str, config: Config) -> str:
-    prompt_formatted_str: str = get_function_prompt_template(
-        function_code=function_code, config=config
+def get_functions_batch_docstrings(
+    functions_and_docstrings: str, function_names: set[str]
+) -> dict[str, str]:
+    """Get the docstrings of a batch of functions from a json or python code reply.
+
+    The functions whose docstrings can not be found in the reply are left out."""
+    reply: str = extract_code(functions_and_docstrings)
+    docstrings: dict[str, str] = {}
+    try:
+        parsed_reply = json.loads(reply[reply.find('{') : reply.rfind('}') + 1])
+    except ValueError:
+        parsed_reply = None
+    if isinstance(parsed_reply, dict):
+        for function_name, docstring in parsed_reply.items():
+            if (
+                function_name in function_names
+                and isinstance(docstring, str)
+                and docstring.strip()
+            ):
+                docstrings[function_name] = docstring.strip()
+    if docstrings:
+        return docstrings
+    return {
+        function_name: docstring
+        for function_name, docstring in parse_reply_docstrings(reply).items()
+        if function_name in function_names
+    }
+
+
+def make_function_reply(function_name: str, docstring: str) -> str:
+    """Make a function reply, as cached for single functions, from a batched docstring."""
+    return f'def {function_name}():\n    {make_docstring_literal(docstring, "    ")}\n'
+
+
+def get_functions_batches(
+    functions: list[SymbolSpan], config: Config
+) -> list[list[SymbolSpan]]:
+    """Pack the small functions of a module into batches that fit the token budget."""
+    if not config.batch_token_budget:
+        return [[function] for function in functions]
+    batches: list[list[SymbolSpan]] = []
+    batch: list[SymbolSpan] = []
+    batch_tokens: int = 0
+    for function in functions:
+        if function.tokens > config.batch_max_symbol_tokens:
+            batches.append([function])
+            continue
+        if batch and batch_tokens + function.tokens > config.batch_token_budget:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(function)
+        batch_tokens += function.tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def generate_class_docstring(
+    class_code: str,
+    config: Config,
+    engine: LLMEngine,
+    cache: Optional[DocstringCache] = None,
+    skeleton: bool = False,
+    refresh: bool = False,
+    context: str = '',
+) -> Future:
+    """Schedule the docstring generation for a class, or only for its skeleton."""
+    get_prompt: Callable[[], str] = lambda: get_class_prompt_template(
+        class_code=(
+            get_class_skeleton(class_code)
+            if skeleton
+            else compact_class_code(class_code, config.context_token_budget)
+        ),
+        config=config,
+        context=context,
+    )
+    return get_llm_reply(
+        'class_skeleton' if skeleton else 'class',
+        class_code,
+        get_prompt,
+        config,
+        engine,
+        cache,
+        refresh,
     )
-    function_and_docstring = llm.invoke(prompt_formatted_str)
-    return function_and_docstring
 
 
-def generate_class_docstring(class_code: str, config: Config) -> str:
-    prompt_formatted_str: str = get_class_prompt_template(
-        class_code=class_code, config=config
+def is_class_split(class_code: str, config: Config) -> bool:
+    """Check whether a class is large enough to get one request per method."""
+    return bool(
+        config.split_class_token_threshold
+        and estimate_tokens(class_code) > config.split_class_token_threshold
     )
-    class_and_docstring = llm.invoke(prompt_formatted_str)
-    return class_and_docstring
 
 
-def get_class_docstring(class_and_docstring: str) -> str:
+def get_symbol_docstring(reply: str, symbol_name: Optional[str]) -> Optional[str]:
+    """Get the docstring of a symbol from a reply, or None if it can not be recovered.
+
+    The symbol is looked up by name, then the first top level symbol of the
+    reply is taken, then the quoted or fenced text of a reply that holds no code."""
+    docstrings: dict[str, str] = parse_reply_docstrings(reply)
+    if symbol_name in docstrings:
+        return docstrings[symbol_name]
+    for name, docstring in docstrings.items():
+        if '.' not in name:
+            return docstring
+    if docstrings:
+        return None
+    return get_plain_docstring(reply)
+
+
+def get_class_docstring(
+    class_and_docstring: str, class_name: Optional[str] = None
+) -> Optional[str]:
     """Get the class docstring."""
-    class_tree = ast.parse(class_and_docstring)
-    for node in class_tree.body:
-        if isinstance(node, ClassDef):
-            cls_docstring: str = ast.get_docstring(node)
-            return cls_docstring
+    return get_symbol_docstring(class_and_docstring, class_name)
+
+
+def get_class_methods_docstrings(
+    class_and_docstring: str, class_name: Optional[str] = None
+) -> dict[str, str]:
+    """Get a class methods docstrings, leaving out the methods without one."""
+    docstrings: dict[str, str] = parse_reply_docstrings(class_and_docstring)
+    class_names: list[str] = [name.split('.')[0] for name in docstrings if '.' in name]
+    if class_name not in class_names:
+        class_name = class_names[0] if class_names else None
+    return {
+        name.split('.', 1)[1]: docstring
+        for name, docstring in docstrings.items()
+        if name.startswith(f'{class_name}.')
+    }
 
 
-def get_class_methods_docstrings(class_and_docstring: str) -> dict[str, str]:
-    """Get a class methods docstrings."""
-    class_methods: dict[str, str] = {}
-    class_tree = ast.parse(class_and_docstring)
-    for node in class_tree.body:
-        if isinstance(node, ClassDef):
-            for class_node in node.body:
-                if isinstance(class_node, FunctionDef):
-                    class_methods[class_node.name] = ast.get_docstring(class_node)
-    return class_methods
+def check_docstring_style(docstring: Optional[str], config: Config) -> Optional[str]:
+    """Check that a docstring follows the documentation style.
+
+    A mismatch is counted, and the docstring is dropped in strict style mode
+    so that it gets requested again."""
+    if docstring is None or matches_style(docstring, config.documentation_style):
+        return docstring
+    metrics.increment('style_mismatches')
+    return None if config.strict_style else docstring
 
 
 def make_docstring_node(docstr: str):
@@ -57,13 +330,34 @@ def make_docstring_node(docstr: str):
     return Expr(value=constant_str)
 
 
-def get_function_docstring(function_and_docstring: str) -> str:
+def set_docstring(node, docstr: str) -> None:
+    """Set the docstring of a node, replacing the existing one if any."""
+    new_docstring_node = make_docstring_node(docstr)
+    if ast.get_docstring(node=node) is not None:
+        node.body[0] = new_docstring_node
+    else:
+        node.body.insert(0, new_docstring_node)
+
+
+def make_docstring_literal(docstr: str, indent: str) -> str:
+    """Make the triple quoted source code of a docstring indented with the given indent."""
+    docstr = inspect.cleandoc(docstr).replace('\\', '\\\\').replace('"""', '\\"\\"\\"')
+    lines: list[str] = docstr.splitlines()
+    if len(lines) <= 1:
+        if docstr.endswith('"'):
+            docstr = docstr[:-1] + '\\"'
+        return f'"""{docstr}"""'
+    body: str = '\n'.join(
+        f'{indent}{line}' if line.strip() else '' for line in lines[1:]
+    )
+    return f'"""{lines[0]}\n{body}\n{indent}"""'
+
+
+def get_function_docstring(
+    function_and_docstring: str, function_name: Optional[str] = None
+) -> Optional[str]:
     """Get the function docstring."""
-    function_tree = ast.parse(function_and_docstring)
-    for node in function_tree.body:
-        if isinstance(node, (FunctionDef, AsyncFunctionDef)):
-            function_docstring: str = ast.get_docstring(node)
-            return function_docstring
+    return get_symbol_docstring(function_and_docstring, function_name)
 
 
 def get_module_source_code(module_path: str) -> str:
@@ -80,6 +374,7 @@ def add_module_code_to_queue(module_path: str, module_source_queue: Queue):
 
 
 def add_module_to_queue(module_path: str, module_path_queue: Queue):
+    metrics.increment('modules_discovered')
     module_path_queue.put(module_path)
 
 
@@ -87,80 +382,94 @@ def get_node_source(node, module_src: str) -> str:
     return ast.get_source_segment(source=module_src, node=node)
 
 
-def get_functions_source(module_path: str) -> list[str]:
-    functions_src: list[str] = []
-    module_src = get_module_source_code(module_path)
-    module_tree = ast.parse(module_src)
-    for node in module_tree.body:
-        if isinstance(node, FunctionDef):
-            function_src: str = get_node_source(node=node, module_src=module_src)
-            functions_src.append((node.name, function_src))
+def get_functions_source(
+    parsed_module: ParsedModule, config: Config
+) -> list[SymbolSpan]:
+    functions_src: list[SymbolSpan] = []
+    for node in parsed_module.iter_top_level_symbols():
+        if isinstance(node, (FunctionDef, AsyncFunctionDef)) and (
+            config.overwrite_function_docstring or not ast.get_docstring(node)
+        ):
+            functions_src.append(
+                SymbolSpan(node.name, *parsed_module.get_offsets(node))
+            )
     return functions_src
 
 
-def get_class_source(module_path: str) -> None:
-    class_src: list[str] = []
-    module_src = get_module_source_code(module_path)
-    module_tree = ast.parse(module_src)
-    for node in module_tree.body:
-        if isinstance(node, ClassDef):
-            classsrc: str = get_node_source(node=node, module_src=module_src)
-            class_src.append((node.name, classsrc))
+def get_class_source(parsed_module: ParsedModule, config: Config) -> list[SymbolSpan]:
+    class_src: list[SymbolSpan] = []
+    for node in parsed_module.iter_top_level_symbols():
+        if isinstance(node, ClassDef) and (
+            config.overwrite_class_docstring or not ast.get_docstring(node)
+        ):
+            class_src.append(SymbolSpan(node.name, *parsed_module.get_offsets(node)))
     return class_src
 
 
-class DirectoryIterator:
-    def __init__(self, config: Config):
-        self.config: Config = config
-        self.queue: deque[str] = deque(self.config.path)
-
-    def __iter__(self) -> Iterator:
-        return self
-
-    def __next__(self) -> list[str]:
-        files: list[str] = list()
-        if self.queue:
-            for _ in range(len(self.queue)):
-                root_dir: str = self.queue.popleft()
-                if root_dir.split('/')[-1] in self.config.directories_ignore:
-                    continue
-                entries: list[str] = listdir(root_dir)
-                for entry in entries:
-                    entry_path: str = path.join(root_dir, entry)
-                    if path.isfile(entry_path):
-                        if (
-                            entry_path not in self.config.files_ignore
-                            and entry.split('.')[-1] == 'py'
-                        ):
-                            files.append(entry_path)
-                    elif entry not in self.config.directories_ignore:
-                        self.queue.append(entry_path)
-            return files
-        else:
-            raise StopIteration()
-
-
-def get_all_modules(config: Config, module_path_queue: Queue) -> None:
-    """Iterate throug all the directories from the root directory."""
-    for entry in config.path:
-        if os.path.isfile(entry):
-            add_module_to_queue(entry, module_path_queue)
-        else:
-            directory_iterator: DirectoryIterator = DirectoryIterator(config=config)
-            for modules in directory_iterator:
-                for module in modules:
-                    add_module_to_queue(module, module_path_queue)
+def get_all_modules(
+    config: Config,
+    module_path_queue: Queue,
+    manifest: Optional[RunManifest] = None,
+    journal: Optional[RunJournal] = None,
+    index: Optional[SymbolIndex] = None,
+) -> None:
+    """Queue the modules under the configured paths as they are found.
+
+    The modules of the other shards of a sharded run, and the modules written
+    by an interrupted run that is resumed, are skipped. With a symbol index,
+    every module is indexed once they are all found, then they are queued in
+    dependency order."""
+
+    def add_module(module_path: str) -> None:
+        if not is_in_shard(module_path, config.shard_index, config.shard_count):
+            return
+        if journal and journal.is_module_done(module_path):
+            return
+        if not manifest or manifest.is_module_changed(module_path):
+            add_module_to_queue(module_path, module_path_queue)
+
+    if not index:
+        with metrics.time('discover'):
+            ModuleFinder(config=config, on_module=add_module).find()
+        return
+    module_paths: list[str] = []
+    with metrics.time('discover'):
+        ModuleFinder(config=config, on_module=module_paths.append).find()
+    with metrics.time('index'):
+        index.update(module_paths)
+    for module_path in sorted(module_paths, key=index.get_module_order):
+        add_module(module_path)
 
 
 def save_processed_file(file_path: str, processed_module_code: str) -> None:
-    """Save a processed file."""
+    """Save a processed file, the errors are recorded as failures by the caller.
+
+    The code is written to a temporary file next to it that then replaces
+    it, so that a crash never leaves a truncated module behind."""
+    directory, file_name = path.split(file_path)
+    file_descriptor, temp_file = tempfile.mkstemp(
+        prefix=f'.{file_name}.', suffix='.tmp', dir=directory or '.'
+    )
     try:
-        with open(file_path, 'w') as f:
+        with os.fdopen(file_descriptor, 'w') as f:
             f.write(processed_module_code)
-    except FileNotFoundError as e:
-        print(e)
-    except Exception as e:
-        print(e)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists(file_path):
+            os.chmod(temp_file, os.stat(file_path).st_mode & 0o7777)
+        os.replace(temp_file, file_path)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+def format_source_code(source_code: str) -> Optional[str]:
+    """Format the source code in process using black, if it is installed."""
+    try:
+        import black
+    except ImportError:
+        return None
+    return black.format_str(source_code, mode=black.Mode())
 
 
 def format_file(file_path: str) -> None:
@@ -175,6 +484,9 @@ def parse_arguments() -> Namespace:
         description='Generate docstrings for your python projects',
         epilog='Thanks for using %(prog)s! :)',
     )
+    parser.add_argument(
+        'command', nargs='?', default='generate', choices=['generate', 'watch']
+    )
     parser.add_argument('--path', nargs='*', default=['.'], type=str)
     parser.add_argument('--config-file', nargs='?', default='', type=str)
     parser.add_argument('--OPENAI_API_KEY', nargs='?', default='', type=str)
@@ -189,6 +501,114 @@ def parse_arguments() -> Namespace:
     )
     parser.add_argument('--directories-ignore', nargs='*', default=[], type=str)
     parser.add_argument('--files-ignore', nargs='*', default=[], type=str)
+    parser.add_argument('--no-gitignore', action='store_true')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--strict-style', action='store_true')
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--no-checkpoint', action='store_true')
+    parser.add_argument(
+        '--checkpoint-file',
+        nargs='?',
+        default='.docstring_generator_journal.jsonl',
+        type=str,
+    )
+    parser.add_argument('--patch-file', nargs='?', default='-', type=str)
+    parser.add_argument('--discovery-workers', nargs='?', default=8, type=int)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument(
+        '--cache-file', nargs='?', default=get_default_cache_file(), type=str
+    )
+    parser.add_argument('--cache-max-entries', nargs='?', default=10000, type=int)
+    parser.add_argument('--queue-max-size', nargs='?', default=1000, type=int)
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--shard', nargs='?', default='1/1', type=parse_shard)
+    parser.add_argument('--merge-caches', nargs='*', default=[], type=str)
+    parser.add_argument('--merge-manifests', nargs='*', default=[], type=str)
+    parser.add_argument('--merge-reports', nargs='*', default=[], type=str)
+    parser.add_argument(
+        '--manifest-file',
+        nargs='?',
+        default='.docstring_generator_manifest.json',
+        type=str,
+    )
+    parser.add_argument('--context-index', action='store_true')
+    parser.add_argument('--context-index-wait', nargs='?', default=10.0, type=float)
+    parser.add_argument(
+        '--index-file',
+        nargs='?',
+        default='.docstring_generator_index.json',
+        type=str,
+    )
+    parser.add_argument('--paths-from-stdin', action='store_true')
+    parser.add_argument(
+        '--watch-backend',
+        nargs='?',
+        default='auto',
+        choices=['auto', 'inotify', 'poll'],
+    )
+    parser.add_argument('--watch-debounce', nargs='?', default=0.5, type=float)
+    parser.add_argument('--watch-poll-interval', nargs='?', default=1.0, type=float)
+    parser.add_argument(
+        '--write-mode', nargs='?', default='splice', choices=['splice', 'unparse']
+    )
+    parser.add_argument(
+        '--formatter', nargs='?', default='none', choices=['none', 'black']
+    )
+    parser.add_argument('--batch-token-budget', nargs='?', default=0, type=int)
+    parser.add_argument('--batch-max-symbol-tokens', nargs='?', default=200, type=int)
+    parser.add_argument('--context-token-budget', nargs='?', default=0, type=int)
+    parser.add_argument('--split-class-token-threshold', nargs='?', default=0, type=int)
+    parser.add_argument(
+        '--dedup', nargs='?', default='exact', choices=['off', 'exact', 'structure']
+    )
+    parser.add_argument('--processes', nargs='?', default=0, type=int)
+    parser.add_argument('--process-chunk-size', nargs='?', default=16, type=int)
+    parser.add_argument(
+        '--schedule-policy',
+        nargs='?',
+        default='fifo',
+        choices=['fifo', 'public-first', 'largest-first', 'shortest-first'],
+    )
+    parser.add_argument('--token-budget', nargs='?', default=0, type=int)
+    parser.add_argument('--cost-budget', nargs='?', default=0.0, type=float)
+    parser.add_argument('--max-concurrency', nargs='?', default=8, type=int)
+    parser.add_argument('--requests-per-minute', nargs='?', default=0, type=int)
+    parser.add_argument('--tokens-per-minute', nargs='?', default=0, type=int)
+    parser.add_argument('--max-retries', nargs='?', default=5, type=int)
+    parser.add_argument(
+        '--llm-provider',
+        nargs='?',
+        default='openai',
+        choices=['openai', 'local', 'rule-based', 'fake'],
+    )
+    parser.add_argument('--llm-model', nargs='?', default='', type=str)
+    parser.add_argument(
+        '--llm-base-url', nargs='?', default='http://localhost:8000/v1', type=str
+    )
+    parser.add_argument('--llm-batch-size', nargs='?', default=1, type=int)
+    parser.add_argument('--llm-batch-delay', nargs='?', default=0.05, type=float)
+    parser.add_argument('--http-max-connections', nargs='?', default=32, type=int)
+    parser.add_argument(
+        '--http-max-keepalive-connections', nargs='?', default=16, type=int
+    )
+    parser.add_argument('--http-keepalive-expiry', nargs='?', default=30.0, type=float)
+    parser.add_argument('--http-timeout', nargs='?', default=60.0, type=float)
+    parser.add_argument('--http-connect-timeout', nargs='?', default=10.0, type=float)
+    parser.add_argument('--http2', action='store_true')
+    parser.add_argument('--hedge-quantile', nargs='?', default=0.0, type=float)
+    parser.add_argument('--hedge-min-samples', nargs='?', default=20, type=int)
+    parser.add_argument('--report-file', nargs='?', default='', type=str)
+    parser.add_argument(
+        '--report-format',
+        nargs='?',
+        default='json',
+        choices=['json', 'openmetrics', 'sarif'],
+    )
+    parser.add_argument('--report-only', action='store_true')
+    parser.add_argument('--fail-under', nargs='?', default=100.0, type=float)
+    parser.add_argument('--progress', action='store_true')
+    parser.add_argument('--prompt-token-cost', nargs='?', default=0.0015, type=float)
+    parser.add_argument('--completion-token-cost', nargs='?', default=0.002, type=float)
     parser.add_argument(
         '--documentation-style',
         nargs='?',
@@ -197,11 +617,25 @@ def parse_arguments() -> Namespace:
         type=str,
     )
     args = parser.parse_args()
+    if args.paths_from_stdin:
+        args.path = [
+            entry
+            for entry in (line.strip() for line in sys.stdin)
+            if entry.endswith('.py') and path.isfile(entry)
+        ]
+        if not args.path:
+            print('No changed python files were provided.')
+            raise SystemExit(0)
     paths: list[str] = args.path
     for entry in paths:
         if not path.exists(entry):
             print(f"The target directory '{entry}' doesn't exist")
             raise SystemExit(1)
+    if args.llm_provider != 'openai' or is_merge(args) or args.report_only:
+        return args
+    from dotenv import load_dotenv
+
+    load_dotenv()
     if args.OPENAI_API_KEY:
         os.environ['OPENAI_API_KEY'] = args.OPENAI_API_KEY
     if not os.environ.get('OPENAI_API_KEY', None):
@@ -210,6 +644,11 @@ def parse_arguments() -> Namespace:
     return args
 
 
+def is_merge(args: Namespace) -> bool:
+    """Check whether the arguments ask to merge the results of the shards of a run."""
+    return bool(args.merge_caches or args.merge_manifests or args.merge_reports)
+
+
 def create_application_config(args: Namespace) -> Config:
     config: Config = Config(
         path=set(args.path),
@@ -217,6 +656,67 @@ def create_application_config(args: Namespace) -> Config:
         overwrite_class_docstring=args.overwrite_class_docstring,
         overwrite_class_methods_docstring=args.overwrite_class_methods_docstring,
         documentation_style=args.documentation_style,
+        strict_style=args.strict_style,
+        respect_gitignore=not args.no_gitignore,
+        dry_run=args.dry_run,
+        checkpoint=not args.no_checkpoint,
+        checkpoint_file=args.checkpoint_file,
+        resume=args.resume,
+        patch_file=args.patch_file,
+        discovery_workers=args.discovery_workers,
+        use_cache=not args.no_cache,
+        cache_file=args.cache_file,
+        cache_max_entries=args.cache_max_entries,
+        schedule_policy=args.schedule_policy,
+        token_budget=args.token_budget,
+        cost_budget=args.cost_budget,
+        max_concurrency=args.max_concurrency,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_retries=args.max_retries,
+        incremental=args.incremental,
+        manifest_file=args.manifest_file,
+        context_index=args.context_index,
+        context_index_wait=args.context_index_wait,
+        watch_backend=args.watch_backend,
+        watch_debounce=args.watch_debounce,
+        watch_poll_interval=args.watch_poll_interval,
+        index_file=args.index_file,
+        queue_max_size=args.queue_max_size,
+        shard_index=args.shard[0],
+        shard_count=args.shard[1],
+        merge_caches=args.merge_caches,
+        merge_manifests=args.merge_manifests,
+        merge_reports=args.merge_reports,
+        write_mode=args.write_mode,
+        formatter=args.formatter,
+        batch_token_budget=args.batch_token_budget,
+        batch_max_symbol_tokens=args.batch_max_symbol_tokens,
+        context_token_budget=args.context_token_budget,
+        split_class_token_threshold=args.split_class_token_threshold,
+        dedup=args.dedup,
+        processes=args.processes,
+        process_chunk_size=args.process_chunk_size,
+        llm_provider=args.llm_provider,
+        llm_model=args.llm_model,
+        llm_base_url=args.llm_base_url,
+        llm_batch_size=args.llm_batch_size,
+        llm_batch_delay=args.llm_batch_delay,
+        http_max_connections=args.http_max_connections,
+        http_max_keepalive_connections=args.http_max_keepalive_connections,
+        http_keepalive_expiry=args.http_keepalive_expiry,
+        http_timeout=args.http_timeout,
+        http_connect_timeout=args.http_connect_timeout,
+        http2=args.http2,
+        hedge_quantile=args.hedge_quantile,
+        hedge_min_samples=args.hedge_min_samples,
+        report_file=args.report_file,
+        report_format=args.report_format,
+        report_only=args.report_only,
+        coverage_fail_under=args.fail_under,
+        progress=args.progress,
+        prompt_token_cost=args.prompt_token_cost,
+        completion_token_cost=args.completion_token_cost,
     )
     config.directories_ignore.update(args.directories_ignore)
     config.files_ignore.update(args.files_ignore)
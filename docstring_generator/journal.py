@@ -0,0 +1,77 @@
+import json
+import os
+from threading import Lock
+from typing import IO, Any, Optional
+
+from .manifest import RunManifest, get_content_hash
+
+
+class RunJournal:
+    """A checkpoint journal of the llm replies and the written modules of a run.
+
+    Every reply and every written module is appended to the journal as one
+    json line, flushed and synced to disk, so a crash loses at most the
+    line being written. On resume the journal is replayed: the replies are
+    served before the cache and the llm, and the modules written since are
+    skipped while their content is unchanged. The journal is removed once
+    a run completes.
+
+    It stands in for the cache in the pipeline, passing through to it."""
+
+    def __init__(self, journal_file: str, resume: bool = False, cache: Any = None):
+        self.journal_file: str = journal_file
+        self.cache: Any = cache
+        self.replies: dict[str, str] = {}
+        self.modules: dict[str, str] = {}
+        self.lock: Lock = Lock()
+        if resume and os.path.exists(journal_file):
+            self.replay()
+        self.file: IO = open(journal_file, 'a' if resume else 'w', encoding='utf-8')
+
+    def replay(self) -> None:
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry: dict = json.loads(line)
+                except ValueError:
+                    continue
+                if 'reply' in entry:
+                    self.replies[entry['key']] = entry['reply']
+                elif 'module' in entry:
+                    self.modules[entry['module']] = entry['hash']
+
+    def append(self, entry: dict) -> None:
+        line: str = json.dumps(entry) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def get(self, key: str) -> Optional[str]:
+        reply: Optional[str] = self.replies.get(key)
+        if reply is None and self.cache:
+            return self.cache.get(key)
+        return reply
+
+    def set(self, key: str, reply: str) -> None:
+        self.append({'key': key, 'reply': reply})
+        if self.cache:
+            self.cache.set(key, reply)
+
+    def record_module(self, module_path: str) -> None:
+        with open(module_path, 'rb') as f:
+            content_hash: str = get_content_hash(f.read())
+        self.append({'module': RunManifest.get_key(module_path), 'hash': content_hash})
+
+    def is_module_done(self, module_path: str) -> bool:
+        """Check whether a module was written by the interrupted run and is unchanged since."""
+        content_hash: Optional[str] = self.modules.get(RunManifest.get_key(module_path))
+        if not content_hash:
+            return False
+        with open(module_path, 'rb') as f:
+            return get_content_hash(f.read()) == content_hash
+
+    def close(self, completed: bool = True) -> None:
+        self.file.close()
+        if completed:
+            os.remove(self.journal_file)
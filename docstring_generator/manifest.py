@@ -0,0 +1,144 @@
+import ast
+import hashlib
+import json
+import os
+import textwrap
+from threading import Lock
+from typing import Optional
+
+from .parsed_module import ParsedModule
+from .shard import is_in_shard
+
+
+def get_content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_symbol_fingerprint(symbol_code: str) -> str:
+    """Get a hash of the ast of a symbol, which ignores its formatting and comments.
+
+    Unlike the cache keys, it covers the docstrings, so that a symbol whose
+    docstring was removed since the last run is processed again."""
+    try:
+        normalized_code: str = ast.dump(
+            ast.parse(textwrap.dedent(symbol_code)), annotate_fields=False
+        )
+    except SyntaxError:
+        normalized_code = symbol_code
+    return get_content_hash(normalized_code.encode('utf-8'))
+
+
+def get_symbols_fingerprints(parsed_module: ParsedModule) -> dict[str, str]:
+    """Get the fingerprints of the top level functions and classes of a module."""
+    return {
+        node.name: get_symbol_fingerprint(parsed_module.get_segment(node))
+        for node in parsed_module.iter_top_level_symbols()
+    }
+
+
+class RunManifest:
+    """The content hashes and symbol fingerprints of the modules from the last run.
+
+    It is used in incremental mode to only queue the modules and the symbols
+    that changed since they were last successfully processed. The manifest
+    of a sharded run records its shard, so that only the modules of the
+    shard are taken from it when the manifests of the shards are merged."""
+
+    def __init__(self, manifest_file: str, shard: tuple[int, int] = (1, 1)):
+        self.manifest_file: str = manifest_file
+        self.shard: tuple[int, int] = shard
+        self.files: dict[str, dict] = {}
+        self.lock: Lock = Lock()
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as f:
+                self.files = json.load(f).get('files', {})
+
+    @staticmethod
+    def get_key(module_path: str) -> str:
+        return os.path.normpath(module_path)
+
+    def is_module_changed(self, module_path: str) -> bool:
+        """Check whether a module changed since it was last processed."""
+        with self.lock:
+            entry: Optional[dict] = self.files.get(self.get_key(module_path))
+        if not entry or not entry.get('hash'):
+            return True
+        stat = os.stat(module_path)
+        if stat.st_mtime_ns == entry['mtime_ns'] and stat.st_size == entry['size']:
+            return False
+        with open(module_path, 'rb') as f:
+            return get_content_hash(f.read()) != entry['hash']
+
+    def get_module_stat(self, module_path: str) -> Optional[tuple[int, int]]:
+        """Get the modification time and the size of a module when it was last recorded."""
+        with self.lock:
+            entry: Optional[dict] = self.files.get(self.get_key(module_path))
+        if not entry:
+            return None
+        return entry['mtime_ns'], entry['size']
+
+    def is_symbol_changed(
+        self, module_path: str, symbol_name: str, symbol_code: str
+    ) -> bool:
+        """Check whether a symbol changed since it was last processed."""
+        with self.lock:
+            entry: dict = self.files.get(self.get_key(module_path), {})
+        fingerprint: Optional[str] = entry.get('symbols', {}).get(symbol_name)
+        return fingerprint != get_symbol_fingerprint(symbol_code)
+
+    def record_module(
+        self, parsed_module: ParsedModule, failed_symbols: set[str] = None
+    ) -> None:
+        """Record the current state of a processed module.
+
+        The failed symbols are not recorded, and neither is the module hash if
+        any symbol failed, so that they are queued again on the next run."""
+        failed_symbols = failed_symbols or set()
+        module_path: str = parsed_module.module_path
+        stat = os.stat(module_path)
+        symbols: dict[str, str] = {
+            symbol_name: fingerprint
+            for symbol_name, fingerprint in get_symbols_fingerprints(
+                parsed_module
+            ).items()
+            if symbol_name not in failed_symbols
+        }
+        with self.lock:
+            self.files[self.get_key(module_path)] = {
+                'hash': (
+                    None
+                    if failed_symbols
+                    else get_content_hash(parsed_module.source_bytes)
+                ),
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'symbols': symbols,
+            }
+
+    def merge(self, manifest_file: str) -> None:
+        """Merge the modules of the manifest of a shard, or of every module if it is not sharded."""
+        with open(manifest_file, 'r') as f:
+            data: dict = json.load(f)
+        shard_index, shard_count = data.get('shard', (1, 1))
+        with self.lock:
+            self.files.update(
+                (module_path, entry)
+                for module_path, entry in data.get('files', {}).items()
+                if is_in_shard(module_path, shard_index, shard_count)
+            )
+
+    def save(self, prune: bool = True) -> None:
+        """Save the manifest, dropping the modules that no longer exist when pruning."""
+        with self.lock:
+            files: dict[str, dict] = {
+                module_path: entry
+                for module_path, entry in self.files.items()
+                if not prune or os.path.exists(module_path)
+            }
+        data: dict = {'version': 1, 'files': files}
+        if self.shard[1] > 1:
+            data['shard'] = list(self.shard)
+        temp_file: str = f'{self.manifest_file}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_file, self.manifest_file)
@@ -0,0 +1,37 @@
+import json
+import logging
+
+from .cache import DocstringCache
+from .config import Config
+from .manifest import RunManifest
+from .metrics import merge_reports
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def merge_shard_results(config: Config) -> None:
+    """Merge the caches, manifests and reports of the shards of a run into the configured ones."""
+    if config.merge_caches:
+        cache: DocstringCache = DocstringCache(
+            cache_file=config.cache_file, max_entries=config.cache_max_entries
+        )
+        for cache_file in config.merge_caches:
+            cache.merge(cache_file)
+        logger.info('%s', cache)
+        cache.close()
+    if config.merge_manifests:
+        manifest: RunManifest = RunManifest(config.manifest_file)
+        for manifest_file in config.merge_manifests:
+            manifest.merge(manifest_file)
+        manifest.save(prune=False)
+    if config.merge_reports:
+        reports: list[dict] = []
+        for report_file in config.merge_reports:
+            with open(report_file, 'r') as f:
+                reports.append(json.load(f))
+        report: str = json.dumps(merge_reports(reports), indent=2)
+        if not config.report_file or config.report_file == '-':
+            print(report)
+            return
+        with open(config.report_file, 'w') as f:
+            f.write(report)
@@ -0,0 +1,361 @@
+import json
+import sys
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Iterator, Optional
+
+STAGES: tuple[str, ...] = (
+    'discover',
+    'extract',
+    'prompt',
+    'llm',
+    'parse_response',
+    'write',
+    'format',
+)
+BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    float('inf'),
+)
+
+
+class Histogram:
+    """A latency histogram with fixed buckets in seconds."""
+
+    def __init__(self):
+        self.counts: list[int] = [0] * len(BUCKETS)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Get the upper bound of the bucket that holds the given quantile."""
+        if not self.count:
+            return 0.0
+        cumulative: int = 0
+        for bucket, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= q * self.count:
+                return min(bucket, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'max': round(self.max, 6),
+            'buckets': list(self.counts),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Histogram':
+        histogram: Histogram = cls()
+        histogram.counts = list(data.get('buckets', histogram.counts))
+        histogram.count = data.get('count', 0)
+        histogram.sum = data.get('sum', 0.0)
+        histogram.max = data.get('max', 0.0)
+        return histogram
+
+    def merge(self, other: 'Histogram') -> None:
+        self.counts = [
+            count + other_count for count, other_count in zip(self.counts, other.counts)
+        ]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+
+class RunMetrics:
+    """The instrumentation of a run: stage latencies, queue depths, tokens, cost and failures.
+
+    The failures are put on the failed modules queue as they happen, and are
+    drained from it into the report at the end of the run."""
+
+    def __init__(self):
+        self.lock: Lock = Lock()
+        self.reset()
+
+    def reset(
+        self,
+        failed_modules_queue: Optional[Queue] = None,
+        prompt_token_cost: float = 0.0,
+        completion_token_cost: float = 0.0,
+    ) -> None:
+        with self.lock:
+            self.failed_modules_queue: Queue = failed_modules_queue or Queue()
+            self.prompt_token_cost: float = prompt_token_cost
+            self.completion_token_cost: float = completion_token_cost
+            self.histograms: dict[str, Histogram] = defaultdict(Histogram)
+            self.counters: dict[str, int] = defaultdict(int)
+            self.queue_depths: list[dict] = []
+            self.started_at: float = time.perf_counter()
+            self.failures: list[dict] = []
+            self.stopped: Event = Event()
+            self.threads: list[Thread] = []
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] += value
+
+    def record_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self.lock:
+            self.counters['prompt_tokens'] += prompt_tokens
+            self.counters['completion_tokens'] += completion_tokens
+
+    def record_failure(
+        self, module_path: str, symbol: Optional[str], stage: str, error: Exception
+    ) -> None:
+        """Record why a module or one of its symbols failed at a stage."""
+        reason: str = f'{type(error).__name__}: {error}'
+        self.failed_modules_queue.put(
+            {
+                'module_path': module_path,
+                'symbol': symbol,
+                'stage': stage,
+                'reason': reason,
+            }
+        )
+        self.increment('failures')
+        print(
+            f'Failed to {stage} {module_path}{":" + symbol if symbol else ""}: {reason}',
+            file=sys.stderr,
+        )
+
+    @property
+    def cost(self) -> float:
+        return (
+            self.counters['prompt_tokens'] / 1000 * self.prompt_token_cost
+            + self.counters['completion_tokens'] / 1000 * self.completion_token_cost
+        )
+
+    def sample_queues(self, queues: dict[str, Queue], interval: float) -> None:
+        """Sample the depth of the pipeline queues until the run stops."""
+        while not self.stopped.wait(interval):
+            sample: dict = {'time': round(time.perf_counter() - self.started_at, 3)}
+            sample.update({name: queue.qsize() for name, queue in queues.items()})
+            with self.lock:
+                self.queue_depths.append(sample)
+
+    def show_progress(self, interval: float) -> None:
+        """Keep a progress line up to date on stderr until the run stops."""
+        while not self.stopped.wait(interval):
+            print(f'\r{self.get_progress_line()}', end='', file=sys.stderr, flush=True)
+        print(f'\r{self.get_progress_line()}', file=sys.stderr, flush=True)
+
+    def get_progress_line(self) -> str:
+        counters: dict[str, int] = self.counters
+        return (
+            f'modules {counters["modules_done"]}/{counters["modules_discovered"]}'
+            f' | symbols {counters["symbols_done"]}/{counters["symbols_queued"]}'
+            f' | llm calls {counters["llm_calls"]}'
+            f' | tokens {counters["prompt_tokens"] + counters["completion_tokens"]}'
+            f' | cost ${self.cost:.4f}'
+            f' | failures {counters["failures"]}'
+        )
+
+    def start(self, queues: dict[str, Queue], config) -> None:
+        """Start sampling the queues and, if asked, showing the progress."""
+        self.threads.append(
+            Thread(
+                target=self.sample_queues,
+                args=(queues, config.queue_sample_interval),
+                daemon=True,
+            )
+        )
+        if config.progress:
+            self.threads.append(
+                Thread(target=self.show_progress, args=(0.5,), daemon=True)
+            )
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and showing the progress, then collect the failures."""
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        while True:
+            try:
+                self.failures.append(self.failed_modules_queue.get_nowait())
+            except Empty:
+                break
+
+    def get_report(self, cache=None) -> dict:
+        """Get the machine readable report of the run."""
+        cache_lookups: int = cache.hits + cache.misses if cache else 0
+        return {
+            'wall_seconds': round(time.perf_counter() - self.started_at, 6),
+            'stages': {
+                stage: self.histograms[stage].to_dict()
+                for stage in STAGES
+                if stage in self.histograms
+            },
+            'counters': dict(self.counters),
+            'tokens': {
+                'prompt': self.counters['prompt_tokens'],
+                'completion': self.counters['completion_tokens'],
+            },
+            'cost_usd': round(self.cost, 6),
+            'cache': {
+                'hits': cache.hits if cache else 0,
+                'misses': cache.misses if cache else 0,
+                'hit_rate': (
+                    round(cache.hits / cache_lookups, 4) if cache_lookups else 0.0
+                ),
+                'evictions': cache.evictions if cache else 0,
+            },
+            'queue_depths': self.queue_depths,
+            'failures': self.failures,
+        }
+
+    def get_openmetrics_report(self, cache=None) -> str:
+        """Get the report of the run in the OpenMetrics text format."""
+        report: dict = self.get_report(cache)
+        lines: list[str] = [
+            '# TYPE docstring_generator_stage_seconds histogram',
+            '# UNIT docstring_generator_stage_seconds seconds',
+        ]
+        for stage in STAGES:
+            if stage not in self.histograms:
+                continue
+            histogram: Histogram = self.histograms[stage]
+            cumulative: int = 0
+            for bucket, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                bound: str = '+Inf' if bucket == float('inf') else str(bucket)
+                lines.append(
+                    f'docstring_generator_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'docstring_generator_stage_seconds_count{{stage="{stage}"}} {histogram.count}'
+            )
+            lines.append(
+                f'docstring_generator_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}'
+            )
+        lines.append('# TYPE docstring_generator_events counter')
+        for counter, value in sorted(report['counters'].items()):
+            lines.append(
+                f'docstring_generator_events_total{{event="{counter}"}} {value}'
+            )
+        lines.append('# TYPE docstring_generator_cost_usd gauge')
+        lines.append(f'docstring_generator_cost_usd {report["cost_usd"]}')
+        lines.append('# TYPE docstring_generator_cache_lookups counter')
+        lines.append(
+            f'docstring_generator_cache_lookups_total{{result="hit"}} {report["cache"]["hits"]}'
+        )
+        lines.append(
+            f'docstring_generator_cache_lookups_total{{result="miss"}} {report["cache"]["misses"]}'
+        )
+        lines.append('# TYPE docstring_generator_queue_depth_max gauge')
+        for queue_name in {
+            name for sample in self.queue_depths for name in sample if name != 'time'
+        }:
+            lines.append(
+                f'docstring_generator_queue_depth_max{{queue="{queue_name}"}} '
+                f'{max(sample[queue_name] for sample in self.queue_depths)}'
+            )
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def save_report(self, report_file: str, report_format: str, cache=None) -> None:
+        if report_format == 'openmetrics':
+            report: str = self.get_openmetrics_report(cache)
+        else:
+            report = json.dumps(self.get_report(cache), indent=2)
+        if report_file == '-':
+            print(report)
+            return
+        with open(report_file, 'w') as f:
+            f.write(report)
+
+
+def merge_reports(reports: list[dict]) -> dict:
+    """Merge the json reports of the shards of a run into one report.
+
+    The latency histograms are merged bucket by bucket, so the quantiles are
+    those of the whole run. The wall time is the one of the slowest shard."""
+    histograms: dict[str, Histogram] = defaultdict(Histogram)
+    counters: dict[str, int] = defaultdict(int)
+    cache_counters: dict[str, int] = defaultdict(int)
+    for report in reports:
+        for stage, stage_report in report.get('stages', {}).items():
+            histograms[stage].merge(Histogram.from_dict(stage_report))
+        for counter, value in report.get('counters', {}).items():
+            counters[counter] += value
+        for counter in ('hits', 'misses', 'evictions'):
+            cache_counters[counter] += report.get('cache', {}).get(counter, 0)
+    cache_lookups: int = cache_counters['hits'] + cache_counters['misses']
+    return {
+        'wall_seconds': max(
+            (report.get('wall_seconds', 0.0) for report in reports), default=0.0
+        ),
+        'shards': len(reports),
+        'stages': {
+            stage: histograms[stage].to_dict()
+            for stage in STAGES
+            if stage in histograms
+        },
+        'counters': dict(counters),
+        'tokens': {
+            'prompt': counters['prompt_tokens'],
+            'completion': counters['completion_tokens'],
+        },
+        'cost_usd': round(sum(report.get('cost_usd', 0.0) for report in reports), 6),
+        'cache': {
+            'hits': cache_counters['hits'],
+            'misses': cache_counters['misses'],
+            'hit_rate': (
+                round(cache_counters['hits'] / cache_lookups, 4)
+                if cache_lookups
+                else 0.0
+            ),
+            'evictions': cache_counters['evictions'],
+        },
+        'queue_depths': sorted(
+            (sample for report in reports for sample in report.get('queue_depths', [])),
+            key=lambda sample: sample.get('time', 0.0),
+        ),
+        'failures': [
+            failure for report in reports for failure in report.get('failures', [])
+        ],
+    }
+
+
+metrics: RunMetrics = RunMetrics()
@@ -0,0 +1,98 @@
+import ast
+from ast import AsyncFunctionDef, ClassDef, FunctionDef
+from typing import Iterator, NamedTuple, Optional, Union
+
+SymbolNode = Union[FunctionDef, AsyncFunctionDef, ClassDef]
+
+
+class Symbol(NamedTuple):
+    qualified_name: str
+    node: SymbolNode
+    is_method: bool
+
+
+class ParsedModule:
+    """A module's source code and ast, parsed once and shared by the pipeline.
+
+    The byte offset of every line is computed once so that getting the source
+    code of a node does not split the whole module again."""
+
+    def __init__(self, module_path: str, source_bytes: bytes):
+        self.module_path: str = module_path
+        self.source_bytes: bytes = source_bytes
+        self.source: str = source_bytes.decode('utf-8')
+        self.tree: ast.Module = ast.parse(self.source)
+        self.line_offsets: list[int] = [0]
+        for line in source_bytes.splitlines(keepends=True):
+            self.line_offsets.append(self.line_offsets[-1] + len(line))
+
+    @classmethod
+    def from_path(cls, module_path: str) -> 'ParsedModule':
+        with open(module_path, 'rb') as f:
+            return cls(module_path, f.read())
+
+    def get_offsets(self, node: ast.AST) -> tuple[int, int]:
+        """Get the start and end byte offsets of a node in the module."""
+        return (
+            self.line_offsets[node.lineno - 1] + node.col_offset,
+            self.line_offsets[node.end_lineno - 1] + node.end_col_offset,
+        )
+
+    def get_line(self, lineno: int) -> str:
+        return self.source_bytes[
+            self.line_offsets[lineno - 1] : self.line_offsets[lineno]
+        ].decode('utf-8')
+
+    def get_segment(self, node: ast.AST) -> str:
+        """Get the source code of a node."""
+        start, end = self.get_offsets(node)
+        return self.source_bytes[start:end].decode('utf-8')
+
+    def iter_symbols(self) -> Iterator[Symbol]:
+        """Iterate through all the functions, async functions, classes and methods."""
+        yield from self._iter_symbols(self.tree, '', False)
+
+    def _iter_symbols(
+        self, parent: ast.AST, prefix: str, in_class: bool
+    ) -> Iterator[Symbol]:
+        for node in ast.iter_child_nodes(parent):
+            if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)):
+                qualified_name: str = f'{prefix}{node.name}'
+                is_class: bool = isinstance(node, ClassDef)
+                yield Symbol(qualified_name, node, in_class and not is_class)
+                yield from self._iter_symbols(node, f'{qualified_name}.', is_class)
+            elif isinstance(node, ast.stmt):
+                yield from self._iter_symbols(node, prefix, in_class)
+
+    def get_exports(self) -> Optional[set[str]]:
+        """Get the names listed in the module's __all__, if it defines one."""
+        exports: Optional[set[str]] = None
+        for node in self.tree.body:
+            if isinstance(node, ast.Assign):
+                targets: list[ast.expr] = node.targets
+            elif isinstance(node, (ast.AugAssign, ast.AnnAssign)) and node.value:
+                targets = [node.target]
+            else:
+                continue
+            if not any(
+                isinstance(target, ast.Name) and target.id == '__all__'
+                for target in targets
+            ):
+                continue
+            if not isinstance(node.value, (ast.List, ast.Tuple)):
+                continue
+            names: set[str] = {
+                element.value
+                for element in node.value.elts
+                if isinstance(element, ast.Constant) and isinstance(element.value, str)
+            }
+            if isinstance(node, ast.AugAssign) and exports is not None:
+                exports |= names
+            else:
+                exports = names
+        return exports
+
+    def iter_top_level_symbols(self) -> Iterator[SymbolNode]:
+        for node in self.tree.body:
+            if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)):
+                yield node
@@ -0,0 +1,66 @@
+import difflib
+import os
+import sys
+from threading import Lock
+from typing import IO, Optional
+
+NO_NEWLINE_MARKER: str = '\\ No newline at end of file\n'
+
+
+def get_patch_path(module_path: str) -> str:
+    """Get the slash separated path of a module relative to the working directory."""
+    return os.path.relpath(module_path).replace(os.sep, '/')
+
+
+def get_module_diff(module_path: str, source: str, new_source: str) -> str:
+    """Get the unified diff of a module that `git apply` and `patch -p1` accept."""
+    patch_path: str = get_patch_path(module_path)
+    lines: list[str] = []
+    for line in difflib.unified_diff(
+        source.splitlines(keepends=True),
+        new_source.splitlines(keepends=True),
+        fromfile=f'a/{patch_path}',
+        tofile=f'b/{patch_path}',
+    ):
+        lines.append(line if line.endswith('\n') else f'{line}\n{NO_NEWLINE_MARKER}')
+    return ''.join(lines)
+
+
+class PatchWriter:
+    """Stream the diffs of the modules as they finish, instead of rewriting them.
+
+    The patch file is either '-' for the standard output, a directory that
+    gets one patch per module, or a single patch file."""
+
+    def __init__(self, patch_file: str):
+        self.patch_file: str = patch_file
+        self.lock: Lock = Lock()
+        self.patch_dir: Optional[str] = None
+        self.stream: Optional[IO] = None
+        self.modules: int = 0
+        if patch_file == '-':
+            self.stream = sys.stdout
+        elif patch_file.endswith(('/', os.sep)) or os.path.isdir(patch_file):
+            self.patch_dir = patch_file
+            os.makedirs(patch_file, exist_ok=True)
+        else:
+            self.stream = open(patch_file, 'w')
+
+    def write(self, module_path: str, diff: str) -> None:
+        if not diff:
+            return
+        with self.lock:
+            self.modules += 1
+            if self.patch_dir:
+                patch_name: str = get_patch_path(module_path).replace('/', '__')
+                with open(
+                    os.path.join(self.patch_dir, f'{patch_name}.patch'), 'w'
+                ) as f:
+                    f.write(diff)
+            else:
+                self.stream.write(diff)
+                self.stream.flush()
+
+    def close(self) -> None:
+        if self.stream and self.stream is not sys.stdout:
+            self.stream.close()
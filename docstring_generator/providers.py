@@ -0,0 +1,62 @@
+import os
+from typing import Any, Callable
+
+from .config import Config
+from .transport import get_completions_client
+
+
+def get_openai_llm(config: Config) -> Any:
+    from langchain_openai import OpenAI
+
+    async_client: Any = get_completions_client(config)
+    if config.llm_model:
+        return OpenAI(model=config.llm_model, async_client=async_client, temperature=0)
+    return OpenAI(async_client=async_client, temperature=0)
+
+
+def get_local_llm(config: Config) -> Any:
+    """Create a client of a local openai compatible completions server.
+
+    The prompts of a batch are sent in one completions request, so that the
+    server can run them as one batched inference."""
+    from langchain_openai import OpenAI
+
+    api_key: str = os.environ.get('LOCAL_LLM_API_KEY', 'local')
+    return OpenAI(
+        base_url=config.llm_base_url,
+        api_key=api_key,
+        async_client=get_completions_client(config, api_key, config.llm_base_url),
+        model=config.llm_model or 'local',
+        batch_size=max(config.llm_batch_size, 1),
+        temperature=0,
+    )
+
+
+def get_rule_based_llm(config: Config) -> Any:
+    from .rule_based_llm import RuleBasedLLM
+
+    return RuleBasedLLM(config.documentation_style)
+
+
+def get_fake_llm(config: Config) -> Any:
+    from .fake_llm import FakeLLM
+
+    return FakeLLM()
+
+
+LLM_PROVIDERS: dict[str, Callable[[Config], Any]] = {
+    'openai': get_openai_llm,
+    'local': get_local_llm,
+    'rule-based': get_rule_based_llm,
+    'fake': get_fake_llm,
+}
+
+
+def get_llm(config: Config) -> Any:
+    """Create the llm client of the configured provider.
+
+    A client replies to a prompt with ainvoke and, to batch the prompts when
+    llm_batch_size is above 1, to a list of prompts with abatch. The client
+    libraries are only imported here, so that runs where every docstring
+    comes from the cache never load them."""
+    return LLM_PROVIDERS[config.llm_provider](config)
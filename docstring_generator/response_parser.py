@@ -0,0 +1,106 @@
+import ast
+import inspect
+import re
+import textwrap
+from ast import AsyncFunctionDef, ClassDef, FunctionDef
+from typing import Optional
+
+FENCED_CODE_PATTERN = re.compile(r'```[\w+-]*[ \t]*\n(.*?)(?:```|\Z)', re.DOTALL)
+CODE_START_PATTERN = re.compile(r'^[ \t]*(?:@|def |async def |class )', re.MULTILINE)
+QUOTED_TEXT_PATTERN = re.compile(r'("""|\'\'\')(.*?)(?:\1|\Z)', re.DOTALL)
+MAX_DROPPED_LINES: int = 20
+STYLE_SECTION_PATTERNS: dict[str, re.Pattern] = {
+    'Numpy-Style': re.compile(
+        r'^[ \t]*(?:Parameters|Returns|Yields|Raises|Attributes)[ \t]*\n[ \t]*-{3,}',
+        re.MULTILINE,
+    ),
+    'Google-Style': re.compile(
+        r'^[ \t]*(?:Args|Arguments|Returns|Yields|Raises|Attributes):[ \t]*$',
+        re.MULTILINE,
+    ),
+    'Sphinx-Style': re.compile(r':(?:param|returns?|rtype|raises?)\b'),
+}
+
+
+def extract_code(reply: str) -> str:
+    """Get the code from a reply, dropping the code fences and the prose before the code."""
+    blocks: list[str] = FENCED_CODE_PATTERN.findall(reply)
+    code: str = (
+        '\n\n'.join(textwrap.dedent(block) for block in blocks) if blocks else reply
+    )
+    match: Optional[re.Match] = CODE_START_PATTERN.search(code)
+    if match:
+        code = code[match.start() :]
+    return textwrap.dedent(code.expandtabs(4)).strip()
+
+
+def parse_code(code: str) -> Optional[ast.Module]:
+    """Parse code, recovering what comes before a truncated or trailing unparsable part.
+
+    An unterminated docstring is closed first, then the trailing lines are
+    dropped one by one."""
+    lines: list[str] = code.splitlines()
+    for end in range(len(lines), max(len(lines) - MAX_DROPPED_LINES, 0), -1):
+        candidate: str = '\n'.join(lines[:end])
+        for suffix in ('', '"""', "'''"):
+            try:
+                return ast.parse(candidate + suffix)
+            except SyntaxError:
+                continue
+    return None
+
+
+def get_tree_docstrings(tree: ast.Module) -> dict[str, str]:
+    """Get the docstrings of the functions, classes and methods, keyed by qualified name."""
+    docstrings: dict[str, str] = {}
+    for node in tree.body:
+        if not isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)):
+            continue
+        docstring: Optional[str] = ast.get_docstring(node)
+        if docstring:
+            docstrings[node.name] = docstring
+        if isinstance(node, ClassDef):
+            for class_node in node.body:
+                if isinstance(class_node, (FunctionDef, AsyncFunctionDef)):
+                    method_docstring: Optional[str] = ast.get_docstring(class_node)
+                    if method_docstring:
+                        docstrings[f'{node.name}.{class_node.name}'] = method_docstring
+    return docstrings
+
+
+def get_plain_docstring(reply: str) -> Optional[str]:
+    """Get the docstring of a reply that holds no code, only the quoted or fenced docstring text.
+
+    The chat text around the quotes or the fences is dropped, and a reply
+    with neither, such as a refusal or a plain sentence, has no docstring."""
+    if CODE_START_PATTERN.search(reply):
+        return None
+    blocks: list[str] = FENCED_CODE_PATTERN.findall(reply)
+    text: str = blocks[0] if blocks else reply
+    match: Optional[re.Match] = QUOTED_TEXT_PATTERN.search(text)
+    if match:
+        text = match.group(2)
+    elif not blocks:
+        return None
+    text = inspect.cleandoc(text)
+    return text or None
+
+
+def parse_reply_docstrings(reply: str) -> dict[str, str]:
+    """Get the docstrings of every symbol in a reply, as much as can be recovered.
+
+    The code is taken from the code fences if any, the prose around it is
+    dropped, the indentation is normalized, and a truncated reply keeps the
+    symbols that come before the truncation."""
+    tree: Optional[ast.Module] = parse_code(extract_code(reply))
+    if not tree:
+        return {}
+    return get_tree_docstrings(tree)
+
+
+def matches_style(docstring: str, documentation_style: str) -> bool:
+    """Check that the sections of a docstring, if any, follow the documentation style."""
+    for style, pattern in STYLE_SECTION_PATTERNS.items():
+        if style != documentation_style and pattern.search(docstring):
+            return False
+    return True
@@ -0,0 +1,202 @@
+import ast
+import re
+from ast import AnnAssign, AsyncFunctionDef, ClassDef, FunctionDef, Name, Raise, Return
+from typing import Callable, Iterator, Optional, Union
+
+from .context import iter_exit_points
+from .fake_llm import FakeLLM
+
+# The name, type and description of a documented parameter, value or exception.
+Entry = tuple[Optional[str], Optional[str], str]
+Section = tuple[str, list[Entry]]
+
+SELF_NAMES: set[str] = {'self', 'cls'}
+GOOGLE_TITLES: dict[str, str] = {'Parameters': 'Args'}
+SPHINX_FIELDS: dict[str, tuple[str, str]] = {
+    'Parameters': ('param', 'type'),
+    'Returns': ('returns', 'rtype'),
+    'Yields': ('yields', 'ytype'),
+    'Raises': ('raises', ''),
+    'Attributes': ('ivar', 'vartype'),
+}
+
+
+def get_name_words(name: str) -> str:
+    """Split a snake case or camel case name into lower case words."""
+    name = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', name.strip('_'))
+    return ' '.join(name.replace('_', ' ').lower().split()) or name
+
+
+def get_function_summary(node: Union[FunctionDef, AsyncFunctionDef]) -> str:
+    if node.name == '__init__':
+        return 'Initialize the instance.'
+    if node.name.startswith('__') and node.name.endswith('__'):
+        return f'Implement the {node.name} protocol.'
+    return f'{get_name_words(node.name).capitalize()}.'
+
+
+def get_parameters(node: Union[FunctionDef, AsyncFunctionDef]) -> list[Entry]:
+    """Get the parameters of a function with their annotations, marking those with a default as optional."""
+    positional: list[ast.arg] = node.args.posonlyargs + node.args.args
+    defaults: list[bool] = [False] * (len(positional) - len(node.args.defaults)) + [
+        True
+    ] * len(node.args.defaults)
+    arguments: list[tuple[ast.arg, bool, str]] = [
+        (argument, has_default, '')
+        for argument, has_default in zip(positional, defaults)
+    ]
+    if node.args.vararg:
+        arguments.append((node.args.vararg, False, '*'))
+    arguments.extend(
+        (argument, default is not None, '')
+        for argument, default in zip(node.args.kwonlyargs, node.args.kw_defaults)
+    )
+    if node.args.kwarg:
+        arguments.append((node.args.kwarg, False, '**'))
+    if arguments and not arguments[0][2] and arguments[0][0].arg in SELF_NAMES:
+        arguments = arguments[1:]
+    parameters: list[Entry] = []
+    for argument, has_default, prefix in arguments:
+        types: list[str] = []
+        if argument.annotation:
+            types.append(ast.unparse(argument.annotation))
+        if has_default:
+            types.append('optional')
+        parameters.append(
+            (
+                f'{prefix}{argument.arg}',
+                ', '.join(types) or None,
+                f'The {get_name_words(argument.arg)}.',
+            )
+        )
+    return parameters
+
+
+def iter_scope_nodes(nodes: list[ast.stmt]) -> Iterator[ast.AST]:
+    """Iterate over the nodes of a function body, not descending into nested scopes."""
+    stack: list[ast.AST] = list(nodes)
+    while stack:
+        node: ast.AST = stack.pop()
+        yield node
+        if not isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef, ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def get_function_sections(node: Union[FunctionDef, AsyncFunctionDef]) -> list[Section]:
+    """Get the parameters, returned or yielded value and raised exceptions sections of a function."""
+    sections: list[Section] = []
+    parameters: list[Entry] = get_parameters(node)
+    if parameters:
+        sections.append(('Parameters', parameters))
+    return_type: Optional[str] = ast.unparse(node.returns) if node.returns else None
+    if any(
+        isinstance(child, (ast.Yield, ast.YieldFrom))
+        for child in iter_scope_nodes(node.body)
+    ):
+        sections.append(('Yields', [(None, return_type, 'The yielded values.')]))
+    elif (return_type and return_type != 'None') or any(
+        isinstance(exit_point, Return) and exit_point.value is not None
+        for exit_point in iter_exit_points(node.body)
+    ):
+        sections.append(('Returns', [(None, return_type, 'The return value.')]))
+    raises: list[Entry] = []
+    for exit_point in iter_exit_points(node.body):
+        if not isinstance(exit_point, Raise) or not exit_point.exc:
+            continue
+        exception = exit_point.exc
+        exception_name: str = ast.unparse(
+            exception.func if isinstance(exception, ast.Call) else exception
+        )
+        if exception_name not in [name for name, _, _ in raises]:
+            raises.append((exception_name, None, f'Raised by {node.name}.'))
+    if raises:
+        sections.append(('Raises', raises))
+    return sections
+
+
+def get_class_sections(node: ClassDef) -> list[Section]:
+    """Get the attributes section of a class from its annotated class level attributes."""
+    attributes: list[Entry] = [
+        (
+            statement.target.id,
+            ast.unparse(statement.annotation),
+            f'The {get_name_words(statement.target.id)}.',
+        )
+        for statement in node.body
+        if isinstance(statement, AnnAssign) and isinstance(statement.target, Name)
+    ]
+    return [('Attributes', attributes)] if attributes else []
+
+
+def format_numpy_docstring(summary: str, sections: list[Section]) -> str:
+    lines: list[str] = [summary]
+    for title, entries in sections:
+        lines += ['', title, '-' * len(title)]
+        for name, type_name, description in entries:
+            lines.append(
+                ' : '.join(part for part in (name, type_name) if part) or 'object'
+            )
+            lines.append(f'    {description}')
+    return '\n'.join(lines)
+
+
+def format_google_docstring(summary: str, sections: list[Section]) -> str:
+    lines: list[str] = [summary]
+    for title, entries in sections:
+        lines += ['', f'{GOOGLE_TITLES.get(title, title)}:']
+        for name, type_name, description in entries:
+            if name and type_name:
+                lines.append(f'    {name} ({type_name}): {description}')
+            elif name or type_name:
+                lines.append(f'    {name or type_name}: {description}')
+            else:
+                lines.append(f'    {description}')
+    return '\n'.join(lines)
+
+
+def format_sphinx_docstring(summary: str, sections: list[Section]) -> str:
+    lines: list[str] = [summary]
+    if sections:
+        lines.append('')
+    for title, entries in sections:
+        field, type_field = SPHINX_FIELDS[title]
+        for name, type_name, description in entries:
+            lines.append(
+                f':{" ".join(part for part in (field, name) if part)}: {description}'
+            )
+            if type_name and type_field:
+                lines.append(
+                    f':{" ".join(part for part in (type_field, name) if part)}: {type_name}'
+                )
+    return '\n'.join(lines)
+
+
+DOCSTRING_FORMATTERS: dict[str, Callable[[str, list[Section]], str]] = {
+    'Numpy-Style': format_numpy_docstring,
+    'Google-Style': format_google_docstring,
+    'Sphinx-Style': format_sphinx_docstring,
+}
+
+
+class RuleBasedLLM(FakeLLM):
+    """A deterministic generator of skeleton docstrings, with no model at all.
+
+    It replies like the llm, with the code from the prompt and a docstring
+    added to every function and class in it. The docstrings are built from
+    the names, the signatures, the type hints, the returned and yielded
+    values and the raised exceptions, in the documentation style."""
+
+    def __init__(self, documentation_style: str = 'Numpy-Style'):
+        super().__init__()
+        self.format_docstring: Callable[[str, list[Section]], str] = (
+            DOCSTRING_FORMATTERS[documentation_style]
+        )
+
+    def get_docstring(self, node: ast.AST) -> str:
+        if isinstance(node, ClassDef):
+            return self.format_docstring(
+                f'The {get_name_words(node.name)}.', get_class_sections(node)
+            )
+        return self.format_docstring(
+            get_function_summary(node), get_function_sections(node)
+        )
@@ -0,0 +1,99 @@
+from heapq import heappop, heappush
+from itertools import count
+from queue import Queue
+from typing import Callable, Iterator, Optional
+
+from .symbol_index import SymbolIndex
+from .work_items import SymbolSpan, WorkItem
+
+WorkSymbols = list[SymbolSpan]
+
+
+def is_public(symbol_name: str, exports: Optional[set[str]]) -> bool:
+    """Check whether a symbol is part of the public api of its module."""
+    symbol_name = symbol_name.split('.')[0]
+    if exports is not None:
+        return symbol_name in exports
+    return not symbol_name.startswith('_')
+
+
+def fifo_priority(symbols: WorkSymbols, exports: Optional[set[str]]) -> tuple:
+    return ()
+
+
+def public_first_priority(symbols: WorkSymbols, exports: Optional[set[str]]) -> tuple:
+    return (0 if any(is_public(symbol.name, exports) for symbol in symbols) else 1,)
+
+
+def largest_first_priority(symbols: WorkSymbols, exports: Optional[set[str]]) -> tuple:
+    return (-sum(symbol.tokens for symbol in symbols),)
+
+
+def shortest_first_priority(symbols: WorkSymbols, exports: Optional[set[str]]) -> tuple:
+    return (sum(symbol.tokens for symbol in symbols),)
+
+
+SCHEDULING_POLICIES: dict[str, Callable[[WorkSymbols, Optional[set[str]]], tuple]] = {
+    'fifo': fifo_priority,
+    'public-first': public_first_priority,
+    'largest-first': largest_first_priority,
+    'shortest-first': shortest_first_priority,
+}
+
+
+class ScheduledQueue(Queue):
+    """A queue of llm work ordered by a scheduling policy.
+
+    The items are the functions batches and the classes put by the
+    extraction, they are handed out by priority, then in the order they
+    were put. The exports of every module, its __all__ if it has one, are
+    set before its symbols are queued.
+
+    A bounded queue blocks the extraction while it is full. The items
+    queued again by the llm callbacks skip the bound, so that the workers
+    never wait on their own queue.
+
+    With a symbol index, the items are first ordered by dependency level,
+    the symbols used by others before them, then by the policy."""
+
+    def __init__(self, maxsize: int = 0, policy: str = 'fifo'):
+        super().__init__(maxsize)
+        self.policy: str = policy
+        self.exports: dict[str, Optional[set[str]]] = {}
+        self.index: Optional[SymbolIndex] = None
+
+    def _init(self, maxsize: int) -> None:
+        self.queue: list[tuple[tuple, int, WorkItem]] = []
+        self.counter: Iterator[int] = count()
+
+    def _qsize(self) -> int:
+        return len(self.queue)
+
+    def _put(self, item: WorkItem) -> None:
+        heappush(self.queue, (self.get_priority(item), next(self.counter), item))
+
+    def _get(self) -> WorkItem:
+        return heappop(self.queue)[-1]
+
+    def get_priority(self, item: WorkItem) -> tuple:
+        priority: tuple = SCHEDULING_POLICIES[self.policy](
+            item.symbols, self.exports.get(item.module_path)
+        )
+        if not self.index:
+            return priority
+        level: int = max(
+            self.index.get_level(item.module_path, symbol.name)
+            for symbol in item.symbols
+        )
+        return (level,) + priority
+
+    def requeue(self, item: WorkItem) -> None:
+        """Put an item without waiting for a free slot."""
+        with self.not_full:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def set_module_exports(self, module_path: str, exports: Optional[set[str]]) -> None:
+        with self.mutex:
+            self.exports[module_path] = exports
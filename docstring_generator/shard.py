@@ -0,0 +1,26 @@
+import hashlib
+import os
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parse a 'i/N' shard, numbered from 1 to N."""
+    try:
+        index, count = (int(part) for part in shard.split('/'))
+    except ValueError:
+        raise ValueError(f"The shard '{shard}' is not of the form i/N") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"The shard '{shard}' is not between 1/N and N/N")
+    return index, count
+
+
+def is_in_shard(module_path: str, shard_index: int, shard_count: int) -> bool:
+    """Check whether a module belongs to a shard, by the hash of its path.
+
+    The split only depends on the paths, so the runners of every shard must
+    be given the same relative paths."""
+    if shard_count <= 1:
+        return True
+    key: bytes = os.path.normpath(module_path).encode('utf-8')
+    return (
+        int(hashlib.sha256(key).hexdigest()[:16], 16) % shard_count == shard_index - 1
+    )
@@ -0,0 +1,376 @@
+import ast
+import json
+import os
+import time
+from ast import ClassDef
+from concurrent.futures import Future
+from threading import Event, Lock
+from typing import Optional
+
+from .parsed_module import ParsedModule, SymbolNode
+
+MAX_CONTEXT_SYMBOLS: int = 12
+MAX_SIGNATURE_LENGTH: int = 120
+MAX_SUMMARY_LENGTH: int = 160
+SELF_NAMES: set[str] = {'self', 'cls'}
+
+
+def get_module_name(module_path: str) -> str:
+    """Get the dotted name of a module, from the packages above it."""
+    directory, file_name = os.path.split(os.path.abspath(module_path))
+    parts: list[str] = [] if file_name == '__init__.py' else [file_name[:-3]]
+    while os.path.isfile(os.path.join(directory, '__init__.py')):
+        directory, package = os.path.split(directory)
+        parts.insert(0, package)
+    return '.'.join(parts)
+
+
+def get_imported_names(
+    tree: ast.Module, module_name: str, is_package: bool
+) -> dict[str, str]:
+    """Get the qualified name of every name imported by a module, resolving the relative imports."""
+    names: dict[str, str] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    names[alias.asname] = alias.name
+                else:
+                    head: str = alias.name.split('.')[0]
+                    names[head] = head
+        elif isinstance(node, ast.ImportFrom):
+            base_parts: list[str] = []
+            if node.level:
+                base_parts = module_name.split('.')
+                drop: int = node.level - 1 if is_package else node.level
+                base_parts = (
+                    base_parts[: len(base_parts) - drop] if drop else base_parts
+                )
+            if node.module:
+                base_parts.append(node.module)
+            base: str = '.'.join(base_parts)
+            for alias in node.names:
+                if alias.name != '*':
+                    names[alias.asname or alias.name] = (
+                        f'{base}.{alias.name}' if base else alias.name
+                    )
+    return names
+
+
+def get_dotted_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value: Optional[str] = get_dotted_name(node.value)
+        return f'{value}.{node.attr}' if value else None
+    return None
+
+
+def get_signature(node: SymbolNode) -> str:
+    if isinstance(node, ClassDef):
+        bases: str = ', '.join(ast.unparse(base) for base in node.bases)
+        signature: str = f'({bases})' if bases else ''
+    else:
+        signature = f'({ast.unparse(node.args)})'
+        if node.returns:
+            signature += f' -> {ast.unparse(node.returns)}'
+    return signature.replace('\n', ' ')[:MAX_SIGNATURE_LENGTH]
+
+
+def get_summary(docstring: Optional[str]) -> str:
+    """Get the first line of a docstring."""
+    for line in (docstring or '').splitlines():
+        if line.strip():
+            return line.strip()[:MAX_SUMMARY_LENGTH]
+    return ''
+
+
+class SymbolIndex:
+    """An index of the functions, classes and methods of the whole project.
+
+    Every symbol is indexed by its qualified name with its signature, the
+    first line of its docstring and the qualified names of the functions it
+    calls and the classes it derives from, as far as the imports of its
+    module resolve them. The index is saved as compact json and a module is
+    only parsed again once its modification time or size changed.
+
+    The prompts get the signatures and the summaries of the project symbols
+    a symbol uses instead of their code, and the symbols are handed out in
+    dependency order so that the summaries generated for the callees are
+    ready when their callers are prompted. A symbol waits a bounded time for
+    the llm calls of the symbols it uses that are in flight, past it they
+    are only given by their signatures."""
+
+    def __init__(self, index_file: str):
+        self.index_file: str = index_file
+        self.modules: dict[str, dict] = {}
+        self.qualified_names: dict[str, tuple[str, str]] = {}
+        self.summaries: dict[str, str] = {}
+        self.symbol_levels: dict[str, int] = {}
+        self.module_levels: dict[str, int] = {}
+        self.in_flight: dict[str, Event] = {}
+        self.lock: Lock = Lock()
+        if os.path.exists(index_file):
+            with open(index_file, 'r') as f:
+                self.modules = json.load(f).get('modules', {})
+
+    @staticmethod
+    def get_key(module_path: str) -> str:
+        return os.path.normpath(module_path)
+
+    def index_module(self, module_path: str) -> None:
+        """Index the symbols of a module, unless it did not change since it was indexed."""
+        key: str = self.get_key(module_path)
+        stat = os.stat(module_path)
+        entry: Optional[dict] = self.modules.get(key)
+        if (
+            entry
+            and entry['mtime_ns'] == stat.st_mtime_ns
+            and entry['size'] == stat.st_size
+        ):
+            return
+        parsed_module: ParsedModule = ParsedModule.from_path(module_path)
+        module_name: str = get_module_name(module_path)
+        names: dict[str, str] = get_imported_names(
+            parsed_module.tree, module_name, module_path.endswith('__init__.py')
+        )
+        for node in parsed_module.iter_top_level_symbols():
+            names[node.name] = f'{module_name}.{node.name}'
+        # The signature, the summary and the qualified names used by every symbol.
+        symbols: dict[str, list] = {}
+        for symbol in parsed_module.iter_symbols():
+            class_name: Optional[str] = None
+            if isinstance(symbol.node, ClassDef):
+                class_name = symbol.qualified_name
+            elif symbol.is_method:
+                class_name = symbol.qualified_name.rsplit('.', 1)[0]
+            symbols[symbol.qualified_name] = [
+                get_signature(symbol.node),
+                get_summary(ast.get_docstring(symbol.node)),
+                self.get_used_names(symbol.node, names, module_name, class_name),
+            ]
+        self.modules[key] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'name': module_name,
+            'symbols': symbols,
+        }
+
+    @staticmethod
+    def get_used_names(
+        node: SymbolNode,
+        names: dict[str, str],
+        module_name: str,
+        class_name: Optional[str],
+    ) -> list[str]:
+        """Get the qualified names of the base classes and the callees of a symbol."""
+        expressions: list[ast.expr] = []
+        if isinstance(node, ClassDef):
+            expressions.extend(node.bases)
+        expressions.extend(
+            child.func for child in ast.walk(node) if isinstance(child, ast.Call)
+        )
+        used_names: list[str] = []
+        for expression in expressions:
+            dotted_name: Optional[str] = get_dotted_name(expression)
+            if not dotted_name:
+                continue
+            head, _, rest = dotted_name.partition('.')
+            if head in SELF_NAMES and class_name:
+                base: str = f'{module_name}.{class_name}'
+            elif head in names:
+                base = names[head]
+            else:
+                continue
+            qualified_name: str = f'{base}.{rest}' if rest else base
+            if qualified_name not in used_names:
+                used_names.append(qualified_name)
+        return used_names
+
+    def update(self, module_paths: list[str]) -> None:
+        """Index the modules, then resolve the qualified names and the dependency levels."""
+        for module_path in module_paths:
+            try:
+                self.index_module(module_path)
+            except (OSError, SyntaxError, UnicodeDecodeError, ValueError):
+                # The extraction records the modules that can not be parsed.
+                self.modules.pop(self.get_key(module_path), None)
+        with self.lock:
+            self.qualified_names = {
+                f"{entry['name']}.{symbol_name}": (key, symbol_name)
+                for key, entry in self.modules.items()
+                for symbol_name in entry['symbols']
+            }
+            self.symbol_levels = {}
+            for qualified_name in self.qualified_names:
+                self.get_symbol_level(qualified_name, set())
+            self.module_levels = {}
+            for key in self.modules:
+                self.get_module_level(key, set())
+
+    def get_used_symbols(self, qualified_name: str) -> list[str]:
+        """Get the qualified names of the indexed symbols used by a symbol."""
+        key, symbol_name = self.qualified_names[qualified_name]
+        return [
+            used_name
+            for used_name in self.modules[key]['symbols'][symbol_name][2]
+            if used_name in self.qualified_names and used_name != qualified_name
+        ]
+
+    def get_symbol_level(self, qualified_name: str, visiting: set[str]) -> int:
+        """Get the length of the longest chain of indexed symbols used by a symbol, ignoring cycles."""
+        if qualified_name in self.symbol_levels:
+            return self.symbol_levels[qualified_name]
+        if qualified_name in visiting:
+            return 0
+        visiting.add(qualified_name)
+        level: int = max(
+            (
+                self.get_symbol_level(used_name, visiting) + 1
+                for used_name in self.get_used_symbols(qualified_name)
+            ),
+            default=0,
+        )
+        visiting.discard(qualified_name)
+        self.symbol_levels[qualified_name] = level
+        return level
+
+    def get_module_level(self, key: str, visiting: set[str]) -> int:
+        """Get the length of the longest chain of indexed modules used by a module, ignoring cycles."""
+        if key in self.module_levels:
+            return self.module_levels[key]
+        if key in visiting:
+            return 0
+        visiting.add(key)
+        module_name: str = self.modules[key]['name']
+        used_modules: set[str] = {
+            self.qualified_names[used_name][0]
+            for symbol_name in self.modules[key]['symbols']
+            for used_name in self.get_used_symbols(f'{module_name}.{symbol_name}')
+        }
+        used_modules.discard(key)
+        level: int = max(
+            (
+                self.get_module_level(used_module, visiting) + 1
+                for used_module in used_modules
+            ),
+            default=0,
+        )
+        visiting.discard(key)
+        self.module_levels[key] = level
+        return level
+
+    def get_module_order(self, module_path: str) -> int:
+        """Get the dependency level of a module, the modules it uses come first."""
+        with self.lock:
+            return self.module_levels.get(self.get_key(module_path), 0)
+
+    def get_level(self, module_path: str, symbol_name: str) -> int:
+        """Get the dependency level of a symbol, the symbols it uses come first."""
+        with self.lock:
+            entry: Optional[dict] = self.modules.get(self.get_key(module_path))
+            if not entry:
+                return 0
+            return self.symbol_levels.get(f"{entry['name']}.{symbol_name}", 0)
+
+    def set_summary(self, module_path: str, symbol_name: str, docstring: str) -> None:
+        """Record the summary of a generated docstring, for the prompts of the symbols using it."""
+        with self.lock:
+            entry: Optional[dict] = self.modules.get(self.get_key(module_path))
+            if entry:
+                self.summaries[f"{entry['name']}.{symbol_name}"] = get_summary(
+                    docstring
+                )
+
+    def get_qualified_names(
+        self, module_path: str, symbol_names: list[str]
+    ) -> list[str]:
+        entry: Optional[dict] = self.modules.get(self.get_key(module_path))
+        if not entry:
+            return []
+        return [f"{entry['name']}.{symbol_name}" for symbol_name in symbol_names]
+
+    def track(self, module_path: str, symbol_names: list[str], future: Future) -> None:
+        """Track the llm call of some symbols until its reply is handled.
+
+        It is called once the callbacks that record the docstrings are added
+        to the future, so that the summaries are set when the call settles."""
+        settled: Event = Event()
+        with self.lock:
+            qualified_names: list[str] = self.get_qualified_names(
+                module_path, symbol_names
+            )
+            for qualified_name in qualified_names:
+                self.in_flight[qualified_name] = settled
+        future.add_done_callback(lambda _: self.settle(qualified_names, settled))
+
+    def settle(self, qualified_names: list[str], settled: Event) -> None:
+        settled.set()
+        with self.lock:
+            for qualified_name in qualified_names:
+                if self.in_flight.get(qualified_name) is settled:
+                    del self.in_flight[qualified_name]
+
+    def wait(self, module_path: str, symbol_names: list[str], timeout: float) -> None:
+        """Wait up to the timeout for the llm calls in flight of the symbols used by some symbols."""
+        with self.lock:
+            events: list[Event] = [
+                self.in_flight[used_name]
+                for qualified_name in self.get_qualified_names(
+                    module_path, symbol_names
+                )
+                if qualified_name in self.qualified_names
+                for used_name in self.get_used_symbols(qualified_name)
+                if used_name in self.in_flight
+            ]
+        deadline: float = time.monotonic() + timeout
+        for event in events:
+            if not event.wait(max(deadline - time.monotonic(), 0)):
+                return
+
+    def get_context(self, module_path: str, symbol_names: list[str]) -> str:
+        """Get the signatures and the summaries of the indexed symbols used by some symbols of a module.
+
+        The symbols themselves and their methods are left out."""
+        key: str = self.get_key(module_path)
+        lines: list[str] = []
+        with self.lock:
+            entry: Optional[dict] = self.modules.get(key)
+            if not entry:
+                return ''
+            own_prefixes: tuple[str, ...] = tuple(
+                f"{entry['name']}.{symbol_name}" for symbol_name in symbol_names
+            )
+            for symbol_name in symbol_names:
+                qualified_name: str = f"{entry['name']}.{symbol_name}"
+                if qualified_name not in self.qualified_names:
+                    continue
+                for used_name in self.get_used_symbols(qualified_name):
+                    if len(lines) >= MAX_CONTEXT_SYMBOLS:
+                        break
+                    if used_name in own_prefixes or used_name.startswith(
+                        tuple(f'{prefix}.' for prefix in own_prefixes)
+                    ):
+                        continue
+                    used_key, used_symbol = self.qualified_names[used_name]
+                    signature, summary, _ = self.modules[used_key]['symbols'][
+                        used_symbol
+                    ]
+                    summary = self.summaries.get(used_name) or summary
+                    line: str = f'- {used_name}{signature}'
+                    if summary:
+                        line += f': {summary}'
+                    if line not in lines:
+                        lines.append(line)
+        return '\n'.join(lines)
+
+    def save(self) -> None:
+        """Save the index of the modules that still exist, without the summaries generated by this run."""
+        with self.lock:
+            modules: dict[str, dict] = {
+                key: entry for key, entry in self.modules.items() if os.path.exists(key)
+            }
+        temp_file: str = f'{self.index_file}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'version': 1, 'modules': modules}, f, separators=(',', ':'))
+        os.replace(temp_file, self.index_file)
@@ -1,29 +1,56 @@
-from langchain.prompts import PromptTemplate
-
 from .config import Config
 
+PROMPT_VERSION: str = '1'
+
+
+def add_context(prompt_formatted_str: str, context: str) -> str:
+    """Add the summaries of the project symbols used by the code to a prompt."""
+    if not context:
+        return prompt_formatted_str
+    return f"""{prompt_formatted_str}    The functions and classes of the project it uses, for reference only:
+{context}
+    """
+
 
-def get_function_prompt_template(function_code: str, config: Config) -> str:
+def get_function_prompt_template(
+    function_code: str, config: Config, context: str = ''
+) -> str:
     function_prompt_template: str = """
     Generate python docstring for the given python function using the provided documentation style:
     Function code: {function_code}
     Documentation style: {documentation_style}
     """
-    prompt = PromptTemplate.from_template(template=function_prompt_template)
-    prompt_formatted_str: str = prompt.format(
+    prompt_formatted_str: str = function_prompt_template.format(
         function_code=function_code, documentation_style=config.documentation_style
     )
-    return prompt_formatted_str
+    return add_context(prompt_formatted_str, context)
 
 
-def get_class_prompt_template(class_code: str, config: Config) -> str:
+def get_class_prompt_template(
+    class_code: str, config: Config, context: str = ''
+) -> str:
     function_prompt_template: str = """
     Generate python docstring for the given python class using the provided documentation style:
     Class code: {class_code}
     Documentation style: {documentation_style}
     """
-    prompt = PromptTemplate.from_template(template=function_prompt_template)
-    prompt_formatted_str: str = prompt.format(
+    prompt_formatted_str: str = function_prompt_template.format(
         class_code=class_code, documentation_style=config.documentation_style
     )
-    return prompt_formatted_str
+    return add_context(prompt_formatted_str, context)
+
+
+def get_functions_batch_prompt_template(
+    functions: list[tuple[str, str]], config: Config, context: str = ''
+) -> str:
+    functions_prompt_template: str = """
+    Generate python docstrings for each of the given python functions using the provided documentation style.
+    Reply only with a JSON object that maps every function name to its docstring:
+    Functions code: {functions_code}
+    Documentation style: {documentation_style}
+    """
+    prompt_formatted_str: str = functions_prompt_template.format(
+        functions_code='\n\n'.join(function_code for _, function_code in functions),
+        documentation_style=config.documentation_style,
+    )
+    return add_context(prompt_formatted_str, context)
@@ -0,0 +1,67 @@
+import sys
+from typing import Any, Optional
+
+from .config import Config
+from .metrics import metrics
+
+
+async def record_request(request: Any) -> None:
+    metrics.increment('http_requests')
+    metrics.increment(
+        'http_request_bytes', int(request.headers.get('content-length', 0))
+    )
+
+
+async def record_response(response: Any) -> None:
+    await response.aread()
+    metrics.increment('http_response_bytes', len(response.content))
+
+
+def is_http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client(config: Config) -> Any:
+    """Create the async http client shared by every llm call of the run.
+
+    Its connection pool is bounded and keeps the idle connections alive, so
+    that the concurrent calls reuse a few warm connections instead of paying
+    for a new connection and tls handshake each. Every request gets the
+    connect and read timeouts, and the sizes of the requests and responses
+    are counted in the run metrics. HTTP/2 needs the h2 package, without it
+    the client falls back to HTTP/1.1 keep-alive."""
+    import httpx
+
+    http2: bool = config.http2 and is_http2_available()
+    if config.http2 and not http2:
+        print('HTTP/2 needs the h2 package, using HTTP/1.1.', file=sys.stderr)
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections,
+            keepalive_expiry=config.http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(config.http_timeout, connect=config.http_connect_timeout),
+        event_hooks={'request': [record_request], 'response': [record_response]},
+    )
+
+
+def get_completions_client(
+    config: Config, api_key: Optional[str] = None, base_url: Optional[str] = None
+) -> Any:
+    """Create the async openai completions client on the shared http client.
+
+    The client does not retry, the engine retries the failed calls itself."""
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=get_http_client(config),
+        max_retries=0,
+    ).completions
@@ -0,0 +1,298 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from queue import Queue
+from threading import Lock
+from typing import Callable, Optional
+
+from .config import Config
+from .discovery import ModuleFinder
+from .docstring_generator import DocstringPipeline
+from .engine import LLMEngine
+from .helpers import add_module_to_queue
+from .manifest import RunManifest
+from .metrics import metrics
+from .scheduler import ScheduledQueue
+from .symbol_index import SymbolIndex
+
+IN_MODIFY: int = 0x2
+IN_CLOSE_WRITE: int = 0x8
+IN_MOVED_FROM: int = 0x40
+IN_MOVED_TO: int = 0x80
+IN_CREATE: int = 0x100
+IN_DELETE: int = 0x200
+IN_Q_OVERFLOW: int = 0x4000
+IN_ISDIR: int = 0x40000000
+INOTIFY_MASK: int = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# The modification time and the size of a module.
+ModuleStat = tuple[int, int]
+
+
+def get_module_stat(module_path: str) -> Optional[ModuleStat]:
+    try:
+        stat = os.stat(module_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class InotifyWatcher:
+    """Watch directories for changed files with the linux inotify api, through ctypes."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(
+            ctypes.util.find_library('c') or 'libc.so.6', use_errno=True
+        )
+        self.fd: int = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories: dict[int, str] = {}
+        self.watched: set[str] = set()
+
+    def add_directory(self, directory: str) -> None:
+        if directory in self.watched:
+            return
+        watch_descriptor: int = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), INOTIFY_MASK
+        )
+        if watch_descriptor < 0:
+            raise OSError(
+                ctypes.get_errno(), f'inotify_add_watch failed for {directory}'
+            )
+        self.directories[watch_descriptor] = directory
+        self.watched.add(directory)
+
+    def read(self, timeout: float) -> tuple[set[str], bool]:
+        """Get the files changed within the timeout, and whether the tree has to be scanned again.
+
+        It has to be scanned again when a directory was created, moved or
+        deleted, and when the kernel dropped events."""
+        changed: set[str] = set()
+        rescan: bool = False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed, rescan
+        try:
+            data: bytes = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changed, rescan
+        offset: int = 0
+        while offset < len(data):
+            watch_descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name: str = os.fsdecode(data[offset : offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            directory: Optional[str] = self.directories.get(watch_descriptor)
+            if directory is None or not name:
+                continue
+            if mask & IN_ISDIR:
+                rescan = True
+            elif name.endswith('.py'):
+                changed.add(os.path.join(directory, name))
+        return changed, rescan
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class ModuleWatcher:
+    """Regenerate the docstrings of the modules as they are edited, in a long running process.
+
+    The pipeline, the cache, the llm engine, the manifest and the symbol
+    index are kept from one regeneration to the next. The changes are read
+    from inotify on linux, or by polling the modification times of the
+    modules elsewhere, and a burst of saves is handled once the files have
+    been quiet for the debounce delay.
+
+    Only the symbols whose fingerprint changed since they were processed are
+    regenerated, as in incremental mode. The modification time and size of
+    every module are recorded once it is handled, so that the writes of the
+    watcher itself, and the saves that change nothing, are ignored."""
+
+    def __init__(self, config: Config, pipeline: DocstringPipeline):
+        self.config: Config = config
+        self.pipeline: DocstringPipeline = pipeline
+        self.stats: dict[str, Optional[ModuleStat]] = {}
+        self.poll_stats: dict[str, Optional[ModuleStat]] = {}
+        self.directories: set[str] = set()
+        self.lock: Lock = Lock()
+        self.inotify: Optional[InotifyWatcher] = None
+        if config.watch_backend != 'poll':
+            try:
+                self.inotify = InotifyWatcher()
+            except (AttributeError, OSError):
+                if config.watch_backend == 'inotify':
+                    raise
+                print('inotify is not available, polling the modules.', file=sys.stderr)
+
+    def find_modules(self) -> list[str]:
+        """Find the modules under the configured paths, watching every scanned directory."""
+        module_paths: list[str] = []
+        directories: list[str] = []
+        ModuleFinder(
+            config=self.config,
+            on_module=module_paths.append,
+            on_directory=directories.append,
+        ).find()
+        for root in self.config.path:
+            if os.path.isfile(root):
+                directories.append(os.path.dirname(root) or '.')
+        with self.lock:
+            self.directories.update(directories)
+        if self.inotify:
+            for directory in directories:
+                try:
+                    self.inotify.add_directory(directory)
+                except OSError as e:
+                    metrics.record_failure(directory, None, 'watch', e)
+        return module_paths
+
+    def is_changed(self, module_path: str) -> bool:
+        """Check whether a module was modified since it was last handled."""
+        stat: Optional[ModuleStat] = get_module_stat(module_path)
+        return stat is not None and stat != self.stats.get(module_path)
+
+    def regenerate(self, module_paths: list[str]) -> None:
+        """Run the pipeline on the modules whose content changed, then record their state.
+
+        The state of a written module is the one the manifest recorded right
+        after the write, so that an edit saved meanwhile is not missed."""
+        manifest: RunManifest = self.pipeline.manifest
+        index: Optional[SymbolIndex] = self.pipeline.index
+        if index:
+            index.update(module_paths)
+            module_paths = sorted(module_paths, key=index.get_module_order)
+        queued_stats: dict[str, Optional[ModuleStat]] = {}
+
+        def queue_modules() -> None:
+            for module_path in module_paths:
+                stat: Optional[ModuleStat] = get_module_stat(module_path)
+                try:
+                    if not manifest.is_module_changed(module_path):
+                        self.stats[module_path] = stat
+                        continue
+                except OSError:
+                    continue
+                queued_stats[module_path] = stat
+                add_module_to_queue(module_path, self.pipeline.module_path_queue)
+
+        started_at: float = time.perf_counter()
+        self.pipeline.run(queue_modules)
+        for module_path, stat in queued_stats.items():
+            self.stats[module_path] = (
+                None if self.config.dry_run else manifest.get_module_stat(module_path)
+            ) or stat
+        if metrics.counters['modules_discovered']:
+            print(
+                f"Regenerated {metrics.counters['symbols_done']} symbols of "
+                f"{metrics.counters['modules_discovered']} modules with "
+                f"{metrics.counters['llm_calls']} llm calls in "
+                f'{time.perf_counter() - started_at:.1f}s',
+                file=sys.stderr,
+            )
+
+    def wait_for_changes(self) -> set[str]:
+        """Wait for changed modules, then until they are quiet for the debounce delay."""
+        changed: set[str] = set()
+        rescan: bool = False
+        deadline: Optional[float] = None
+        while True:
+            timeout: float = (
+                self.config.watch_poll_interval
+                if deadline is None
+                else max(deadline - time.monotonic(), 0)
+            )
+            if self.inotify:
+                events, events_rescan = self.inotify.read(timeout)
+            else:
+                events, events_rescan = self.poll(timeout), False
+            rescan = rescan or events_rescan
+            if events or events_rescan:
+                changed |= events
+                deadline = time.monotonic() + self.config.watch_debounce
+            elif deadline is None:
+                return set()
+            if time.monotonic() >= deadline:
+                break
+        if rescan:
+            changed |= set(self.find_modules())
+        return {
+            module_path
+            for module_path in changed
+            if self.is_in_tree(module_path) and self.is_changed(module_path)
+        }
+
+    def poll(self, timeout: float) -> set[str]:
+        """Get the modules created or modified since the last poll, after the timeout."""
+        time.sleep(timeout)
+        changed: set[str] = set()
+        for module_path in self.find_modules():
+            stat: Optional[ModuleStat] = get_module_stat(module_path)
+            if stat != self.poll_stats.get(module_path):
+                self.poll_stats[module_path] = stat
+                changed.add(module_path)
+        return changed
+
+    def is_in_tree(self, module_path: str) -> bool:
+        """Check whether a module is in a scanned directory, or is one of the paths."""
+        with self.lock:
+            return (
+                os.path.dirname(module_path) in self.directories
+                or module_path in self.config.path
+            )
+
+    def watch(self, should_stop: Callable[[], bool] = lambda: False) -> None:
+        """Regenerate every changed module once, then the modules as they change."""
+        self.regenerate(self.find_modules())
+        print('Watching for changes, press Ctrl+C to stop.', file=sys.stderr)
+        while not should_stop():
+            changed: set[str] = self.wait_for_changes()
+            if changed:
+                self.regenerate(sorted(changed))
+
+    def close(self) -> None:
+        if self.inotify:
+            self.inotify.close()
+
+
+def watch_modules(
+    config: Config,
+    module_path_queue: Queue,
+    functions_source_queue: ScheduledQueue,
+    class_source_queue: ScheduledQueue,
+    failed_modules_queue: Queue,
+    module_docstrings_queue: Queue,
+    engine: Optional[LLMEngine] = None,
+    should_stop: Callable[[], bool] = lambda: False,
+) -> None:
+    """Watch the modules and regenerate their docstrings as they change, until interrupted.
+
+    The watcher is always incremental, and it keeps no checkpoint journal."""
+    config = config.model_copy(update={'incremental': True, 'checkpoint': False})
+    pipeline: DocstringPipeline = DocstringPipeline(
+        config,
+        module_path_queue,
+        functions_source_queue,
+        class_source_queue,
+        failed_modules_queue,
+        module_docstrings_queue,
+        engine,
+    )
+    watcher: ModuleWatcher = ModuleWatcher(config, pipeline)
+    try:
+        watcher.watch(should_stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        pipeline.close()
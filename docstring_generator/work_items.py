@@ -0,0 +1,49 @@
+import textwrap
+from typing import Optional
+
+
+class SymbolSpan:
+    """A function, class or method of a module, by the byte offsets of its source code.
+
+    The code of a method is dedented when it is read."""
+
+    __slots__ = ('name', 'start', 'end', 'dedent')
+
+    def __init__(self, name: str, start: int, end: int, dedent: bool = False):
+        self.name: str = name
+        self.start: int = start
+        self.end: int = end
+        self.dedent: bool = dedent
+
+    @property
+    def tokens(self) -> int:
+        """Roughly estimate the number of tokens of the code, as estimate_tokens does."""
+        return (self.end - self.start) // 4 + 1
+
+    def get_code(self, source_bytes: bytes) -> str:
+        code: str = source_bytes[self.start : self.end].decode('utf-8')
+        return textwrap.dedent(code) if self.dedent else code
+
+
+class WorkItem:
+    """A function, a batch of functions or a class queued for the llm.
+
+    It holds the module and the spans of its symbols rather than copies of
+    their source code, which is read from the module when the llm request
+    is built. An item queued again after an incomplete reply is a retry."""
+
+    __slots__ = ('module_path', 'symbols', 'retry')
+
+    def __init__(
+        self, module_path: str, symbols: list[SymbolSpan], retry: bool = False
+    ):
+        self.module_path: str = module_path
+        self.symbols: list[SymbolSpan] = symbols
+        self.retry: bool = retry
+
+    def get_code(self, source_bytes: Optional[bytes] = None) -> list[tuple[str, str]]:
+        """Get the names and the source code of the symbols, reading the module if no source is given."""
+        if source_bytes is None:
+            with open(self.module_path, 'rb') as f:
+                source_bytes = f.read()
+        return [(symbol.name, symbol.get_code(source_bytes)) for symbol in self.symbols]
@@ -0,0 +1,88 @@
+import logging
+import os
+from pathlib import Path
+
+from docstring_generator import providers
+from docstring_generator.cache import get_symbol_keys
+from docstring_generator.config import Config
+from docstring_generator.fake_llm import FakeLLM
+
+INCREMENT: str = 'def increment(x):\n    total = x + 1\n    return total\n'
+RENAMED_LOCALS: str = 'def bump(x):\n    result = x + 2\n    return result\n'
+RENAMED_PARAMETER: str = 'def bump(y):\n    result = y + 2\n    return result\n'
+
+
+def get_group_key(code: str, dedup: str) -> str:
+    return get_symbol_keys('function', code, Config(path={'.'}, dedup=dedup))[1]
+
+
+def test_exact_group_key_is_the_cache_key():
+    cache_key, group_key = get_symbol_keys(
+        'function', INCREMENT, Config(path={'.'}, dedup='exact')
+    )
+    assert cache_key == group_key
+    assert (
+        get_symbol_keys('function', INCREMENT, Config(path={'.'}, dedup='off'))[1]
+        is None
+    )
+
+
+def test_exact_dedup_ignores_docstrings_and_formatting():
+    documented: str = (
+        'def increment(x):\n    """Add one."""\n    total = x + 1  # one\n    return total\n'
+    )
+    assert get_group_key(documented, 'exact') == get_group_key(INCREMENT, 'exact')
+    assert get_group_key(RENAMED_LOCALS, 'exact') != get_group_key(INCREMENT, 'exact')
+
+
+def test_structure_dedup_ignores_local_names_and_literals():
+    assert get_group_key(RENAMED_LOCALS, 'structure') == get_group_key(
+        INCREMENT, 'structure'
+    )
+
+
+def test_structure_dedup_keeps_parameter_names():
+    assert get_group_key(RENAMED_PARAMETER, 'structure') != get_group_key(
+        RENAMED_LOCALS, 'structure'
+    )
+
+
+def test_renamed_parameters_get_their_own_docstring(
+    tmp_path, make_config, run_pipeline, monkeypatch
+):
+    # A slow llm keeps the first call in flight while its duplicate joins it.
+    monkeypatch.setitem(
+        providers.LLM_PROVIDERS, 'fake', lambda config: FakeLLM(latency=0.2)
+    )
+    module_path: Path = tmp_path / 'src' / 'module.py'
+    module_path.parent.mkdir()
+    module_path.write_text(
+        '\n\n'.join(
+            [INCREMENT, RENAMED_LOCALS, RENAMED_PARAMETER.replace('bump', 'other')]
+        )
+    )
+    counters: dict = run_pipeline(make_config(dedup='structure', use_cache=False))
+    assert counters['llm_calls'] == 2
+    assert counters['symbols_deduplicated'] == 1
+
+
+def test_default_cache_is_in_the_user_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'cache'))
+    cache_file: str = Config(path={'.'}).cache_file
+    assert cache_file.startswith(str(tmp_path / 'cache'))
+
+
+def test_cache_stats_are_logged(
+    tmp_path, make_config, run_pipeline, caplog, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    module_path: Path = tmp_path / 'src' / 'module.py'
+    module_path.parent.mkdir()
+    module_path.write_text(INCREMENT)
+    cache_file: Path = tmp_path / 'cache' / 'docstrings.sqlite'
+    with caplog.at_level(logging.INFO, logger='docstring_generator'):
+        run_pipeline(make_config(cache_file=str(cache_file), checkpoint=False))
+    assert 'Docstring cache: 0 hits, 1 misses' in caplog.text
+    assert cache_file.exists()
+    assert sorted(os.listdir(tmp_path)) == ['cache', 'src']
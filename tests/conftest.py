@@ -0,0 +1,42 @@
+from pathlib import Path
+from queue import Queue
+from typing import Callable
+
+import pytest
+
+from docstring_generator.config import Config
+from docstring_generator.docstring_generator import generate_docstrings
+from docstring_generator.metrics import metrics
+from docstring_generator.scheduler import ScheduledQueue
+
+
+@pytest.fixture
+def make_config(tmp_path: Path) -> Callable[..., Config]:
+    """Make the config of a run with the fake llm, keeping its state files in the temporary directory."""
+
+    def make(**kwargs) -> Config:
+        settings: dict = {
+            'path': {str(tmp_path / 'src')},
+            'llm_provider': 'fake',
+            'cache_file': str(tmp_path / 'cache.sqlite'),
+            'checkpoint_file': str(tmp_path / 'journal.jsonl'),
+            'manifest_file': str(tmp_path / 'manifest.json'),
+            'index_file': str(tmp_path / 'index.json'),
+            **kwargs,
+        }
+        return Config(**settings)
+
+    return make
+
+
+@pytest.fixture
+def run_pipeline() -> Callable[[Config], dict]:
+    """Run the pipeline on the configured paths, and get the counters of the run."""
+
+    def run(config: Config) -> dict:
+        generate_docstrings(
+            config, Queue(), ScheduledQueue(), ScheduledQueue(), Queue(), Queue()
+        )
+        return dict(metrics.counters)
+
+    return run
@@ -0,0 +1,173 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from docstring_generator.config import Config
+from docstring_generator.discovery import ModuleFinder, get_unique_roots
+
+
+def make_tree(root: Path, files: dict[str, str]) -> None:
+    for name, content in files.items():
+        path: Path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def find_modules(root: Path, *paths: Path, **kwargs) -> list[str]:
+    """Find the modules under the paths, relative to the root and sorted."""
+    modules: list[str] = []
+    config: Config = Config(
+        path={str(path) for path in paths or [root]}, directories_ignore=set(), **kwargs
+    )
+    ModuleFinder(config=config, on_module=modules.append).find()
+    return sorted(Path(os.path.relpath(module, root)).as_posix() for module in modules)
+
+
+def test_negated_pattern_keeps_a_file(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            '.gitignore': 'gen_*.py\n!gen_keep.py\n',
+            'gen_models.py': '',
+            'gen_keep.py': '',
+            'main.py': '',
+        },
+    )
+    assert find_modules(tmp_path) == ['gen_keep.py', 'main.py']
+
+
+def test_negated_pattern_in_a_nested_gitignore(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            '.gitignore': '*_pb2.py\n',
+            'api/.gitignore': '!service_pb2.py\n',
+            'api/service_pb2.py': '',
+            'api/types_pb2.py': '',
+            'types_pb2.py': '',
+        },
+    )
+    assert find_modules(tmp_path) == ['api/service_pb2.py']
+
+
+def test_file_in_an_ignored_directory_can_not_be_kept(tmp_path):
+    make_tree(
+        tmp_path,
+        {'.gitignore': 'generated/\n!generated/keep.py\n', 'generated/keep.py': ''},
+    )
+    assert find_modules(tmp_path) == []
+
+
+def test_directory_only_pattern_skips_directories_only(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            '.gitignore': 'cache/\nout.py/\n',
+            'cache/module.py': '',
+            'pkg/cache/module.py': '',
+            'pkg/out.py': '',
+        },
+    )
+    assert find_modules(tmp_path) == ['pkg/out.py']
+
+
+def test_anchored_patterns_match_from_the_gitignore_directory(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            '.gitignore': '/setup.py\nscripts/*.py\n',
+            'setup.py': '',
+            'pkg/setup.py': '',
+            'scripts/run.py': '',
+            'scripts/tools/run.py': '',
+            'pkg/scripts/run.py': '',
+            'pkg/.gitignore': '/local.py\n',
+            'pkg/local.py': '',
+            'local.py': '',
+        },
+    )
+    assert find_modules(tmp_path) == [
+        'local.py',
+        'pkg/scripts/run.py',
+        'pkg/setup.py',
+        'scripts/tools/run.py',
+    ]
+
+
+def test_double_star_patterns(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            '.gitignore': '**/migrations\nlegacy/**/old_*.py\n',
+            'app/migrations/0001.py': '',
+            'migrations/0001.py': '',
+            'legacy/old_api.py': '',
+            'legacy/v1/deep/old_api.py': '',
+            'legacy/v1/new_api.py': '',
+        },
+    )
+    assert find_modules(tmp_path) == ['legacy/v1/new_api.py']
+
+
+def test_parent_gitignore_applies_to_a_nested_root(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            '.gitignore': 'src/vendor/\n',
+            'src/app.py': '',
+            'src/vendor/lib.py': '',
+        },
+    )
+    (tmp_path / '.git').mkdir()
+    assert find_modules(tmp_path, tmp_path / 'src') == ['src/app.py']
+    assert find_modules(tmp_path, tmp_path / 'src', respect_gitignore=False) == [
+        'src/app.py',
+        'src/vendor/lib.py',
+    ]
+
+
+@pytest.mark.skipif(
+    not hasattr(os, 'symlink'), reason='symbolic links are not supported'
+)
+def test_symlinked_directories_are_followed_once(tmp_path):
+    make_tree(tmp_path, {'pkg/module.py': '', 'pkg/sub/inner.py': ''})
+    os.symlink(tmp_path / 'pkg', tmp_path / 'alias')
+    os.symlink(tmp_path / 'pkg', tmp_path / 'pkg' / 'sub' / 'cycle')
+    modules: list[str] = find_modules(tmp_path)
+    assert len(modules) == 2
+    assert {Path(module).name for module in modules} == {'module.py', 'inner.py'}
+
+
+@pytest.mark.skipif(
+    not hasattr(os, 'symlink'), reason='symbolic links are not supported'
+)
+def test_ignored_symlinked_directory_is_skipped(tmp_path):
+    make_tree(tmp_path, {'.gitignore': 'linked/\n', 'real/module.py': ''})
+    os.symlink(tmp_path / 'real', tmp_path / 'linked')
+    assert find_modules(tmp_path) == ['real/module.py']
+
+
+def test_overlapping_roots_are_scanned_once(tmp_path):
+    make_tree(tmp_path, {'pkg/module.py': '', 'pkg/sub/inner.py': '', 'other.py': ''})
+    roots: set[Path] = {
+        tmp_path,
+        tmp_path / 'pkg',
+        tmp_path / 'pkg' / 'sub',
+        tmp_path / 'pkg' / 'module.py',
+        tmp_path / 'pkg' / '..' / 'pkg',
+    }
+    assert get_unique_roots({str(root) for root in roots}) == [str(tmp_path)]
+    assert find_modules(tmp_path, *roots) == [
+        'other.py',
+        'pkg/module.py',
+        'pkg/sub/inner.py',
+    ]
+
+
+def test_sibling_roots_are_all_scanned(tmp_path):
+    make_tree(tmp_path, {'a/module.py': '', 'ab/module.py': ''})
+    assert find_modules(tmp_path, tmp_path / 'a', tmp_path / 'ab') == [
+        'a/module.py',
+        'ab/module.py',
+    ]
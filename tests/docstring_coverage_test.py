@@ -0,0 +1,208 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from docstring_generator.config import Config
+from docstring_generator.docstring_coverage import (
+    SARIF_RULES,
+    get_coverage_report,
+    get_documented_parameters,
+    get_sarif_report,
+    report_coverage,
+    scan_module,
+)
+
+SOURCE: str = '''def documented(a, b):
+    """Add.
+
+    Args:
+        a: The first number.
+        b (int): The second number.
+    """
+
+
+def missing(a):
+    return a
+
+
+def stale(a, c):
+    """Do something.
+
+    Args:
+        a: A value.
+        b: A removed value.
+    """
+
+
+async def missing_async():
+    pass
+
+
+def summary_only(x):
+    """Only a summary, documenting no parameters."""
+
+
+def numpy_style(a, *args, **kwargs):
+    """Do something.
+
+    Parameters
+    ----------
+    a : int
+        A value.
+    *args, **kwargs
+        The rest.
+    """
+
+
+def outer():
+    """Outer."""
+
+    def inner():
+        pass
+
+
+class Documented:
+    """Documented."""
+
+    def method(self, value):
+        """Set.
+
+        :param value: The value.
+        """
+
+    def missing_method(self):
+        pass
+
+    class Inner:
+        pass
+
+
+class Missing:
+    pass
+'''
+DOCUMENTED_SOURCE: str = 'def f(a):\n    """F.\n\n    Args:\n        a: A.\n    """\n'
+
+
+@pytest.fixture
+def checkout(tmp_path, monkeypatch) -> Path:
+    """A checkout with a module of every kind of symbol and a broken module, the working directory."""
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'module.py').write_text(SOURCE)
+    (tmp_path / 'src' / 'broken.py').write_text('def broken(:\n')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def get_config(**kwargs) -> Config:
+    return Config(path={'src'}, report_only=True, processes=1, **kwargs)
+
+
+def test_documented_parameters_of_every_style():
+    assert get_documented_parameters('Add.\n\nArgs:\n    a: A.\n    b (int): B.\n') == {
+        'a',
+        'b',
+    }
+    assert get_documented_parameters(':param a: A.\n:param int b: B.') == {'a', 'b'}
+    assert get_documented_parameters(
+        'Add.\n\nParameters\n----------\na, b : int\n    A.\n'
+    ) == {
+        'a',
+        'b',
+    }
+    assert get_documented_parameters('Add two numbers.') is None
+
+
+def test_scan_module_skips_the_nested_symbols(checkout):
+    result: dict = scan_module('src/module.py')
+    assert result['symbols'] == 11
+    assert result['error'] is None
+    assert 'outer.inner' not in {issue['symbol'] for issue in result['issues']}
+    assert 'Documented.Inner' not in {issue['symbol'] for issue in result['issues']}
+    broken: dict = scan_module('src/broken.py')
+    assert broken['symbols'] == 0
+    assert broken['error'].startswith('SyntaxError')
+
+
+def test_coverage_counts(checkout):
+    report: dict = get_coverage_report(get_config())
+    assert report['summary'] == {
+        'modules': 2,
+        'symbols': 11,
+        'documented': 7,
+        'missing': 4,
+        'stale': 1,
+        'coverage': 54.55,
+    }
+    assert [
+        (issue['symbol'], issue['kind'], issue['issue']) for issue in report['issues']
+    ] == [
+        ('missing', 'function', 'missing-docstring'),
+        ('stale', 'function', 'stale-docstring'),
+        ('missing_async', 'async function', 'missing-docstring'),
+        ('Documented.missing_method', 'method', 'missing-docstring'),
+        ('Missing', 'class', 'missing-docstring'),
+    ]
+    stale: dict = report['issues'][1]
+    assert stale['undocumented_parameters'] == ['c']
+    assert stale['unknown_parameters'] == ['b']
+    assert stale['line'] == 14
+    assert [error['path'] for error in report['errors']] == [str(Path('src/broken.py'))]
+
+
+def test_sarif_report(checkout):
+    sarif: dict = get_sarif_report(get_coverage_report(get_config()))
+    assert sarif['$schema'] == 'https://json.schemastore.org/sarif-2.1.0.json'
+    assert sarif['version'] == '2.1.0'
+    assert len(sarif['runs']) == 1
+    driver: dict = sarif['runs'][0]['tool']['driver']
+    assert driver['name'] == 'docstring-generator'
+    assert [rule['id'] for rule in driver['rules']] == list(SARIF_RULES)
+    assert all(rule['shortDescription']['text'] for rule in driver['rules'])
+    results: list[dict] = sarif['runs'][0]['results']
+    assert len(results) == 5
+    for result in results:
+        assert result['ruleId'] in SARIF_RULES
+        assert result['level'] == 'warning'
+        assert result['message']['text']
+        location: dict = result['locations'][0]['physicalLocation']
+        assert location['artifactLocation']['uri'] == 'src/module.py'
+        assert location['region']['startLine'] >= 1
+    assert results[1]['message']['text'] == (
+        'The docstring of the function stale does not match its signature: '
+        'undocumented c; unknown b'
+    )
+    assert results[1]['locations'][0]['physicalLocation']['region']['startLine'] == 14
+
+
+def test_sarif_uri_of_an_absolute_path(checkout):
+    config: Config = Config(path={str(checkout / 'src')}, report_only=True, processes=1)
+    sarif: dict = get_sarif_report(get_coverage_report(config))
+    uri: str = sarif['runs'][0]['results'][0]['locations'][0]['physicalLocation'][
+        'artifactLocation'
+    ]['uri']
+    assert uri == (checkout / 'src' / 'module.py').as_uri()
+
+
+@pytest.mark.parametrize(
+    'fail_under, exit_code', [(100.0, 1), (54.56, 1), (54.55, 0), (0.0, 0)]
+)
+def test_exit_code_of_fail_under(checkout, fail_under, exit_code):
+    report_file: Path = checkout / 'report.sarif'
+    config: Config = get_config(
+        coverage_fail_under=fail_under,
+        report_format='sarif',
+        report_file=str(report_file),
+    )
+    assert report_coverage(config) == exit_code
+    assert json.loads(report_file.read_text())['version'] == '2.1.0'
+
+
+def test_fully_documented_modules_pass(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'module.py').write_text(DOCUMENTED_SOURCE)
+    monkeypatch.chdir(tmp_path)
+    assert report_coverage(get_config()) == 0
+    report: dict = json.loads(capsys.readouterr().out)
+    assert report['summary']['coverage'] == 100.0
+    assert report['issues'] == []
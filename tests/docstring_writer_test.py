@@ -0,0 +1,126 @@
+import ast
+
+import pytest
+
+from docstring_generator.collector import ModuleDocstrings
+from docstring_generator.config import Config
+from docstring_generator.docstring_writer import DocstringSplicer
+from docstring_generator.parsed_module import ParsedModule
+
+
+def splice(source: str, **docstrings) -> str:
+    """Splice the docstrings of the functions, classes and methods into a module source."""
+    parsed_module: ParsedModule = ParsedModule('module.py', source.encode('utf-8'))
+    module_docstrings: ModuleDocstrings = ModuleDocstrings(
+        module_path='module.py', parsed_module=parsed_module, **docstrings
+    )
+    spliced: str = DocstringSplicer(Config(path={'.'})).write(module_docstrings)
+    ast.parse(spliced)
+    return spliced
+
+
+def test_one_liner_gets_an_inline_docstring():
+    source: str = 'def f(a): return a\n'
+    spliced: str = splice(source, function_docstrings={'f': 'Doc.'})
+    assert spliced == 'def f(a): """Doc."""; return a\n'
+
+
+def test_one_liner_docstring_is_replaced():
+    source: str = 'def f(a): """Old."""; return a\n'
+    spliced: str = splice(source, function_docstrings={'f': 'New.'})
+    assert spliced == 'def f(a): """New."""; return a\n'
+
+
+def test_existing_docstring_is_replaced_in_place():
+    source: str = (
+        'def f(a):  # keep\n'
+        '    """Old\n'
+        '\n'
+        '    summary."""\n'
+        '    return a  # keep too\n'
+    )
+    spliced: str = splice(
+        source, function_docstrings={'f': 'New.\n\nArgs:\n    a: A value.'}
+    )
+    assert spliced == (
+        'def f(a):  # keep\n'
+        '    """New.\n'
+        '\n'
+        '    Args:\n'
+        '        a: A value.\n'
+        '    """\n'
+        '    return a  # keep too\n'
+    )
+
+
+@pytest.mark.parametrize(
+    'gap',
+    ['    # A comment.\n', '\n', '\n    # A comment.\n\n'],
+    ids=['comment', 'blank', 'both'],
+)
+def test_docstring_is_inserted_above_comments_and_blank_lines(gap):
+    source: str = f'def f(a):\n{gap}    return a\n'
+    spliced: str = splice(source, function_docstrings={'f': 'Doc.'})
+    assert spliced == f'def f(a):\n    """Doc."""\n{gap}    return a\n'
+
+
+def test_class_docstring_is_inserted_above_a_decorated_method():
+    source: str = 'class A:\n    @property\n    def value(self):\n        return 1\n'
+    spliced: str = splice(
+        source,
+        class_docstrings={'A': 'Class.'},
+        methods_docstrings={'A': {'value': 'Value.'}},
+    )
+    assert spliced == (
+        'class A:\n'
+        '    """Class."""\n'
+        '    @property\n'
+        '    def value(self):\n'
+        '        """Value."""\n'
+        '        return 1\n'
+    )
+
+
+def test_crlf_line_endings_are_kept():
+    source: str = (
+        'def f(a):\r\n    # A comment.\r\n    return a\r\n\r\n\r\ndef g():\r\n    """Old."""\r\n    pass\r\n'
+    )
+    spliced: str = splice(
+        source, function_docstrings={'f': 'Doc.\n\nMore.', 'g': 'New.'}
+    )
+    assert spliced == (
+        'def f(a):\r\n'
+        '    """Doc.\r\n'
+        '\r\n'
+        '    More.\r\n'
+        '    """\r\n'
+        '    # A comment.\r\n'
+        '    return a\r\n'
+        '\r\n'
+        '\r\n'
+        'def g():\r\n'
+        '    """New."""\r\n'
+        '    pass\r\n'
+    )
+
+
+def test_non_ascii_sources_are_spliced_at_byte_offsets():
+    source: str = (
+        "def é(ü='ö'): return ü\n"
+        '\n'
+        '\n'
+        'def g():\n'
+        '    """Ältere."""\n'
+        "    return 'ß'\n"
+    )
+    spliced: str = splice(
+        source, function_docstrings={'é': 'Gibt ü zurück.', 'g': 'Neuer.'}
+    )
+    assert spliced == (
+        "def é(ü='ö'): \"\"\"Gibt ü zurück.\"\"\"; return ü\n"
+        '\n'
+        '\n'
+        'def g():\n'
+        '    """Neuer."""\n'
+        "    return 'ß'\n"
+    )
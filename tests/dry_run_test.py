@@ -0,0 +1,59 @@
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+SOURCE: str = '''def add(a, b):
+    return a + b
+
+
+def subtract(a, b):
+    return a - b
+'''
+
+
+def get_tree(root: Path) -> dict[str, bytes]:
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in sorted(root.rglob('*'))
+        if path.is_file()
+    }
+
+
+def make_read_only(root: Path) -> None:
+    for path in [root, *root.rglob('*')]:
+        mode: int = stat.S_IRUSR | stat.S_IXUSR if path.is_dir() else stat.S_IRUSR
+        os.chmod(path, mode)
+
+
+def make_writable(root: Path) -> None:
+    for path in [root, *root.rglob('*')]:
+        os.chmod(path, stat.S_IRWXU)
+
+
+@pytest.mark.parametrize('existing_cache', [True, False])
+def test_dry_run_writes_nothing(
+    tmp_path, make_config, run_pipeline, capsys, existing_cache
+):
+    module_path: Path = tmp_path / 'src' / 'module.py'
+    module_path.parent.mkdir()
+    module_path.write_text(SOURCE)
+    if existing_cache:
+        run_pipeline(make_config(context_index=True, incremental=True))
+        module_path.write_text(SOURCE)
+    tree: dict[str, bytes] = get_tree(tmp_path)
+    config = make_config(dry_run=True, context_index=True, incremental=True)
+
+    make_read_only(tmp_path)
+    try:
+        counters: dict = run_pipeline(config)
+    finally:
+        make_writable(tmp_path)
+
+    assert get_tree(tmp_path) == tree
+    assert '+    """' in capsys.readouterr().out
+    if existing_cache:
+        assert not counters.get('llm_calls')
+    else:
+        assert counters['llm_calls']
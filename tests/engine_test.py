@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from docstring_generator.config import Config
+from docstring_generator import providers
+from docstring_generator.engine import LLMEngine, TokenBucket, is_retryable
+from docstring_generator.fake_llm import FakeLLM
+from docstring_generator.metrics import metrics
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f'status {status_code}')
+        self.status_code: int = status_code
+
+
+class FlakyLLM(FakeLLM):
+    """A fake llm that fails with the injected errors before replying."""
+
+    def __init__(self, errors: list[Exception], latency: float = 0.0):
+        super().__init__(latency)
+        self.errors: list[Exception] = list(errors)
+        self.attempts: int = 0
+
+    async def ainvoke(self, prompt: str) -> str:
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return await super().ainvoke(prompt)
+
+
+class ConcurrencyLLM(FakeLLM):
+    """A fake llm that records the largest number of calls running at once."""
+
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.running: int = 0
+        self.max_running: int = 0
+
+    async def ainvoke(self, prompt: str) -> str:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            return await super().ainvoke(prompt)
+        finally:
+            self.running -= 1
+
+
+def get_config(**kwargs) -> Config:
+    return Config(path={'.'}, retry_backoff=0.001, retry_max_backoff=0.001, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def run_engine(llm, config: Config, prompts: list[str]) -> list[str]:
+    engine: LLMEngine = LLMEngine(llm=llm, config=config)
+    try:
+        futures = [engine.submit(prompt) for prompt in prompts]
+        return [future.result(timeout=10) for future in futures]
+    finally:
+        engine.stop()
+
+
+def test_concurrent_calls_are_bounded():
+    llm: ConcurrencyLLM = ConcurrencyLLM(latency=0.05)
+    replies = run_engine(
+        llm, get_config(max_concurrency=2), [f'def f{i}(): pass' for i in range(8)]
+    )
+    assert len(replies) == 8
+    assert llm.max_running == 2
+
+
+@pytest.mark.parametrize('status_code', [429, 500, 503])
+def test_rate_limited_and_server_errors_are_retried(status_code):
+    llm: FlakyLLM = FlakyLLM([StatusError(status_code), StatusError(status_code)])
+    replies = run_engine(llm, get_config(max_retries=2), ['def f(): pass'])
+    assert 'Summary of f.' in replies[0]
+    assert llm.attempts == 3
+    assert metrics.counters['llm_retries'] == 2
+
+
+def test_retries_give_up_after_max_retries():
+    llm: FlakyLLM = FlakyLLM([StatusError(429)] * 3)
+    with pytest.raises(StatusError):
+        run_engine(llm, get_config(max_retries=2), ['def f(): pass'])
+    assert llm.attempts == 3
+
+
+def test_client_errors_are_not_retried():
+    llm: FlakyLLM = FlakyLLM([StatusError(400)])
+    with pytest.raises(StatusError):
+        run_engine(llm, get_config(max_retries=5), ['def f(): pass'])
+    assert llm.attempts == 1
+    assert not metrics.counters['llm_retries']
+
+
+def test_timeouts_and_connection_errors_are_retryable():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(StatusError(408))
+    assert not is_retryable(StatusError(404))
+    assert not is_retryable(ValueError())
+
+
+def test_token_bucket_waits_once_empty():
+    async def acquire() -> tuple[float, float]:
+        bucket: TokenBucket = TokenBucket(capacity_per_minute=600)
+        started_at: float = time.perf_counter()
+        await bucket.acquire(600)
+        drained_at: float = time.perf_counter()
+        await bucket.acquire(2)
+        return drained_at - started_at, time.perf_counter() - drained_at
+
+    drain_time, wait_time = asyncio.run(acquire())
+    assert drain_time < 0.05
+    # 10 tokens are added every second.
+    assert 0.15 <= wait_time < 0.5
+
+
+def test_requests_per_minute_throttles_the_calls():
+    started_at: float = time.perf_counter()
+    run_engine(
+        FakeLLM(),
+        get_config(requests_per_minute=600),
+        [f'def f{i}(): pass' for i in range(603)],
+    )
+    # The first 600 requests drain the bucket, the next 3 wait for 0.1s each.
+    assert time.perf_counter() - started_at >= 0.25
+
+
+def test_failing_provider_holds_no_slot(monkeypatch):
+    def get_broken_llm(config: Config):
+        raise ImportError('the client library is not installed')
+
+    monkeypatch.setitem(providers.LLM_PROVIDERS, 'fake', get_broken_llm)
+    engine: LLMEngine = LLMEngine(
+        llm=None, config=get_config(max_concurrency=1, llm_provider='fake')
+    )
+    for _ in range(5):
+        with pytest.raises(ImportError):
+            engine.submit('def f(): pass')
+    assert engine.reserved_tokens == 0
+    monkeypatch.setitem(providers.LLM_PROVIDERS, 'fake', lambda config: FakeLLM())
+    try:
+        assert 'Summary of f.' in engine.submit('def f(): pass').result(timeout=10)
+    finally:
+        engine.stop()
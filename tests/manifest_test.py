@@ -0,0 +1,61 @@
+import ast
+from pathlib import Path
+
+from docstring_generator.manifest import RunManifest, get_symbol_fingerprint
+
+SOURCE: str = '''def add(a, b):
+    return a + b
+
+
+class Counter:
+    def increment(self, step):
+        return step + 1
+'''
+
+
+def get_docstrings(module_path: Path) -> dict[str, str]:
+    tree: ast.Module = ast.parse(module_path.read_text())
+    return {
+        node.name: ast.get_docstring(node)
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef))
+    }
+
+
+def test_fingerprint_ignores_formatting_but_not_docstrings():
+    fingerprint: str = get_symbol_fingerprint('def f(a):\n    return a\n')
+    assert (
+        get_symbol_fingerprint('def f(a):  # comment\n\n    return (a)\n')
+        == fingerprint
+    )
+    assert (
+        get_symbol_fingerprint('def f(a):\n    """Doc."""\n    return a\n')
+        != fingerprint
+    )
+
+
+def test_unchanged_module_is_skipped(tmp_path, make_config, run_pipeline):
+    module_path: Path = tmp_path / 'src' / 'module.py'
+    module_path.parent.mkdir()
+    module_path.write_text(SOURCE)
+    config = make_config(incremental=True, use_cache=False)
+    assert run_pipeline(config)['llm_calls']
+    counters: dict = run_pipeline(config)
+    assert not counters.get('llm_calls')
+    assert not counters.get('symbols_queued')
+
+
+def test_removed_docstrings_are_generated_again(tmp_path, make_config, run_pipeline):
+    module_path: Path = tmp_path / 'src' / 'module.py'
+    module_path.parent.mkdir()
+    module_path.write_text(SOURCE)
+    config = make_config(incremental=True, use_cache=False)
+    run_pipeline(config)
+    assert all(get_docstrings(module_path).values())
+
+    module_path.write_text(SOURCE)
+    counters: dict = run_pipeline(config)
+    assert counters['symbols_queued'] == 2
+    assert all(get_docstrings(module_path).values())
+    manifest: RunManifest = RunManifest(config.manifest_file)
+    assert not manifest.is_module_changed(str(module_path))
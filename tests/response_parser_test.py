@@ -0,0 +1,122 @@
+import pytest
+
+from docstring_generator.helpers import (
+    get_functions_batch_docstrings,
+    get_symbol_docstring,
+)
+from docstring_generator.response_parser import (
+    extract_code,
+    get_plain_docstring,
+    matches_style,
+    parse_code,
+    parse_reply_docstrings,
+)
+
+CLASS_REPLY: str = '''class Counter:
+    """Count things."""
+
+    def increment(self, step):
+        """Add a step."""
+        return step + 1
+'''
+
+
+def test_fenced_reply_with_prose_keeps_only_the_code():
+    reply: str = (
+        f'Here is the documented code:\n\n```python\n{CLASS_REPLY}```\n\nLet me know if it helps!'
+    )
+    assert extract_code(reply) == CLASS_REPLY.strip()
+    assert parse_reply_docstrings(reply) == {
+        'Counter': 'Count things.',
+        'Counter.increment': 'Add a step.',
+    }
+
+
+def test_unfenced_reply_drops_the_prose_before_the_code():
+    reply: str = f'Sure! The docstrings are below.\n{CLASS_REPLY}'
+    assert parse_reply_docstrings(reply)['Counter'] == 'Count things.'
+
+
+def test_several_fences_are_joined_and_dedented():
+    reply: str = (
+        '```py\n    def add(a, b):\n        """Add."""\n        return a + b\n```\n'
+        'and\n'
+        '```\ndef sub(a, b):\n    """Subtract."""\n    return a - b\n```'
+    )
+    assert parse_reply_docstrings(reply) == {'add': 'Add.', 'sub': 'Subtract.'}
+
+
+def test_truncated_reply_keeps_the_symbols_before_the_truncation():
+    reply: str = (
+        '```python\ndef add(a, b):\n    """Add."""\n    return a + b\n\n\n'
+        'def sub(a, b):\n    """Subtract a from\n    b and'
+    )
+    assert parse_reply_docstrings(reply) == {
+        'add': 'Add.',
+        'sub': 'Subtract a from\nb and',
+    }
+
+
+def test_reply_truncated_in_the_body_keeps_its_docstring():
+    reply: str = 'def add(a, b):\n    """Add."""\n    return (a +'
+    assert parse_reply_docstrings(reply) == {'add': 'Add.'}
+
+
+def test_unparsable_reply_has_no_docstrings():
+    assert parse_code('def (:\n' * 30) is None
+    assert parse_reply_docstrings('I can not document this code.') == {}
+
+
+@pytest.mark.parametrize(
+    'reply, docstring',
+    [
+        ('"""Add two numbers."""', 'Add two numbers.'),
+        (
+            'The docstring is:\n\n"""\n    Add two numbers.\n"""\nHope it helps.',
+            'Add two numbers.',
+        ),
+        ("'''Add two numbers.'''", 'Add two numbers.'),
+        ('```\nAdd two numbers.\n```', 'Add two numbers.'),
+        ('"""Add two numbers, truncated', 'Add two numbers, truncated'),
+        ('I am sorry, I can not help with that.', None),
+    ],
+)
+def test_plain_docstring_reply(reply, docstring):
+    assert get_plain_docstring(reply) == docstring
+
+
+def test_symbol_docstring_is_looked_up_by_name_then_first_symbol():
+    reply: str = 'def helper():\n    """Help."""\n\n\ndef add(a, b):\n    """Add."""\n'
+    assert get_symbol_docstring(reply, 'add') == 'Add.'
+    assert get_symbol_docstring(reply, 'renamed') == 'Help.'
+    assert get_symbol_docstring('Just prose.', 'add') is None
+
+
+def test_batch_json_reply_with_extra_prose():
+    reply: str = (
+        'Here are the docstrings:\n```json\n'
+        '{"add": "Add.", "sub": "  Subtract.  ", "unknown": "Ignored.", "mul": 3}\n'
+        '```\nDone.'
+    )
+    assert get_functions_batch_docstrings(reply, {'add', 'sub', 'mul'}) == {
+        'add': 'Add.',
+        'sub': 'Subtract.',
+    }
+
+
+def test_batch_malformed_json_reply_falls_back_to_the_code():
+    reply: str = (
+        '{"add": "Add.", "sub": \n```python\ndef sub(a, b):\n    """Subtract."""\n```'
+    )
+    assert get_functions_batch_docstrings(reply, {'add', 'sub'}) == {'sub': 'Subtract.'}
+    assert get_functions_batch_docstrings('{"add": "Add.",', {'add'}) == {}
+
+
+def test_style_sections_must_match_the_documentation_style():
+    google: str = 'Add.\n\nArgs:\n    a: A number.\n'
+    numpy: str = 'Add.\n\nParameters\n----------\na : int\n'
+    assert matches_style(google, 'Google-Style')
+    assert not matches_style(google, 'Numpy-Style')
+    assert matches_style(numpy, 'Numpy-Style')
+    assert not matches_style(':param a: A number.', 'Google-Style')
+    assert matches_style('Add two numbers.', 'Sphinx-Style')
@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from docstring_generator.config import Config
+from docstring_generator.merge import merge_shard_results
+from docstring_generator.shard import is_in_shard, parse_shard
+
+MODULES: int = 24
+SHARDS: int = 3
+
+
+def make_source(index: int) -> str:
+    return (
+        f'def scale_{index}(value):\n'
+        f'    return value * {index}\n'
+        '\n'
+        '\n'
+        f'class Counter{index}:\n'
+        f'    def increment(self, step):\n'
+        f'        return step + {index}\n'
+    )
+
+
+def make_checkout(checkout_dir: Path) -> None:
+    for index in range(MODULES):
+        module_path: Path = checkout_dir / 'src' / f'module_{index}.py'
+        module_path.parent.mkdir(parents=True, exist_ok=True)
+        module_path.write_text(make_source(index))
+
+
+def get_config(checkout_dir: Path, name: str, **kwargs) -> Config:
+    """Get the config of a run on the relative src path of a checkout, the working directory."""
+    return Config(
+        path={'src'},
+        llm_provider='fake',
+        incremental=True,
+        checkpoint=False,
+        cache_file=str(checkout_dir / f'cache-{name}.sqlite'),
+        manifest_file=str(checkout_dir / f'manifest-{name}.json'),
+        report_file=str(checkout_dir / f'report-{name}.json'),
+        **kwargs,
+    )
+
+
+def get_cache_entries(cache_file: str) -> set[tuple[str, str]]:
+    connection: sqlite3.Connection = sqlite3.connect(cache_file)
+    try:
+        return set(connection.execute('SELECT key, value FROM docstrings'))
+    finally:
+        connection.close()
+
+
+def get_manifest_entries(manifest_file: str) -> dict[str, tuple]:
+    """Get the hash, size and symbols of every module, the modification times differ by checkout."""
+    with open(manifest_file, 'r') as f:
+        files: dict[str, dict] = json.load(f)['files']
+    return {
+        module_path: (entry['hash'], entry['size'], entry['symbols'])
+        for module_path, entry in files.items()
+    }
+
+
+def get_sources(checkout_dir: Path) -> dict[str, str]:
+    return {path.name: path.read_text() for path in (checkout_dir / 'src').iterdir()}
+
+
+def test_parse_shard():
+    assert parse_shard('2/4') == (2, 4)
+    for shard in ('0/4', '5/4', '1/0', '1', 'a/b'):
+        with pytest.raises(ValueError):
+            parse_shard(shard)
+
+
+@pytest.mark.parametrize('shard_count', [1, 2, 3, 7])
+def test_shards_partition_the_modules(shard_count):
+    module_paths: list[str] = [f'src/pkg_{i % 5}/module_{i}.py' for i in range(500)]
+    shards: list[set[str]] = [
+        {path for path in module_paths if is_in_shard(path, shard_index, shard_count)}
+        for shard_index in range(1, shard_count + 1)
+    ]
+    assert sum(len(shard) for shard in shards) == len(module_paths)
+    assert set().union(*shards) == set(module_paths)
+    if shard_count > 1:
+        assert all(shards)
+
+
+def test_shard_ignores_the_path_spelling():
+    for shard_index in range(1, 5):
+        assert is_in_shard('./src/a.py', shard_index, 4) == is_in_shard(
+            'src/a.py', shard_index, 4
+        )
+
+
+def test_merged_shards_equal_a_single_run(tmp_path, monkeypatch, run_pipeline):
+    single_dir: Path = tmp_path / 'single'
+    make_checkout(single_dir)
+    monkeypatch.chdir(single_dir)
+    single_config: Config = get_config(single_dir, 'single')
+    run_pipeline(single_config)
+
+    shard_configs: list[Config] = []
+    for shard_index in range(1, SHARDS + 1):
+        shard_dir: Path = tmp_path / f'shard-{shard_index}'
+        make_checkout(shard_dir)
+        monkeypatch.chdir(shard_dir)
+        shard_config: Config = get_config(
+            shard_dir, str(shard_index), shard_index=shard_index, shard_count=SHARDS
+        )
+        run_pipeline(shard_config)
+        shard_configs.append(shard_config)
+
+    shard_modules: list[set[str]] = [
+        set(get_manifest_entries(config.manifest_file)) for config in shard_configs
+    ]
+    assert all(shard_modules)
+    assert sum(len(modules) for modules in shard_modules) == MODULES
+
+    merged_dir: Path = tmp_path / 'merged'
+    merged_dir.mkdir()
+    merged_config: Config = get_config(
+        merged_dir,
+        'merged',
+        merge_caches=[config.cache_file for config in shard_configs],
+        merge_manifests=[config.manifest_file for config in shard_configs],
+        merge_reports=[config.report_file for config in shard_configs],
+    )
+    merge_shard_results(merged_config)
+
+    assert get_cache_entries(single_config.cache_file)
+    assert get_cache_entries(merged_config.cache_file) == get_cache_entries(
+        single_config.cache_file
+    )
+    assert get_manifest_entries(merged_config.manifest_file) == get_manifest_entries(
+        single_config.manifest_file
+    )
+    with open(single_config.report_file, 'r') as f:
+        single_report: dict = json.load(f)
+    with open(merged_config.report_file, 'r') as f:
+        merged_report: dict = json.load(f)
+    assert merged_report['shards'] == SHARDS
+    for counter in ('modules_discovered', 'symbols_queued', 'llm_calls'):
+        assert single_report['counters'][counter]
+        assert merged_report['counters'][counter] == single_report['counters'][counter]
+    assert merged_report['tokens'] == single_report['tokens']
+    assert merged_report['cache']['misses'] == single_report['cache']['misses']
+
+    sharded_sources: dict[str, str] = {}
+    for shard_index in range(1, SHARDS + 1):
+        shard_sources: dict[str, str] = get_sources(tmp_path / f'shard-{shard_index}')
+        sharded_sources.update(
+            (name, source)
+            for name, source in shard_sources.items()
+            if is_in_shard(os.path.join('src', name), shard_index, SHARDS)
+        )
+    assert sharded_sources == get_sources(single_dir)
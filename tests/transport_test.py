@@ -0,0 +1,234 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+
+import pytest
+
+from docstring_generator.config import Config
+from docstring_generator.engine import LLMEngine, estimate_tokens
+from docstring_generator.fake_llm import FakeLLM
+from docstring_generator.metrics import metrics
+from docstring_generator.transport import get_http_client, is_http2_available
+
+FAST: float = 0.01
+PROMPT: str = 'def f(): pass'
+
+
+class ScriptedLLM(FakeLLM):
+    """A fake llm whose calls wait and then reply or fail as scripted, in order."""
+
+    def __init__(self, script: list[tuple[float, Union[str, Exception]]]):
+        super().__init__()
+        self.script: list[tuple[float, Union[str, Exception]]] = list(script)
+        self.cancelled: list[str] = []
+
+    async def ainvoke(self, prompt: str) -> str:
+        delay, outcome = self.script.pop(0) if self.script else (FAST, 'reply')
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(str(outcome))
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def get_config(**kwargs) -> Config:
+    kwargs = {'hedge_quantile': 0.5, 'hedge_min_samples': 3, **kwargs}
+    return Config(path={'.'}, max_retries=0, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def call(engine: LLMEngine, count: int = 1) -> list[str]:
+    """Call the engine one prompt at a time, so that every latency is measured."""
+    return [engine.submit(PROMPT).result(timeout=10) for _ in range(count)]
+
+
+def run_hedged(
+    primary: tuple[float, Union[str, Exception]],
+    hedge: tuple[float, Union[str, Exception]],
+    **kwargs,
+) -> tuple[LLMEngine, ScriptedLLM, Optional[str]]:
+    """Measure 3 fast calls, then make a call scripted with its primary and hedge requests."""
+    llm: ScriptedLLM = ScriptedLLM([(FAST, 'fast')] * 3 + [primary, hedge])
+    engine: LLMEngine = LLMEngine(llm=llm, config=get_config(**kwargs))
+    try:
+        call(engine, 3)
+        return engine, llm, call(engine)[0]
+    finally:
+        engine.stop()
+
+
+def test_no_hedge_before_enough_samples():
+    llm: ScriptedLLM = ScriptedLLM([(FAST, 'fast'), (0.2, 'slow')])
+    engine: LLMEngine = LLMEngine(llm=llm, config=get_config())
+    try:
+        assert call(engine, 2) == ['fast', 'slow']
+    finally:
+        engine.stop()
+    assert not metrics.counters['llm_hedged']
+
+
+def test_no_hedge_when_disabled():
+    _, llm, reply = run_hedged((0.2, 'slow'), (FAST, 'hedge'), hedge_quantile=0.0)
+    assert reply == 'slow'
+    assert not metrics.counters['llm_hedged']
+    assert not llm.cancelled
+
+
+def test_slow_request_is_hedged_and_cancelled():
+    started_at: float = time.perf_counter()
+    _, llm, reply = run_hedged((5.0, 'slow'), (FAST, 'hedge'))
+    assert reply == 'hedge'
+    assert time.perf_counter() - started_at < 2.0
+    assert metrics.counters['llm_hedged'] == 1
+    assert metrics.counters['llm_hedge_wins'] == 1
+    assert llm.cancelled == ['slow']
+
+
+def test_fast_primary_cancels_the_hedge():
+    _, llm, reply = run_hedged((0.1, 'slow'), (5.0, 'hedge'))
+    assert reply == 'slow'
+    assert metrics.counters['llm_hedged'] == 1
+    assert not metrics.counters['llm_hedge_wins']
+    assert llm.cancelled == ['hedge']
+
+
+def test_failed_hedge_waits_for_the_primary():
+    _, llm, reply = run_hedged((0.2, 'slow'), (FAST, ValueError('hedge failed')))
+    assert reply == 'slow'
+    assert not metrics.counters['llm_hedge_wins']
+    assert not llm.cancelled
+
+
+def test_failed_primary_falls_back_to_the_hedge():
+    _, llm, reply = run_hedged((0.1, ValueError('primary failed')), (0.3, 'hedge'))
+    assert reply == 'hedge'
+    assert metrics.counters['llm_hedge_wins'] == 1
+    assert not llm.cancelled
+
+
+def test_both_failed_requests_raise():
+    with pytest.raises(ValueError):
+        run_hedged(
+            (0.1, ValueError('primary failed')), (FAST, ValueError('hedge failed'))
+        )
+
+
+def test_hedge_is_rate_limited_and_its_prompt_counted():
+    engine, _, reply = run_hedged(
+        (5.0, 'slow'), (FAST, 'hedge'), requests_per_minute=60
+    )
+    assert reply == 'hedge'
+    # 4 calls and 1 hedge took a request each, 1 request comes back every second.
+    assert engine.requests_bucket.tokens < 60 - 4.5
+    assert metrics.counters['prompt_tokens'] == 5 * estimate_tokens(PROMPT)
+    assert metrics.counters['llm_calls'] == 4
+
+
+class CompletionsHandler(BaseHTTPRequestHandler):
+    """An openai compatible completions endpoint, slow on the first request of a slow prompt."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body: dict = json.loads(self.rfile.read(int(self.headers['content-length'])))
+        prompt: str = ''.join(body['prompt'])
+        server: 'CompletionsServer' = self.server
+        with server.lock:
+            server.requests += 1
+            server.ports.add(self.client_address[1])
+            slow: bool = 'slow' in prompt and prompt not in server.seen
+            server.seen.add(prompt)
+        time.sleep(5.0 if slow else FAST)
+        data: bytes = json.dumps(
+            {
+                'id': 'completion',
+                'object': 'text_completion',
+                'created': 0,
+                'model': body['model'],
+                'choices': [
+                    {
+                        'text': '"""Docstring."""',
+                        'index': 0,
+                        'finish_reason': 'stop',
+                        'logprobs': None,
+                    }
+                ],
+                'usage': {
+                    'prompt_tokens': 1,
+                    'completion_tokens': 1,
+                    'total_tokens': 2,
+                },
+            }
+        ).encode('utf-8')
+        try:
+            self.send_response(200)
+            self.send_header('content-type', 'application/json')
+            self.send_header('content-length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            pass
+
+
+class CompletionsServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), CompletionsHandler)
+        self.lock: threading.Lock = threading.Lock()
+        self.requests: int = 0
+        self.ports: set[int] = set()
+        self.seen: set[str] = set()
+
+
+@pytest.fixture
+def completions_server():
+    pytest.importorskip('langchain_openai')
+    server: CompletionsServer = CompletionsServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_local_provider_reuses_connections_and_hedges(completions_server):
+    # The 4 sequential calls are only measured, so that the slow call is the only one hedged.
+    config: Config = get_config(
+        llm_provider='local',
+        llm_base_url=f'http://127.0.0.1:{completions_server.server_port}/v1',
+        hedge_min_samples=4,
+    )
+    engine: LLMEngine = LLMEngine(llm=None, config=config)
+    try:
+        call(engine, 4)
+        started_at: float = time.perf_counter()
+        reply: str = engine.submit('def slow(): pass').result(timeout=10)
+    finally:
+        engine.stop()
+    assert reply == '"""Docstring."""'
+    assert time.perf_counter() - started_at < 2.0
+    assert metrics.counters['llm_hedged'] == 1
+    assert metrics.counters['llm_hedge_wins'] == 1
+    assert completions_server.requests == metrics.counters['http_requests'] == 6
+    # The sequential calls share one keep-alive connection, the hedge opens a second.
+    assert len(completions_server.ports) == 2
+    assert metrics.counters['http_request_bytes'] > 0
+    assert metrics.counters['http_response_bytes'] > 0
+
+
+def test_http2_falls_back_without_h2(capsys):
+    pytest.importorskip('httpx')
+    get_http_client(get_config(http2=True))
+    if not is_http2_available():
+        assert 'HTTP/1.1' in capsys.readouterr().err
@@ -0,0 +1,71 @@
+import ast
+import threading
+import time
+from pathlib import Path
+from queue import Queue
+from typing import Callable
+
+import pytest
+
+from docstring_generator.scheduler import ScheduledQueue
+from docstring_generator.watch import watch_modules
+
+SOURCE: str = '''def add(a, b):
+    return a + b
+
+
+def subtract(a, b):
+    return a - b
+'''
+
+
+def is_documented(module_path: Path) -> bool:
+    try:
+        tree: ast.Module = ast.parse(module_path.read_text())
+    except SyntaxError:
+        return False
+    return all(
+        ast.get_docstring(node)
+        for node in tree.body
+        if isinstance(node, ast.FunctionDef)
+    )
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 10.0) -> bool:
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.mark.parametrize('watch_backend', ['poll', 'auto'])
+def test_reverted_module_is_documented_again(tmp_path, make_config, watch_backend):
+    module_path: Path = tmp_path / 'src' / 'module.py'
+    module_path.parent.mkdir()
+    module_path.write_text(SOURCE)
+    config = make_config(
+        use_cache=False,
+        watch_backend=watch_backend,
+        watch_poll_interval=0.05,
+        watch_debounce=0.1,
+    )
+    stopped: threading.Event = threading.Event()
+    watcher: threading.Thread = threading.Thread(
+        target=watch_modules,
+        args=(config, Queue(), ScheduledQueue(), ScheduledQueue(), Queue(), Queue()),
+        kwargs={'should_stop': stopped.is_set},
+        daemon=True,
+    )
+    watcher.start()
+    try:
+        assert wait_until(lambda: is_documented(module_path))
+        time.sleep(0.2)
+        module_path.write_text(SOURCE)
+        assert not is_documented(module_path)
+        assert wait_until(lambda: is_documented(module_path))
+    finally:
+        stopped.set()
+        watcher.join(timeout=10)
+    assert not watcher.is_alive()